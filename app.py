@@ -1,21 +1,7 @@
 import streamlit as st
-import pandas as pd
-import time
 
-from helper.chat import populate_chat, user_question
-from helper.llm import create_llm
-from helper.sidebar import (
-    sidebar_llm_dropdown,
-    sidebar_system_prompt_uploader,
-    sidebar_tools_selection,
-    sidebar_unctad_selection,
-    sidebar_viz_tools_selection,
-    sidebar_wb_selection,
-    sidebar_which_steps,
-)
 from helper.ui import check_password
-from helper.tools import get_unctadstat, get_unctadstat_tradelike, get_world_bank
-from helper.viz_tools import gen_plot
+from helper.warmup import start_warmup
 
 
 st.set_page_config(
@@ -23,17 +9,32 @@ st.set_page_config(
     page_icon="https://www.svgrepo.com/show/273699/stats-chart.svg",
 )
 
-
-system_prompts = pd.read_csv(
-    "https://raw.githubusercontent.com/dhopp1/llads/refs/heads/main/system_prompts.csv"
-)
-
 # App title
 st.title("UNCTAD Statschat")
 
-if not check_password():
+logged_in = check_password()
+
+# import the app's modules and load the metadata in the background once per server process, while the first user logs in. Started once the login screen is drawn, so it doesn't compete with it
+start_warmup()
+
+if not logged_in:
     st.stop()
 
+# imported only once logged in (llads, langchain, matplotlib...), so the login screen shows without waiting on them
+from helper.chat import populate_chat, user_question
+from helper.llm import create_llm
+from helper.sidebar import (
+    sidebar_llm_dropdown,
+    sidebar_system_prompt_uploader,
+    sidebar_tools_selection,
+    sidebar_unctad_selection,
+    sidebar_viz_tools_selection,
+    sidebar_wb_selection,
+    sidebar_which_steps,
+)
+import helper.tools
+import helper.viz_tools
+
 # sidebar
 with st.sidebar:
     st.markdown("### Select LLM")
@@ -62,7 +63,7 @@ with st.sidebar:
 
     # setting tools and viz tools available to the LLM
     st.session_state["tools"] = [
-        eval(_)
+        getattr(helper.tools, _)
         for _ in list(
             st.session_state["selected_tools"]
             .loc[lambda x: x["Make available to LLM"] == True, "function_name"]
@@ -70,7 +71,7 @@ with st.sidebar:
         )
     ]
     st.session_state["viz_tools"] = [
-        eval(_)
+        getattr(helper.viz_tools, _)
         for _ in list(
             st.session_state["selected_viz_tools"]
             .loc[lambda x: x["Make available to LLM"] == True, "function_name"]
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import pandas as pd
+import threading
+import time
+
+
+class DiskCache:
+    """
+    Persistent on-disk key/value cache with TTL expiry and LRU eviction.
+
+    Each entry is stored as its own file in `directory`, an `index.json` file keeps track of
+    when each entry was created, when it was last read, and how large it is.
+
+    Parameters:
+        directory (str): folder the cache files are written to
+        ttl (int): seconds an entry stays valid after being written
+        max_bytes (int): total size of the cache folder before the least recently used entries are evicted
+        suffix (str): file extension of the entries, e.g. '.parquet'
+        dump (function): function(value, path) writing a value to disk
+        load (function): function(path) reading a value from disk
+    """
+
+    def __init__(self, directory, ttl, max_bytes, suffix, dump, load):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.dump = dump
+        self.load = load
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(directory, "index.json")
+        self._index = self._read_index()
+
+    @staticmethod
+    def key(*parts):
+        "hash the parts of a request into a cache key"
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _read_index(self):
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def _write_index(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+        except:
+            pass
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except:
+            pass
+
+    def _evict(self):
+        "drop expired entries, then least recently used ones until under max_bytes"
+        now = time.time()
+        for key in [k for k, v in self._index.items() if now - v["created"] > self.ttl]:
+            self._remove(key)
+
+        total = sum(v["size"] for v in self._index.values())
+        for key, entry in sorted(
+            self._index.items(), key=lambda x: x[1]["last_access"]
+        ):
+            if total <= self.max_bytes:
+                break
+            total -= entry["size"]
+            self._remove(key)
+
+    def get(self, key):
+        "return the cached value, or None if missing or expired"
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                    self._write_index()
+                self.misses += 1
+                return None
+
+            try:
+                value = self.load(self._path(key))
+            except:
+                self._remove(key)
+                self._write_index()
+                self.misses += 1
+                return None
+
+            entry["last_access"] = time.time()
+            self._write_index()
+            self.hits += 1
+
+            return value
+
+    def set(self, key, value):
+        "write a value to the cache, evicting old entries if necessary"
+        with self._lock:
+            path = self._path(key)
+            tmp_path = path + ".tmp"
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self.dump(value, tmp_path)
+                os.replace(tmp_path, path)
+            except:
+                try:
+                    os.remove(tmp_path)
+                except:
+                    pass
+                return
+
+            now = time.time()
+            self._index[key] = {
+                "created": now,
+                "last_access": now,
+                "size": os.path.getsize(path),
+            }
+            self._evict()
+            self._write_index()
+
+    def clear(self):
+        "remove every entry from the cache"
+        with self._lock:
+            for key in list(self._index.keys()):
+                self._remove(key)
+            self._write_index()
+
+    def stats(self):
+        "hit/miss counters and current size of the cache"
+        with self._lock:
+            n_requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / n_requests if n_requests > 0 else 0.0,
+                "entries": len(self._index),
+                "bytes": sum(v["size"] for v in self._index.values()),
+            }
+
+
+# UNCTADstat Facts responses, keyed on (report_code, $filter, $select)
+facts_cache = DiskCache(
+    directory="cache/unctadstat_facts",
+    ttl=int(os.environ.get("STATSCHAT_FACTS_CACHE_TTL", 24 * 60 * 60)),
+    max_bytes=int(os.environ.get("STATSCHAT_FACTS_CACHE_MAX_MB", 512)) * 1024 * 1024,
+    suffix=".parquet",
+    dump=lambda df, path: df.to_parquet(path, index=False),
+    load=pd.read_parquet,
+)
+
+
+def _dump_text(text, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _load_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+# LLM completions, keyed on (model_name, base_url, system prompt hash, prompt, reasoning_effort, ...)
+llm_cache = DiskCache(
+    directory="cache/llm_responses",
+    ttl=int(os.environ.get("STATSCHAT_LLM_CACHE_TTL", 7 * 24 * 60 * 60)),
+    max_bytes=int(os.environ.get("STATSCHAT_LLM_CACHE_MAX_MB", 64)) * 1024 * 1024,
+    suffix=".txt",
+    dump=_dump_text,
+    load=_load_text,
+)
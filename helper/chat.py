@@ -1,9 +1,18 @@
+import functools
 import inspect
+from llads.tooling import count_tokens
 import pandas as pd
 import streamlit as st
-import sys
-
-from helper.progress_bar import Logger
+import time
+
+from helper.cache import llm_cache
+from helper.llm import gen_product_routing
+from helper.product_index import get_product_index
+from helper.progress_bar import StageProgress
+from helper.query_memo import QueryMemo, query_memo
+from helper.retrieval import RETRIEVAL_K, shortlist
+from helper.session_memory import SessionMemory, plot_png
+from helper.tracing import record_span, start_trace
 from helper.tools import (
     get_world_bank,
     get_unctadstat,
@@ -40,6 +49,79 @@ def df_to_string(df):
     return "\n\n".join(df.apply(row_to_text, axis=1).tolist())
 
 
+def indicator_context(selected_series, question, columns, name, intro):
+    "prompt context listing the selected indicators most relevant to the question, with token counts before and after shortlisting"
+    selected = (selected_series["Make available to LLM"] == True).values
+    if selected.sum() == 0:
+        return None, None
+
+    rows = selected_series.drop(columns=["Make available to LLM"])
+    shortlisted = shortlist(
+        rows,
+        question,
+        st.session_state.get("retrieval_k", RETRIEVAL_K),
+        columns,
+        name,
+        st.session_state.get(f"{name}_indicator_key_version"),
+        selected,
+    )
+    context = intro + df_to_string(shortlisted.reset_index(drop=True))
+    full_context = intro + df_to_string(rows.loc[selected, :].reset_index(drop=True))
+
+    return context, {
+        "n_selected": int(selected.sum()),
+        "n_shortlisted": len(shortlisted),
+        "tokens_selected": count_tokens(full_context),
+        "tokens_shortlisted": count_tokens(context),
+    }
+
+
+def llm_cache_counts():
+    "response cache hits and misses of the main and pre-routing LLMs so far"
+    llms = [st.session_state["llm"]]
+    if st.session_state.get("routing_llm", llms[0]) is not llms[0]:
+        llms.append(st.session_state["routing_llm"])
+    counts = [_.cache_counts() for _ in llms]
+
+    return {key: sum([_[key] for _ in counts]) for key in ["hits", "misses"]}
+
+
+def trace_query(llm, result, prompt, start_time):
+    "record a span for a whole question, with the tokens of all of its LLM calls"
+    n_tokens = {"n_tokens_input": 0, "n_tokens_output": 0}
+    for step in [
+        "routing",
+        "tool_result",
+        "pd_code",
+        "explanation",
+        "commentary",
+        "plots",
+    ]:
+        for key in n_tokens.keys():
+            try:
+                n_tokens[key] += result[step][key]
+            except:
+                pass
+
+    record_span(
+        "query",
+        "question",
+        start_time,
+        time.time() - start_time,
+        query_id=result["tool_result"]["query_id"],
+        model=llm.model_name,
+        status="reused" if "reused" in result else "ok",
+        detail=prompt,
+        **n_tokens,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def tool_source(name):
+    "source code of a data or visualization tool, shown on hover"
+    return "```py\n\n" + inspect.getsource(globals()[name].func) + "\n\n```\n\n"
+
+
 def display_tool_call(result):
     tool_calls = result["tool_result"]["tool_call"]
     invoked_results = result["tool_result"]["invoked_result"]
@@ -52,14 +134,12 @@ def display_tool_call(result):
         text += f"### Function call {i+1}\n\n"
         text += f'Name: `{tool_calls[i]["name"]}`\n\n'
         text += f'Arguments: `{tool_calls[i]["arguments"]}`\n\n'
+        if "call_seconds" in result["tool_result"]:
+            text += f'Seconds taken: `{round(result["tool_result"]["call_seconds"][i], 2)}`\n\n'
         st.markdown(text)
 
         text = "Definition:"
-        hover_text = (
-            "```py\n\n"
-            + inspect.getsource(globals()[tool_calls[i]["name"]].func)
-            + "\n\n```\n\n"
-        )
+        hover_text = tool_source(tool_calls[i]["name"])
         st.markdown(text, help=hover_text)
         st.markdown("Resulting data:\n\n")
         st.dataframe(invoked_results[i], hide_index=True)
@@ -91,13 +171,7 @@ def display_viz_call(result):
         )
         st.markdown(text)
 
-        hover_text = (
-            "```py\n\n"
-            + inspect.getsource(
-                globals()[result["plots"]["visualization_call"][0]["name"]].func
-            )
-            + "\n\n```\n\n"
-        )
+        hover_text = tool_source(result["plots"]["visualization_call"][0]["name"])
 
         st.markdown("Definition:", help=hover_text)
 
@@ -123,7 +197,7 @@ def display_commentary(result):
 def display_viz(result):
     st.markdown("### Visualization")
     try:
-        st.pyplot(result["plots"]["invoked_result"][0])
+        st.image(plot_png(result))
     except:
         if st.session_state["run_gen_plot"]:
             st.markdown("There was an error generating the plot.")
@@ -198,22 +272,78 @@ def display_time_token(result):
         viz_input = 0
         viz_output = 0
 
+    # pre-routing
+    try:
+        routing_seconds = result["routing"]["seconds_taken"]
+        routing_input = result["routing"]["n_tokens_input"]
+        routing_output = result["routing"]["n_tokens_output"]
+        text += "### Product table pre-routing\n"
+        text += f"Seconds taken: `{round(routing_seconds, 2)}`\n\n"
+        text += f"Input tokens: `{routing_input}`\n\n"
+        text += f"Output tokens: `{routing_output}`\n\n"
+    except:
+        routing_seconds = 0
+        routing_input = 0
+        routing_output = 0
+
+    # indicator shortlist
+    for source, label in [("unctad", "UNCTADstat"), ("wb", "World Bank")]:
+        try:
+            stats = result["retrieval"][source]
+            text += f"### {label} indicator shortlist\n"
+            text += f'Indicators passed to the LLM: `{stats["n_shortlisted"]}` of `{stats["n_selected"]}` selected\n\n'
+            text += f'Input tokens saved: `{stats["tokens_selected"] - stats["tokens_shortlisted"]}`\n\n'
+        except:
+            pass
+
+    # llm response cache
+    try:
+        cache_hits = result["llm_cache"]["hits"]
+        cache_calls = cache_hits + result["llm_cache"]["misses"]
+        text += "### LLM response cache\n"
+        text += f"Calls answered from the cache: `{cache_hits}` of `{cache_calls}`\n\n"
+        text += f'Hit rate since the server started: `{round(llm_cache.stats()["hit_rate"] * 100, 1)}%`\n\n'
+    except:
+        pass
+
+    # reused answer
+    if "reused" in result:
+        text += "### Reused answer\n"
+        text += "This answer was reused from an identical earlier question, the figures above are those of the original run.\n\n"
+        if result["reused"]["refreshed"]:
+            text += f'Seconds taken to refresh the data: `{round(result["refreshed_seconds"], 2)}`\n\n'
+
     # total
     text += "### Total process\n"
-    text += f"Seconds taken: `{round(init_seconds + pd_seconds + exp_seconds + com_seconds + viz_seconds, 2)}`\n\n"
-    text += f"Input tokens: `{init_input + pd_input + exp_input + com_input + viz_input}`\n\n"
-    text += f"Output tokens: `{init_output + pd_output + exp_output + com_output + viz_output}`\n\n"
+    text += f"Seconds taken: `{round(routing_seconds + init_seconds + pd_seconds + exp_seconds + com_seconds + viz_seconds, 2)}`\n\n"
+    text += f"Input tokens: `{routing_input + init_input + pd_input + exp_input + com_input + viz_input}`\n\n"
+    text += f"Output tokens: `{routing_output + init_output + pd_output + exp_output + com_output + viz_output}`\n\n"
 
     st.markdown(text)
 
 
-def display_llm_output(result):
+def display_llm_output(result, details_key=None):
     # analysis/commentary
     display_commentary(result)
 
     # visualization
     display_viz(result)
 
+    # the foldouts of past messages are only rendered when asked for, so reruns don't grow with the chat history
+    if details_key is not None and not st.toggle("Show details", key=details_key):
+        return
+
+    # the datasets of older messages may have been spilled to disk
+    if "spilled" in result:
+        try:
+            st.session_state["session_memory"].load(
+                st.session_state["llm"],
+                result["tool_result"]["query_id"],
+                latest=st.session_state.get("prior_query_id"),
+            )
+        except:
+            pass
+
     # foldout for initial tool call
     with st.expander("Initial data call", expanded=False):
         try:
@@ -296,47 +426,33 @@ def user_question():
             "assistant", avatar="https://www.svgrepo.com/show/375527/ai-platform.svg"
         ):
             with st.spinner("Processing your query...", show_time=True):
+                start_trace()
+                start_time = time.time()
+                cache_counts_before = llm_cache_counts()
+
+                # shortlisting the selected indicators most relevant to the question
+                retrieval_query = prompt
+                if st.session_state["prior_query_id"] is not None:
+                    retrieval_query += f""" {st.session_state["llm"]._query_results[st.session_state["prior_query_id"]]["context_rich_prompt"]}"""
+                retrieval = {}
+
                 # wb indicator list step
-                if (
-                    len(
-                        st.session_state["selected_wb_series"].loc[
-                            lambda x: x["Make available to LLM"] == True, :
-                        ]
-                    )
-                    > 0
-                ):
-                    wb_context = (
-                        "\n\n Here are some World Bank indicators that may be relevant to the user's question:\n\n"
-                        + df_to_string(
-                            st.session_state["selected_wb_series"]
-                            .loc[lambda x: x["Make available to LLM"] == True, :]
-                            .drop(columns=["Make available to LLM"])
-                            .reset_index(drop=True)
-                        )
-                    )
-                else:
-                    wb_context = None
+                wb_context, retrieval["wb"] = indicator_context(
+                    st.session_state["selected_wb_series"],
+                    retrieval_query,
+                    ["indicator", "name"],
+                    "wb",
+                    "\n\n Here are some World Bank indicators that may be relevant to the user's question:\n\n",
+                )
                 # wb indicator list step
                 # unctadstat indicator step
-                if (
-                    len(
-                        st.session_state["selected_unctad_series"].loc[
-                            lambda x: x["Make available to LLM"] == True, :
-                        ]
-                    )
-                    > 0
-                ):
-                    unctad_context = (
-                        "\n\n Here are some UNCTADstat indicators that may be relevant to the user's question:\n\n"
-                        + df_to_string(
-                            st.session_state["selected_unctad_series"]
-                            .loc[lambda x: x["Make available to LLM"] == True, :]
-                            .drop(columns=["Make available to LLM"])
-                            .reset_index(drop=True)
-                        )
-                    )
-                else:
-                    unctad_context = None
+                unctad_context, retrieval["unctad"] = indicator_context(
+                    st.session_state["selected_unctad_series"],
+                    retrieval_query,
+                    ["report_code", "report_name", "indicator_code", "indicator_name"],
+                    "unctad",
+                    "\n\n Here are some UNCTADstat indicators that may be relevant to the user's question:\n\n",
+                )
 
                 addt_context_gen_tool_call = (
                     f"{unctad_context}\n\n{wb_context}"
@@ -356,66 +472,163 @@ def user_question():
                     .drop(columns=["Make available to LLM"])
                     .reset_index(drop=True)
                 )
+                product_tables_string = df_to_string(product_tables)
 
                 if st.session_state["prior_query_id"] is not None:
                     users_question = f"""This is the user's latest question: {prompt}\n\nThis is the prior context to their question: {st.session_state["llm"]._query_results[st.session_state["prior_query_id"]]["context_rich_prompt"]}"""
                 else:
                     users_question = f"This is the user's question: {prompt}"
 
-                if len(product_tables) > 0:
-                    pre_product_prompt = f"Will you need any of these reports/tables to answer the user's question? If so, respond with the report_code of the relevant table, nothing else. If the user asks for an answer from a specific table that is not in this list of reports, response with 'no'. If not, respond only with 'no', nothing else. {users_question}\n\n"
-                    product_prompt = pre_product_prompt + df_to_string(product_tables)
-                product_response = st.session_state["llm"](product_prompt).strip()
+                chat_options = {
+                    "use_free_plot": st.session_state["use_free_plot"],
+                    "run_gen_pandas_df": st.session_state["run_gen_pandas_df"],
+                    "run_explain_pandas_df": st.session_state["run_explain_pandas_df"],
+                    "run_gen_final_commentary": st.session_state[
+                        "run_gen_final_commentary"
+                    ],
+                    "run_gen_plot": st.session_state["run_gen_plot"],
+                }
+
+                # reusing the answer to an identical earlier question, looked up before the pre-routing call. The product context depends on that call, so its inputs are part of the key instead
+                memo_key = QueryMemo.key(
+                    st.session_state["llm"],
+                    prompt,
+                    st.session_state["prior_query_id"],
+                    st.session_state["tools"],
+                    st.session_state["viz_tools"],
+                    [
+                        addt_context_gen_tool_call,
+                        product_tables_string,
+                        st.session_state["routing_llm"].model_name,
+                        st.session_state["routing_llm"].base_url,
+                    ],
+                    chat_options,
+                )
+                query_id = None
+                if st.session_state.get("reuse_answers", True):
+                    query_id = query_memo.restore(
+                        memo_key,
+                        st.session_state["llm"],
+                        st.session_state["prior_query_id"],
+                    )
+
+                if query_id is not None:
+                    reused = {"refreshed": False}
+                    if st.session_state.get("refresh_reused_data", False):
+                        try:
+                            st.session_state["llm"].refresh_data(
+                                query_id,
+                                st.session_state["tools"],
+                                st.session_state["viz_tools"],
+                                st.session_state["use_free_plot"],
+                            )
+                            reused["refreshed"] = True
+                        except:
+                            pass
+                    st.session_state["prior_query_id"] = query_id
+                    st.session_state["llm"]._query_results[query_id]["reused"] = reused
+
+                    # the routing of the answer being reused
+                    routing = (
+                        st.session_state["llm"]._query_results[query_id].get("routing")
+                    )
+                else:
+                    # one pre-routing call picking the product table and search keywords, skipped if no product table is available
+                    routing = None
+                    if len(product_tables) > 0:
+                        routing = gen_product_routing(
+                            st.session_state["routing_llm"],
+                            users_question,
+                            product_tables_string,
+                        )
+
+                    if routing is not None and routing["report_code"] is not None:
+                        try:
+                            product_index = get_product_index(
+                                product_tables.loc[
+                                    lambda x: x["report_code"]
+                                    == routing["report_code"],
+                                    "product_table",
+                                ].values[0]
+                            )
+
+                            # ranked, capped matches from the product code index
+                            filtered_table = product_index.search(routing["keywords"])
+
+                            addt_context_gen_tool_call = (
+                                (addt_context_gen_tool_call or "")
+                                + f"\n\nHere are some product codes that may be relevant to the user's question: {df_to_string(filtered_table)}"
+                            )
+                        except:
+                            pass
+                    # additional info for product tables
+
+                    # progress and each artifact shown as soon as its stage finishes
+                    stage_progress = StageProgress(st.session_state["llm"])
+                    st.session_state["llm"].add_stage_listener(stage_progress)
+                    if st.session_state.get("stream_output", True):
+                        st.session_state["llm"].set_stream_sink(stage_progress.stream)
 
-                if product_response != "no":
                     try:
-                        product_table = pd.read_csv(
-                            f"""metadata/{product_tables.loc[lambda x: x["report_code"] == product_response, "product_table"].values[0]}"""
+                        chat_result = st.session_state["llm"].chat(
+                            prompt=prompt,
+                            tools=st.session_state["tools"],
+                            plot_tools=st.session_state["viz_tools"],
+                            validate=True,
+                            prior_query_id=st.session_state["prior_query_id"],
+                            addt_context_gen_tool_call=addt_context_gen_tool_call,
+                            modules=[helper.tools, helper.viz_tools],
+                            data_desc_unique_threshold=80,
+                            data_desc_top_n_values=10,
+                            quiet=True,
+                            **chat_options,
                         )
-                        product_filter_prompt = f"Given this user's query, generate a list of comma-separated keywords, and nothing else, which could help in searching a database for relevant products. Consider singulars and plurals as well as individual components of multi-word phrases: {users_question}"
-                        keywords = st.session_state["llm"](product_filter_prompt)
-                        keywords = [_.strip().lower() for _ in keywords.split(",")]
-
-                        # filter the table
-                        filtered_table = product_table.loc[
-                            product_table["Product_Label"]
-                            .str.lower()
-                            .str.contains("|".join(keywords), na=False),
-                            :,
-                        ].reset_index(drop=True)
-
-                        addt_context_gen_tool_call += f"\n\nHere are some product codes that may be relevant to the user's question: {df_to_string(filtered_table)}"
-                    except:
-                        pass
-                # additional info for product tables
+                    finally:
+                        # detached even if the query fails, so the next one doesn't write into this one's placeholders
+                        st.session_state["llm"].set_stream_sink(None)
+                        st.session_state["llm"].remove_stage_listener(stage_progress)
+                        stage_progress.clear()
+                    st.session_state["prior_query_id"] = chat_result["tool_result"][
+                        "query_id"
+                    ]
 
-                old_stdout = sys.stdout
-                sys.stdout = Logger(st.progress(0), st.empty())
-
-                st.session_state["prior_query_id"] = st.session_state["llm"].chat(
-                    prompt=prompt,
-                    tools=st.session_state["tools"],
-                    plot_tools=st.session_state["viz_tools"],
-                    validate=True,
-                    use_free_plot=st.session_state["use_free_plot"],
-                    prior_query_id=st.session_state["prior_query_id"],
-                    addt_context_gen_tool_call=addt_context_gen_tool_call,
-                    run_gen_pandas_df=st.session_state["run_gen_pandas_df"],
-                    run_explain_pandas_df=st.session_state["run_explain_pandas_df"],
-                    run_gen_final_commentary=st.session_state[
-                        "run_gen_final_commentary"
+                    query_memo.store(
+                        memo_key,
+                        st.session_state["llm"],
+                        st.session_state["prior_query_id"],
+                    )
+
+                st.session_state["llm"]._query_results[
+                    st.session_state["prior_query_id"]
+                ]["retrieval"] = retrieval
+                st.session_state["llm"]._query_results[
+                    st.session_state["prior_query_id"]
+                ]["routing"] = routing
+                st.session_state["llm"]._query_results[
+                    st.session_state["prior_query_id"]
+                ]["llm_cache"] = {
+                    key: value - cache_counts_before[key]
+                    for key, value in llm_cache_counts().items()
+                }
+
+                trace_query(
+                    st.session_state["llm"],
+                    st.session_state["llm"]._query_results[
+                        st.session_state["prior_query_id"]
                     ],
-                    run_gen_plot=st.session_state["run_gen_plot"],
-                    modules=[helper.tools, helper.viz_tools],
-                    data_desc_unique_threshold=80,
-                    data_desc_top_n_values=10,
-                )["tool_result"]["query_id"]
-
-                try:
-                    sys.stdout = sys.stdout.clear()
-                    sys.stdout = old_stdout
-                except:
-                    pass
+                    prompt,
+                    start_time,
+                )
+
+                # keep the session's results within its memory budget
+                if "session_memory" not in st.session_state:
+                    st.session_state["session_memory"] = SessionMemory()
+                st.session_state["session_memory"].touch(
+                    st.session_state["llm"], st.session_state["prior_query_id"]
+                )
+                st.session_state["session_memory"].enforce(
+                    st.session_state["llm"], keep=[st.session_state["prior_query_id"]]
+                )
 
             # LLM response
             display_llm_output(
@@ -471,5 +684,6 @@ For World Bank indicators, either specify the indicator's code directly in your
                         display_llm_output(
                             st.session_state["llm"]._query_results[
                                 st.session_state["chat_history"][i]["content"]
-                            ]
+                            ],
+                            details_key=f"details_{i}",
                         )
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import threading
+
+from helper.metadata import metadata_registry
+
+
+ISO3_COUNTRIES_PATH = "metadata/iso3_countries.csv"
+
+# stands in for a key that isn't available, the same object every time so the set isn't rebuilt on each lookup
+_MISSING = {}
+
+
+class CountryRegistry:
+    """
+    In-memory set of the ISO3 codes of individual countries, used to tell countries and country groups apart.
+
+    Built from the bundled `metadata/iso3_countries.csv` list plus the country and country group keys of `metadata_registry`, without downloading them if they aren't on disk yet. The set is rebuilt only when the registry reloads one of the keys.
+    """
+
+    def __init__(self):
+        self._bundled = None
+        self._sources = None
+        self._iso3s = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sources_now():
+        "the registry's current ISO3 and group indexes, empty if a key isn't available"
+        sources = []
+        for index in [
+            metadata_registry.iso3_codes,
+            metadata_registry.group_parent_codes,
+        ]:
+            try:
+                sources.append(index(download=False))
+            except:
+                sources.append(_MISSING)
+        return sources
+
+    def iso3s(self):
+        "the current set of country ISO3 codes"
+        sources = self._sources_now()
+        if self._sources is not None and all(
+            [a is b for a, b in zip(sources, self._sources)]
+        ):
+            return self._iso3s
+
+        with self._lock:
+            if self._bundled is None:
+                self._bundled = frozenset(pd.read_csv(ISO3_COUNTRIES_PATH)["ISO3"])
+            iso3_to_code, group_parent_codes = sources
+
+            # UNCTAD economies with an ISO3 code, minus any code UNCTAD uses as a parent in its group hierarchy
+            group_codes = set(group_parent_codes.values())
+            self._iso3s = self._bundled | frozenset(
+                [iso3 for iso3, code in iso3_to_code.items() if code not in group_codes]
+            )
+            self._sources = sources
+
+        return self._iso3s
+
+    def is_country(self, iso3):
+        return iso3 in self.iso3s()
+
+    def classify(self, iso3s):
+        "label each ISO3 code as 'country' or 'group'"
+        return np.where(pd.Series(iso3s).isin(self.iso3s()).values, "country", "group")
+
+
+country_registry = CountryRegistry()
@@ -0,0 +1,104 @@
+import matplotlib.ticker as ticker
+import numpy as np
+import os
+import pandas as pd
+
+
+# buckets per pixel of the axes width, each keeping the lowest and highest point of its rows
+BUCKETS_PER_PIXEL = float(os.environ.get("STATSCHAT_PLOT_BUCKETS_PER_PIXEL", 1))
+
+# markers are left off when a series' points are closer together than this many pixels
+MARKER_MIN_SPACING = float(os.environ.get("STATSCHAT_PLOT_MARKER_SPACING", 5))
+
+
+def minmax_indices(y, n_buckets):
+    """
+    Positions of the points kept when a series is reduced to the minimum and maximum of each of `n_buckets` equal buckets of rows.
+
+    A bucket holding only missing values keeps one of them, so gaps wider than a bucket still break the line.
+
+    Parameters:
+        y (numpy.ndarray): float values of the series, in plotting order
+        n_buckets (int): number of buckets, usually the axes' width in pixels
+
+    Returns:
+        numpy.ndarray: sorted positions of the kept points, the first and last are always kept
+    """
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    size = int(np.ceil(n / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, size)
+
+    offsets = np.arange(n_buckets) * size
+    lows = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1) + offsets
+    highs = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1) + offsets
+
+    return np.unique(np.concatenate([[0, n - 1], lows, highs]).clip(0, n - 1))
+
+
+def series_positions(df, group_col):
+    "row positions of each plotted series, in the order they are drawn"
+    if group_col:
+        return list(df.groupby(group_col, sort=False).indices.values())
+    return [np.arange(len(df))]
+
+
+def fit_to_axes(ax, df, x_col, y_col, group_col=None):
+    """
+    Reduce the series of a line plot to what the axes can show, and choose whether to draw markers.
+
+    Each series (one per group) keeps the lowest and highest point of every pixel-wide bucket of its rows, so the drawn line has the same envelope while the number of points stays bounded by the axes' width. When x is neither numeric nor dates (e.g. '2023M01' periods) and has more categories than can be labelled, x is replaced by the position of its category with thinned tick labels, which also keeps series that keep different periods from reordering the axis.
+
+    Parameters:
+        ax (matplotlib.axes.Axes): axes the lines will be drawn on
+        df (pandas.DataFrame): data in long format
+        x_col (str): column name for x-axis
+        y_col (str): column name for y-axis
+        group_col (str): column name for grouping (optional)
+
+    Returns:
+        pandas.DataFrame: the rows to plot, in their original order
+        str: the marker to draw, None when the points are too dense for markers
+    """
+    n_buckets = max(int(ax.bbox.width * BUCKETS_PER_PIXEL), 1)
+    positions = series_positions(df, group_col)
+
+    try:
+        y = df[y_col].to_numpy(dtype=float)
+    except:
+        y = None
+
+    # categories in the order matplotlib would have met them, replaced by their position when too many to label each
+    categorical = not (
+        pd.api.types.is_numeric_dtype(df[x_col])
+        or pd.api.types.is_datetime64_any_dtype(df[x_col])
+    )
+    if categorical:
+        labels = pd.unique(df[x_col].iloc[np.concatenate(positions + [[]]).astype(int)])
+        if len(labels) * MARKER_MIN_SPACING > ax.bbox.width:
+            df = df.assign(
+                **{x_col: pd.Index(labels).get_indexer(df[x_col].to_numpy())}
+            )
+            ax.xaxis.set_major_locator(ticker.MaxNLocator(nbins="auto", integer=True))
+            ax.xaxis.set_major_formatter(
+                ticker.FuncFormatter(
+                    lambda value, pos: (
+                        str(labels[int(value)])
+                        if value == int(value) and 0 <= value < len(labels)
+                        else ""
+                    )
+                )
+            )
+
+    if y is not None and max([len(_) for _ in positions] + [0]) > 2 * n_buckets:
+        positions = [_[minmax_indices(y[_], n_buckets)] for _ in positions]
+        df = df.iloc[np.sort(np.concatenate(positions))]
+
+    n_points = max([len(_) for _ in positions] + [0])
+    marker = "o" if n_points * MARKER_MIN_SPACING <= ax.bbox.width else None
+
+    return df, marker
@@ -0,0 +1,99 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
+
+from helper.tracing import record_span
+
+
+# timeouts in seconds, (connect, read)
+CONNECT_TIMEOUT = float(os.environ.get("STATSCHAT_HTTP_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.environ.get("STATSCHAT_HTTP_READ_TIMEOUT", 120))
+
+# retry policy for connection errors and transient server responses
+MAX_RETRIES = int(os.environ.get("STATSCHAT_HTTP_MAX_RETRIES", 3))
+BACKOFF_FACTOR = float(os.environ.get("STATSCHAT_HTTP_BACKOFF_FACTOR", 0.5))
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+# statuses a POST is retried on, answered before the request is handled. A read timeout or other server error may come after it was
+POST_RETRY_STATUSES = [429, 503]
+
+# number of hosts to keep a pool for, and keep-alive connections per host
+POOL_CONNECTIONS = int(os.environ.get("STATSCHAT_HTTP_POOL_CONNECTIONS", 10))
+POOL_MAXSIZE = int(os.environ.get("STATSCHAT_HTTP_POOL_MAXSIZE", 16))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class IdempotentRetry(Retry):
+    "retry policy retrying non-idempotent requests only on connection errors and POST_RETRY_STATUSES"
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if not self._is_method_retryable(method):
+            return status_code in POST_RETRY_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def get_session():
+    "process-wide requests session with per-host keep-alive connection pools and a retry policy"
+    global _session
+    with _session_lock:
+        if _session is None:
+            # connection errors are retried for any method, read errors and other statuses only for idempotent ones
+            retry = IdempotentRetry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=retry,
+            )
+
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+            _session = session
+
+    return _session
+
+
+def _request(method, url, timeout, **kwargs):
+    "request through the shared session, recorded as an http span"
+    start_time = time.time()
+    status = "error"
+    try:
+        response = get_session().request(
+            method, url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs
+        )
+        status = str(response.status_code)
+        return response
+    finally:
+        # streamed responses are timed to their headers, the body is read by the caller
+        parts = urlsplit(url)
+        record_span(
+            "http",
+            f"{method} {parts.netloc}{parts.path}",
+            start_time,
+            time.time() - start_time,
+            source=parts.netloc,
+            status=status,
+        )
+
+
+def http_get(url, timeout=None, **kwargs):
+    "GET through the shared session"
+    return _request("GET", url, timeout, **kwargs)
+
+
+def http_post(url, timeout=None, **kwargs):
+    "POST through the shared session"
+    return _request("POST", url, timeout, **kwargs)
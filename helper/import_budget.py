@@ -0,0 +1,91 @@
+import os
+import pandas as pd
+import re
+import subprocess
+import sys
+
+
+# modules imported before the login screen is shown, on top of streamlit which the server has already loaded
+LOGIN_MODULES = ["helper.ui", "helper.warmup"]
+
+# modules imported once the user has logged in
+APP_MODULES = ["helper.chat", "helper.sidebar"]
+
+# milliseconds the login modules may take to import in a fresh interpreter
+IMPORT_BUDGET_MS = float(os.environ.get("STATSCHAT_IMPORT_BUDGET_MS", 150))
+
+
+def import_times(modules, preloaded=["streamlit"]):
+    """
+    Import times of every module pulled in when a fresh interpreter imports `modules`, read from `python -X importtime`.
+
+    Parameters:
+        modules (list): modules to import
+        preloaded (list): modules imported first and left out of the times, e.g. the ones the server has already loaded
+
+    Returns:
+        pandas.DataFrame: one row per imported module, with its 'self_ms' and 'cumulative_ms' import times and its 'depth' in the import tree
+    """
+    code = "; ".join(
+        [f"import {_}" for _ in preloaded]
+        + ["import sys; sys.stderr.write('--- measured ---\\n')"]
+        + [f"import {_}" for _ in modules]
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+
+    rows = []
+    measured = process.stderr.split("--- measured ---")[-1]
+    for line in measured.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            rows.append(
+                {
+                    "module": match.group(4),
+                    "self_ms": int(match.group(1)) / 1000,
+                    "cumulative_ms": int(match.group(2)) / 1000,
+                    "depth": len(match.group(3)) // 2,
+                }
+            )
+
+    return pd.DataFrame(rows, columns=["module", "self_ms", "cumulative_ms", "depth"])
+
+
+def report(n=15):
+    """
+    Print the import time of the login screen and of the rest of the app, with their slowest modules, and check the login screen against `IMPORT_BUDGET_MS`.
+
+    Parameters:
+        n (int): number of slowest modules listed
+
+    Returns:
+        bool: whether the login screen's imports are within budget
+    """
+    login = import_times(LOGIN_MODULES)
+    app = import_times(APP_MODULES, preloaded=["streamlit"] + LOGIN_MODULES)
+
+    for name, times in [("Login screen", login), ("After login", app)]:
+        print(f"{name}: {round(times['self_ms'].sum())} ms, slowest modules:")
+        print(
+            times.sort_values("cumulative_ms", ascending=False)
+            .head(n)
+            .to_string(index=False)
+        )
+        print()
+
+    within_budget = login["self_ms"].sum() <= IMPORT_BUDGET_MS
+    print(
+        f"Login screen imports {'within' if within_budget else 'OVER'} the {IMPORT_BUDGET_MS:.0f} ms budget"
+    )
+
+    return within_budget
+
+
+if __name__ == "__main__":
+    sys.exit(0 if report() else 1)
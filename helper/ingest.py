@@ -0,0 +1,99 @@
+import os
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# rows parsed at a time from a response stream
+CHUNKSIZE = int(os.environ.get("STATSCHAT_CSV_CHUNKSIZE", 50000))
+
+# dtype of the measure (*/Value) columns, 'float32' halves their memory at the cost of precision
+MEASURE_DTYPE = os.environ.get("STATSCHAT_MEASURE_DTYPE", "float64")
+
+# time dimensions, kept as strings so they can be converted to dates afterwards
+DATE_COLUMNS = [
+    "Period/Code",
+    "Period/Label",
+    "Quarter/Code",
+    "Month/Code",
+    "Year/Code",
+    "Year/Label",
+]
+
+
+def unctadstat_dtypes(return_columns):
+    """
+    Explicit dtype schema for the CSV returned by a UNCTADstat Facts query.
+
+    Parameters:
+        return_columns (str): the comma-separated $select of the query, e.g. 'Economy/Label,Year,M3700/Value'
+
+    Returns:
+        dict: CSV column name to dtype. Labels and codes of dimensions are categoricals, measures are floats, and 'Year' is read as float32 to be downcast to int16 once parsed.
+    """
+    dtypes = {}
+    for column in return_columns.split(","):
+        name = column.replace("/", "_")
+        if column.endswith("/Value"):
+            dtypes[name] = MEASURE_DTYPE
+        elif column == "Year":
+            dtypes[name] = "float32"
+        elif column in DATE_COLUMNS:
+            dtypes[name] = "str"
+        elif column.endswith("/Label") or column.endswith("/Code"):
+            dtypes[name] = "category"
+
+    return dtypes
+
+
+def concat_frames(frames):
+    "concatenate frames, unioning the categories of categorical columns instead of falling back to object"
+    frames = [_ for _ in frames if _ is not None]
+    if len(frames) == 1:
+        return frames[0]
+
+    categorical_columns = [
+        col
+        for col in frames[0].columns
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype)
+        and all(
+            col in _.columns and isinstance(_[col].dtype, pd.CategoricalDtype)
+            for _ in frames
+        )
+    ]
+    if len(categorical_columns) > 0:
+        frames = [_.copy(deep=False) for _ in frames]
+        for col in categorical_columns:
+            unioned = union_categoricals([_[col] for _ in frames])
+            for frame in frames:
+                frame[col] = pd.Categorical(frame[col], categories=unioned.categories)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def model_dtypes(df):
+    "the frame with the dtypes the model's pandas code expects: categoricals as plain object columns (groupby without observed=True, comparing two label columns) and compact integers such as the int16 'Year' as int64, so arithmetic on them can't overflow"
+    dtypes = {
+        col: object if isinstance(dtype, pd.CategoricalDtype) else "int64"
+        for col, dtype in df.dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype)
+        or (pd.api.types.is_integer_dtype(dtype) and dtype.itemsize < 8)
+    }
+    if len(dtypes) > 0:
+        df = df.astype(dtypes)
+
+    return df
+
+
+def downcast_year(df):
+    "store a complete 'Year' column as int16, widened again by `model_dtypes` before the frame reaches the model"
+    if "Year" in df.columns and df["Year"].notna().all():
+        df["Year"] = df["Year"].astype("int16")
+
+    return df
+
+
+def read_csv_stream(stream, dtypes, chunksize=CHUNKSIZE):
+    "parse a CSV byte stream in chunks with an explicit dtype schema"
+    frames = list(pd.read_csv(stream, dtype=dtypes, chunksize=chunksize))
+
+    return downcast_year(concat_frames(frames))
@@ -1,6 +1,478 @@
+import hashlib
+from langchain.tools.render import render_text_description
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+import llads.customLLM
 from llads.customLLM import customLLM
+from llads.tooling import count_tokens, date_string
+import os
 import pandas as pd
+from pydantic import PrivateAttr
+import re
 import streamlit as st
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Callable, Optional
+import uuid
+
+from helper.cache import llm_cache
+from helper.parallel import parallel_map
+from helper.tracing import record_span, stage_tracer
+
+
+# maximum number of tool calls from a single turn run at the same time
+TOOL_CALL_WORKERS = int(os.environ.get("STATSCHAT_TOOL_CALL_WORKERS", 4))
+
+# set to 0 to always send LLM calls to the API
+LLM_CACHE_ENABLED = os.environ.get("STATSCHAT_LLM_CACHE", "1") != "0"
+
+# pre-routing dropdown option for using the main LLM
+SAME_AS_MAIN_LLM = "Same as the main LLM"
+
+# llads query ids, as written in the prompts, with hyphens or with the underscores of the plot variable names
+QUERY_ID_PATTERN = re.compile(
+    r"[0-9a-f]{8}([-_])[0-9a-f]{4}\1[0-9a-f]{4}\1[0-9a-f]{4}\1[0-9a-f]{12}"
+)
+QUERY_ID_PLACEHOLDER_PATTERN = re.compile(r"<query_id_(\d+)(_underscored)?>")
+
+
+def mask_query_ids(text, query_ids=None):
+    """
+    Replace the llads query ids in a text with placeholders numbered in order of appearance, so the same request made for another query has the same text.
+
+    Parameters:
+        text (str): text to mask, e.g. a prompt
+        query_ids (list): ids the placeholders stand for. If None, every id in the text is masked and the list is built from them, otherwise only these ids are masked
+
+    Returns:
+        str: the masked text
+        list: the query ids, by placeholder number
+    """
+    collect = query_ids is None
+    query_ids = [] if collect else query_ids
+
+    def replace(match):
+        query_id = match.group(0).replace("_", "-")
+        if query_id not in query_ids:
+            if not collect:
+                return match.group(0)
+            query_ids.append(query_id)
+        suffix = "_underscored" if match.group(1) == "_" else ""
+        return f"<query_id_{query_ids.index(query_id)}{suffix}>"
+
+    return QUERY_ID_PATTERN.sub(replace, text), query_ids
+
+
+def unmask_query_ids(text, query_ids):
+    "put the query ids back in a text masked with `mask_query_ids`"
+
+    def replace(match):
+        i = int(match.group(1))
+        if i >= len(query_ids):
+            return match.group(0)
+        if match.group(2):
+            return query_ids[i].replace("-", "_")
+        return query_ids[i]
+
+    return QUERY_ID_PLACEHOLDER_PATTERN.sub(replace, text)
+
+
+def gen_tool_call(llm, tools, prompt, addt_context=None):
+    "same as llads' gen_tool_call, but the tool calls of one turn are invoked concurrently"
+    start_time = time.time()
+
+    if addt_context is not None:
+        prompt += addt_context
+
+    try:
+        tool_map = {tool.name: tool for tool in tools}
+
+        # render tools as a string
+        rendered_tools = render_text_description(tools)
+
+        system_prompt = (
+            llm.system_prompts.loc[
+                lambda x: x["step"] == "raw data tool call", "prompt"
+            ]
+            .values[0]
+            .format(date_string=date_string, rendered_tools=rendered_tools)
+        )
+
+        # choosing tool call
+        combined_prompt = ChatPromptTemplate.from_messages(
+            [("system", system_prompt), ("user", "{input}")]
+        )
+
+        n_tokens_input = count_tokens(system_prompt + prompt)
+
+        select_tool_chain = combined_prompt | llm | JsonOutputParser()
+
+        try:
+            tool_call = select_tool_chain.invoke({"input": prompt})
+        except:
+            tool_call = "error"
+
+        n_tokens_output = count_tokens(str(tool_call))
+
+        # actual running of tools, concurrently, results kept in the order of the calls
+        if type(tool_call) != list:
+            tool_call = [tool_call]
+
+        def invoke(call):
+            call_start_time = time.time()
+            try:
+                result = tool_map[call["name"]].invoke(call["arguments"])
+            except:
+                result = "error"
+            return result, time.time() - call_start_time
+
+        invoked = parallel_map(invoke, tool_call, max_workers=TOOL_CALL_WORKERS)
+        invoked_results = [_[0] for _ in invoked]
+
+        # any failed call marks the whole step as failed so it is retried
+        if any(isinstance(_, str) and _ == "error" for _ in invoked_results):
+            invoked_results = ["error"]
+
+        output = {
+            "query_id": str(uuid.uuid4()),
+            "tool_call": tool_call,
+            "invoked_result": invoked_results,
+            "call_seconds": [_[1] for _ in invoked],
+            "n_tokens_input": n_tokens_input,
+            "n_tokens_output": n_tokens_output,
+        }
+    except:
+        output = {
+            "query_id": str(uuid.uuid4()),
+            "tool_call": "error",
+            "invoked_result": ["error"],
+            "n_tokens_input": 0,
+            "n_tokens_output": 0,
+        }
+
+    end_time = time.time()
+    output["seconds_taken"] = end_time - start_time
+
+    return output
+
+
+def gen_product_routing(llm, users_question, product_tables):
+    "in one call, pick the product table needed for a question, if any, and keywords to search it with"
+    start_time = time.time()
+
+    prompt = f"""Will you need any of these reports/tables to answer the user's question? Respond only with a JSON object with two keys, and nothing else:
+"report_code": the report_code of the relevant table, or "no" if none of them is needed or the user asks for an answer from a specific table that is not in this list of reports.
+"keywords": if a table is needed, a list of keywords which could help in searching a database for relevant products, considering singulars and plurals as well as individual components of multi-word phrases. Otherwise an empty list.
+
+{users_question}
+
+{product_tables}"""
+
+    llm.start_turn()
+    try:
+        response = llm(prompt)
+        routing = JsonOutputParser().parse(response)
+        report_code = str(routing.get("report_code", "no")).strip()
+        keywords = [str(_).strip().lower() for _ in routing.get("keywords", [])]
+    except:
+        response = ""
+        report_code = "no"
+        keywords = []
+
+    routing = {
+        "report_code": None if report_code == "no" else report_code,
+        "keywords": keywords,
+        "n_tokens_input": count_tokens(prompt),
+        "n_tokens_output": count_tokens(response),
+        "seconds_taken": time.time() - start_time,
+    }
+    record_span(
+        "routing",
+        "product_routing",
+        start_time,
+        routing["seconds_taken"],
+        model=llm.model_name,
+        n_tokens_input=routing["n_tokens_input"],
+        n_tokens_output=routing["n_tokens_output"],
+        status="ok" if response != "" else "error",
+    )
+
+    return routing
+
+
+class StatschatLLM(customLLM):
+    "customLLM with the app's own versions of the pipeline steps"
+
+    _cache_hits: int = PrivateAttr(default=0)
+    _cache_misses: int = PrivateAttr(default=0)
+    _served_keys: set = PrivateAttr(default_factory=set)
+    _attempt_keys: set = PrivateAttr(default_factory=set)
+    _last_stage: Optional[str] = PrivateAttr(default=None)
+    _stream_sink: Optional[Callable] = PrivateAttr(default=None)
+    _streaming_stage: Optional[str] = PrivateAttr(default=None)
+    _stage_listeners: list = PrivateAttr(default_factory=list)
+
+    def set_stream_sink(self, sink):
+        "function(stage, text) receiving the text generated so far by the streamed stages, None to stop streaming"
+        self._stream_sink = sink
+
+    def _stream(self, prompt):
+        "same request as customLLM's call, streamed to the sink chunk by chunk"
+        response = self._client.chat.completions.create(
+            model=self.model_name,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            reasoning_effort=self.reasoning_effort,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            stream=True,
+        )
+
+        text = ""
+        for chunk in response:
+            if len(chunk.choices) > 0 and chunk.choices[0].delta.content:
+                text += chunk.choices[0].delta.content
+                self._stream_sink(self._streaming_stage, text)
+
+        return text
+
+    def _complete(self, prompt, stop=None, run_manager=None, **kwargs):
+        if self._stream_sink is not None and self._streaming_stage is not None:
+            if stop is not None:
+                raise ValueError("stop kwargs are not permitted.")
+            return self._stream(prompt)
+
+        return super()._call(prompt, stop, run_manager, **kwargs)
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        "customLLM's call, answered from the LLM response cache when the same request was made before"
+        # only deterministic calls are cached
+        if not LLM_CACHE_ENABLED or self.temperature != 0:
+            return self._complete(prompt, stop, run_manager, **kwargs)
+
+        # llads writes the uuid of the query into most prompts, it is masked so a repeated question hits the cache
+        masked_prompt, query_ids = mask_query_ids(prompt)
+        key = llm_cache.key(
+            self.model_name,
+            self.base_url,
+            hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest(),
+            masked_prompt,
+            self.reasoning_effort,
+            self.max_tokens,
+        )
+        # a request already made by a failed earlier attempt of the same stage is a retry, so it goes to the API again
+        retry = key in self._served_keys
+        self._attempt_keys.add(key)
+
+        response = None if retry else llm_cache.get(key)
+        if response is not None:
+            response = unmask_query_ids(response, query_ids)
+            self._cache_hits += 1
+            if self._stream_sink is not None and self._streaming_stage is not None:
+                self._stream_sink(self._streaming_stage, response)
+            return response
+
+        self._cache_misses += 1
+        response = self._complete(prompt, stop, run_manager, **kwargs)
+        if response is not None:
+            llm_cache.set(key, mask_query_ids(response, query_ids)[0])
+
+        return response
+
+    def start_turn(self):
+        "forget the requests of the previous turn, so only repeats within a turn count as retries"
+        self._served_keys = set()
+        self._attempt_keys = set()
+        self._last_stage = None
+
+    def chat(self, *args, **kwargs):
+        self.start_turn()
+        return super().chat(*args, **kwargs)
+
+    def add_stage_listener(self, listener):
+        "function(event) called when a pipeline stage starts and finishes, see `_run_stage`"
+        self._stage_listeners.append(listener)
+
+    def remove_stage_listener(self, listener):
+        self._stage_listeners.remove(listener)
+
+    def _emit(self, event):
+        for listener in list(self._stage_listeners):
+            try:
+                listener(event)
+            except:
+                pass
+
+    def _run_stage(self, stage, func, *args, **kwargs):
+        """
+        Run a pipeline stage, reporting it to the stage listeners.
+
+        Listeners receive a dict with 'stage' (one of 'tool_call', 'pandas_df', 'explanation', 'commentary', 'plot'), 'event' ('started' or 'finished'), 'time' (epoch seconds), and when finished 'seconds' and 'payload', the stage's output. A stage retried by llads is reported once per attempt.
+        """
+        # llads retries a failed stage straight away, the requests of the failed attempt are then not served from the cache
+        if stage == self._last_stage:
+            self._served_keys |= self._attempt_keys
+        else:
+            self._served_keys = set()
+        self._attempt_keys = set()
+        self._last_stage = stage
+
+        start_time = time.time()
+        self._emit({"stage": stage, "event": "started", "time": start_time})
+
+        # explanation and commentary are streamed to the sink, if one is set
+        if stage in ["explanation", "commentary"]:
+            self._streaming_stage = stage
+        try:
+            output = func(*args, **kwargs)
+        finally:
+            self._streaming_stage = None
+
+        end_time = time.time()
+        self._emit(
+            {
+                "stage": stage,
+                "event": "finished",
+                "time": end_time,
+                "seconds": end_time - start_time,
+                "payload": output,
+            }
+        )
+
+        return output
+
+    def gen_pandas_df(self, *args, **kwargs):
+        return self._run_stage("pandas_df", super().gen_pandas_df, *args, **kwargs)
+
+    def explain_pandas_df(self, *args, **kwargs):
+        return self._run_stage(
+            "explanation", super().explain_pandas_df, *args, **kwargs
+        )
+
+    def gen_final_commentary(self, *args, **kwargs):
+        return self._run_stage(
+            "commentary", super().gen_final_commentary, *args, **kwargs
+        )
+
+    def gen_plot_call(self, *args, **kwargs):
+        return self._run_stage("plot", super().gen_plot_call, *args, **kwargs)
+
+    def gen_free_plot(self, *args, **kwargs):
+        return self._run_stage("plot", super().gen_free_plot, *args, **kwargs)
+
+    def refresh_data(self, query_id, tools, plot_tools, use_free_plot):
+        """
+        Re-run the data calls of a stored query, then its pandas code and plot on the new data, without asking the LLM again.
+
+        Every step runs on staged copies, the stored query is only updated once they have all succeeded, so a failed refresh leaves it as it was.
+
+        Parameters:
+            query_id (str): id of the stored query
+            tools (list): data tools available to the LLM
+            plot_tools (list): visualization tools available to the LLM
+            use_free_plot (bool): whether the query's plot was made with free matplotlib code rather than a plot tool
+
+        Returns:
+            str: the query id
+        """
+        result = self._query_results[query_id]
+        tool_result = result["tool_result"]
+        tool_map = {tool.name: tool for tool in tools}
+
+        start_time = time.time()
+        invoked_results = parallel_map(
+            lambda call: tool_map[call["name"]].invoke(call["arguments"]),
+            tool_result["tool_call"],
+            max_workers=TOOL_CALL_WORKERS,
+        )
+        if any([isinstance(_, str) and _ == "error" for _ in invoked_results]):
+            raise ValueError("a data call of the query failed")
+
+        # the generated code is run the way customLLM runs it, against a staged copy of the data
+        data = dict(self._data)
+        for i in range(len(invoked_results)):
+            data[f"{query_id}_{i}"] = invoked_results[i]
+        code_globals = {**vars(llads.customLLM), "self": SimpleNamespace(_data=data)}
+
+        dataset = result["dataset"]
+        if result["pd_code"] is not None and result["pd_code"]["pd_code"] != "error":
+            exec(result["pd_code"]["pd_code"], code_globals)
+            dataset = data[f"{query_id}_result"]
+
+        plots = result["plots"]
+        plot_results = None if plots is None else plots["invoked_result"]
+        if plots is not None and plots["visualization_call"][0] != "error":
+            if use_free_plot:
+                plot_name = f"_{query_id.replace('-', '_')}_plot"
+                exec(plots["visualization_call"][0], code_globals)
+                plot_results = [code_globals[plot_name]]
+            else:
+                # plot tools read the result dataset from the csv path in their arguments, a private copy is passed instead of the shared one
+                csv_path = f"{query_id}_result.csv"
+                with tempfile.TemporaryDirectory() as directory:
+                    tmp_path = os.path.join(directory, csv_path)
+                    data[f"{query_id}_result"].to_csv(tmp_path, index=False)
+                    plot_map = {tool.name: tool for tool in plot_tools}
+                    plot_results = [
+                        plot_map[_["name"]].invoke(
+                            {
+                                key: tmp_path if value == csv_path else value
+                                for key, value in _["arguments"].items()
+                            }
+                        )
+                        for _ in plots["visualization_call"]
+                    ]
+
+        # every step succeeded, the query now uses the new data
+        self._data.update(
+            {key: value for key, value in data.items() if key.startswith(query_id)}
+        )
+        tool_result["invoked_result"] = invoked_results
+        result["dataset"] = dataset
+        if plots is not None:
+            plots["invoked_result"] = plot_results
+        result.pop("rendered", None)  # the plot rasterized before the refresh
+        result["refreshed_seconds"] = time.time() - start_time
+
+        return query_id
+
+    def cache_counts(self):
+        "number of calls of this LLM answered from and missing the response cache"
+        return {"hits": self._cache_hits, "misses": self._cache_misses}
+
+    def gen_tool_call(self, tools, prompt, addt_context=None):
+        "determine which tools to call and call them concurrently"
+        return self._run_stage(
+            "tool_call", gen_tool_call, self, tools, prompt, addt_context
+        )
+
+
+def llm_from_list(name):
+    "StatschatLLM for an entry of metadata/llm_list.csv"
+    if "Gemini 2.5 Flash" in name:
+        reasoning_effort = "none"
+        if "Thinking" in name:
+            reasoning_effort = "medium"
+    else:
+        reasoning_effort = None
+
+    llm_info = st.session_state["llm_info"].loc[lambda x: x["name"] == name, :]
+
+    llm = StatschatLLM(
+        api_key=llm_info["api_key"].values[0],
+        base_url=llm_info["llm_url"].values[0],
+        model_name=llm_info["model_name"].values[0],
+        temperature=0.0,
+        max_tokens=4096,
+        reasoning_effort=reasoning_effort,
+        system_prompts=st.session_state["system_prompts"],
+    )
+    llm.add_stage_listener(stage_tracer(llm))
+
+    return llm
 
 
 def create_llm(force=True):
@@ -18,27 +490,20 @@ def create_llm(force=True):
             pass
 
     if "llm" not in st.session_state or force:
-        if "Gemini 2.5 Flash" in st.session_state["selected_llm"]:
-            reasoning_effort = "none"
-            if "Thinking" in st.session_state["selected_llm"]:
-                reasoning_effort = "medium"
-        else:
-            reasoning_effort = None
-
-        st.session_state["llm"] = customLLM(
-            api_key=st.session_state["llm_info"]
-            .loc[lambda x: x["name"] == st.session_state["selected_llm"], "api_key"]
-            .values[0],
-            base_url=st.session_state["llm_info"]
-            .loc[lambda x: x["name"] == st.session_state["selected_llm"], "llm_url"]
-            .values[0],
-            model_name=st.session_state["llm_info"]
-            .loc[lambda x: x["name"] == st.session_state["selected_llm"], "model_name"]
-            .values[0],
-            temperature=0.0,
-            max_tokens=4096,
-            reasoning_effort=reasoning_effort,
-            system_prompts=st.session_state["system_prompts"],
-        )
+        st.session_state["llm"] = llm_from_list(st.session_state["selected_llm"])
 
         st.session_state["prior_query_id"] = None
+
+    create_routing_llm(force)
+
+
+def create_routing_llm(force=True):
+    "the LLM used for pre-routing, the main LLM unless a separate one is selected"
+    if "routing_llm" in st.session_state and not force:
+        return
+
+    routing_llm_name = st.session_state.get("selected_routing_llm", SAME_AS_MAIN_LLM)
+    if routing_llm_name == SAME_AS_MAIN_LLM:
+        st.session_state["routing_llm"] = st.session_state["llm"]
+    else:
+        st.session_state["routing_llm"] = llm_from_list(routing_llm_name)
@@ -0,0 +1,232 @@
+import io
+import os
+import pandas as pd
+import threading
+
+from helper.http_client import http_get
+
+
+COUNTRY_KEY_PATH = "metadata/country_key.csv"
+COUNTRY_GROUP_KEY_PATH = "metadata/country_group_key.csv"
+UNCTADSTAT_KEY_PATH = "metadata/unctadstat_key.csv"
+UNCTADSTAT_KEY_URL = "https://raw.githubusercontent.com/dhopp1/statschat/refs/heads/main/metadata/unctadstat_key.csv"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+def download_country_key():
+    "download the UNCTAD ISO3 transcoding table and save it to COUNTRY_KEY_PATH"
+    response = http_get(
+        "https://unctadstat.unctad.org/EN/Classifications/DimCountries_Transcode_Iso3166-1_UnctadStat.xls",
+        headers=HEADERS,
+    )
+    excel_file = io.BytesIO(response.content)
+    country_key = pd.read_excel(excel_file)
+
+    # file cleanup
+    country_key = country_key.iloc[3:, [1, 4, 5]]
+    country_key.columns = ["ISO3", "UNCTAD_code", "UNCTAD_name"]
+    country_key = country_key.loc[
+        lambda x: pd.Series([len(str(_)) == 3 for _ in x["ISO3"]])
+        & (~pd.isna(x["ISO3"])),
+        :,
+    ].reset_index(
+        drop=True
+    )  # drop non ISO3 countries
+
+    try:
+        country_key.to_csv(COUNTRY_KEY_PATH, index=False)
+    except:
+        pass
+
+    return country_key
+
+
+def download_country_group_key():
+    "download the UNCTAD country group hierarchy and save it to COUNTRY_GROUP_KEY_PATH"
+    response = http_get(
+        "https://unctadstat.unctad.org/EN/Classifications/Dim_Countries_Hierarchy_UnctadStat_All_Flat.csv",
+        headers=HEADERS,
+    )
+    csv_file = io.BytesIO(response.content)
+    country_group_key = pd.read_csv(csv_file)
+    country_group_key.columns = [
+        "parent_code",
+        "parent_label",
+        "child_code",
+        "child_label",
+    ]
+
+    try:
+        country_group_key.to_csv(COUNTRY_GROUP_KEY_PATH, index=False)
+    except:
+        pass
+
+    return country_group_key
+
+
+def read_unctadstat_key():
+    try:
+        return pd.read_csv(UNCTADSTAT_KEY_PATH)
+    except:
+        return pd.read_csv(UNCTADSTAT_KEY_URL)
+
+
+def index_country_key(country_key):
+    # an ISO3 code listed twice resolves to its first row, as the row lookup did
+    iso3_to_code = {}
+    for iso3, code in zip(country_key["ISO3"], country_key["UNCTAD_code"]):
+        iso3_to_code.setdefault(iso3, str(code))
+
+    return {
+        "frame": country_key,
+        "iso3_to_code": iso3_to_code,
+        "codes": [str(_) for _ in country_key["UNCTAD_code"]],
+    }
+
+
+def index_country_group_key(country_group_key):
+    parent_code = {}
+    child_codes = {}
+    for parent, label, child in zip(
+        country_group_key["parent_code"],
+        country_group_key["parent_label"],
+        country_group_key["child_code"],
+    ):
+        parent_code.setdefault(label, str(parent))
+        child_codes.setdefault(label, []).append(str(child))
+
+    return {
+        "frame": country_group_key,
+        "parent_code": parent_code,
+        "child_codes": child_codes,
+    }
+
+
+def index_unctadstat_key(unctadstat_key):
+    rows = {}
+    for i, (report_code, indicator_code, indicator_name) in enumerate(
+        zip(
+            unctadstat_key["report_code"],
+            unctadstat_key["indicator_code"],
+            unctadstat_key["indicator_name"],
+        )
+    ):
+        rows.setdefault(("code", report_code, indicator_code), []).append(i)
+        rows.setdefault(("name", report_code, indicator_name), []).append(i)
+
+    return {"frame": unctadstat_key, "rows": rows}
+
+
+class MetadataRegistry:
+    """
+    Process-wide cache of the metadata files and hashed indexes over them.
+
+    Each file is read once and indexed, then reloaded only when its modification time changes on disk.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _get(self, path, read, index, download=None):
+        "indexed contents of a metadata file, (re)loaded if it changed on disk since the last read"
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+
+        entry = self._entries.get(path)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry["value"]
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry["mtime"] != mtime:
+                if mtime is None and download is not None:
+                    value = index(download())
+                    try:
+                        mtime = os.path.getmtime(path)
+                    except OSError:
+                        pass
+                else:
+                    value = index(read())
+                entry = {"mtime": mtime, "value": value}
+                self._entries[path] = entry
+
+        return entry["value"]
+
+    def _country_key(self, download=True):
+        return self._get(
+            COUNTRY_KEY_PATH,
+            lambda: pd.read_csv(COUNTRY_KEY_PATH),
+            index_country_key,
+            download_country_key if download else None,
+        )
+
+    def _country_group_key(self, download=True):
+        return self._get(
+            COUNTRY_GROUP_KEY_PATH,
+            lambda: pd.read_csv(COUNTRY_GROUP_KEY_PATH),
+            index_country_group_key,
+            download_country_group_key if download else None,
+        )
+
+    def _unctadstat_key(self):
+        return self._get(UNCTADSTAT_KEY_PATH, read_unctadstat_key, index_unctadstat_key)
+
+    def country_key(self, download=True):
+        "ISO3 to UNCTAD code table, downloaded if not on disk yet"
+        return self._country_key(download)["frame"]
+
+    def country_group_key(self, download=True):
+        "UNCTAD country group hierarchy, downloaded if not on disk yet"
+        return self._country_group_key(download)["frame"]
+
+    def unctadstat_key(self):
+        "table of the available UNCTADstat reports and indicators"
+        return self._unctadstat_key()["frame"]
+
+    def unctadstat_codes(self):
+        "UNCTAD codes of every individual economy, one per row of the country key"
+        return list(self._country_key()["codes"])
+
+    def iso3_to_code(self, iso3):
+        "UNCTAD code of an ISO3 code, KeyError if unknown"
+        return self._country_key()["iso3_to_code"][iso3]
+
+    def iso3_codes(self, download=True):
+        "ISO3 code to UNCTAD code of every economy in the country key, the same dict until the file changes"
+        return self._country_key(download)["iso3_to_code"]
+
+    def group_parent_codes(self, download=True):
+        "country group label to UNCTAD code, the same dict until the file changes"
+        return self._country_group_key(download)["parent_code"]
+
+    def has_iso3(self, iso3):
+        return iso3 in self._country_key()["iso3_to_code"]
+
+    def has_group(self, label):
+        return label in self._country_group_key()["parent_code"]
+
+    def group_parent_code(self, label):
+        "UNCTAD code of a country group, KeyError if unknown"
+        return self._country_group_key()["parent_code"][label]
+
+    def group_child_codes(self, label):
+        "UNCTAD codes of the members of a country group, empty if unknown"
+        return self._country_group_key()["child_codes"].get(label, [])
+
+    def unctadstat_key_rows(self, report_code, indicator):
+        "rows of the UNCTADstat key for a report and an indicator code, or an indicator name if no code matches"
+        entry = self._unctadstat_key()
+        rows = entry["rows"].get(("code", report_code, indicator))
+        if rows is None:
+            rows = entry["rows"].get(("name", report_code, indicator), [])
+
+        return entry["frame"].iloc[rows].reset_index(drop=True)
+
+
+metadata_registry = MetadataRegistry()
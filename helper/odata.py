@@ -0,0 +1,64 @@
+# fields that accept ge/le comparisons. Period codes are fixed width, so their string order is chronological
+RANGE_FIELDS = [
+    "Year",
+    "Year/Code",
+    "Period/Code",
+    "Period/Label",
+    "Quarter/Code",
+    "Month/Code",
+]
+
+# every trade flow available in the tradelike reports
+FLOW_DOMAIN = ["Exports", "Imports", "Re-exports", "Re-imports", "Balance"]
+
+
+def _literal(value, quote):
+    return "'" + str(value) + "'" if quote else str(value)
+
+
+def plan_clause(dimension):
+    "the shortest clause selecting the values of one dimension, None if no filter is needed"
+    if dimension["values"] is None:
+        return None
+
+    # deduplicating codes, keeping their order
+    values = list(dict.fromkeys(dimension["values"]))
+    field = dimension["field"]
+    quote = dimension["quote"]
+
+    if dimension.get("domain") is not None and set(values) >= set(dimension["domain"]):
+        return None
+
+    # nothing selected, e.g. a start date after the end date: the empty list, as before the planner, rather than a range without bounds
+    if len(values) == 0:
+        return f"{field} in ()"
+
+    if len(values) == 1:
+        return f"{field} eq {_literal(values[0], quote)}"
+
+    if dimension.get("contiguous", False) and field in RANGE_FIELDS:
+        return f"{field} ge {_literal(values[0], quote)} and {field} le {_literal(values[-1], quote)}"
+
+    return f"""{field} in ({",".join([_literal(_, quote) for _ in values])})"""
+
+
+def plan_filter(dimensions):
+    """
+    Plan the smallest $filter equivalent to a list of dimensions.
+
+    Contiguous periods become ge/le ranges, single values become eq comparisons, duplicate codes are dropped, and dimensions selecting everything are left out.
+
+    Parameters:
+        dimensions (list[dict]): the dimensions of the query, each a dict with:
+            field (str): the OData field, e.g. 'Economy/Code' or 'Year'
+            values (list or None): the selected values, None for no filter on that field
+            quote (bool): whether the values are quoted strings
+            contiguous (bool, optional): whether the values are a complete, ordered run of periods that can be expressed as a range
+            domain (list, optional): every value the field can take, the filter is left out if all of them are selected
+
+    Returns:
+        str: the $filter string
+    """
+    clauses = [plan_clause(_) for _ in dimensions]
+
+    return " and ".join([_ for _ in clauses if _ is not None])
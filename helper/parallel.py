@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import os
+
+
+# default cap on the number of concurrent requests per fan-out
+MAX_WORKERS = int(os.environ.get("STATSCHAT_MAX_WORKERS", 8))
+
+# cap on the threads working at once across nested fan-outs, e.g. tool calls, then the indicators of a call, then their pages
+WORKER_BUDGET = int(os.environ.get("STATSCHAT_WORKER_BUDGET", 16))
+
+# what is left of the budget for fan-outs started from the current thread
+_worker_budget = contextvars.ContextVar("worker_budget", default=None)
+
+
+def parallel_map(func, items, max_workers=MAX_WORKERS):
+    "apply func to each item on a bounded thread pool, returning the results in the order of items, a fan-out inside func shares its share of the worker budget"
+    items = list(items)
+    budget = _worker_budget.get()
+    budget = WORKER_BUDGET if budget is None else budget
+    n_workers = min(max_workers, len(items), budget)
+    if n_workers <= 1:
+        return [func(_) for _ in items]
+
+    # each call runs in a copy of the caller's context, e.g. to keep its trace id, with its share of the budget
+    contexts = [contextvars.copy_context() for _ in items]
+    for context in contexts:
+        context.run(_worker_budget.set, max(budget // n_workers, 1))
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(lambda x: x[0].run(func, x[1]), zip(contexts, items)))
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+
+def _month_of_period(kind, number):
+    "month a period number falls on, NaN where the number is out of range for that kind of period"
+    if kind == "semester":  # S01 -> June, S02 -> December
+        return np.where((number >= 1) & (number <= 2), number * 6, np.nan)
+    elif kind == "quarter":  # Q01 -> March, ..., Q04 -> December
+        return np.where((number >= 1) & (number <= 4), (number - 1) * 3 + 3, np.nan)
+    elif kind == "month":
+        return np.where((number >= 1) & (number <= 12), number, np.nan)
+    else:
+        raise ValueError("kind must be 'semester', 'quarter', 'month', or 'span'")
+
+
+def _numbers(codes, start, stop):
+    "the digits of codes between start and stop as floats, NaN where they are not a number"
+    return (
+        pd.to_numeric(codes.str.slice(start, stop), errors="coerce")
+        .astype("float64")
+        .to_numpy()
+    )
+
+
+def _mask(condition):
+    return condition.to_numpy(dtype=bool, na_value=False)
+
+
+def _parse_unique_codes(codes, kind):
+    "parse an array of unique period codes to datetime64"
+    codes = pd.Series(codes, dtype="string")
+    years = _numbers(codes, 0, 4)
+
+    if kind == "span":  # '20222023' -> 2023-01-01, the end year of the period
+        end_years = _numbers(codes, 4, 8)
+        valid = _mask(codes.str.len() == 8) & (end_years == years + 1)
+        months = np.where(valid, 1, np.nan)
+        years = end_years
+    else:
+        letter = {"semester": "S", "quarter": "Q", "month": "M"}.get(kind, "")
+        months = _month_of_period(kind, _numbers(codes, 5, 7))
+        valid = (
+            _mask(codes.str.len() == 7)
+            & _mask(codes.str.slice(4, 5) == letter)
+            & _mask(codes.str.slice(5, 7).str.isdigit())
+        )
+        months = np.where(valid, months, np.nan)
+
+    return pd.to_datetime(
+        pd.DataFrame({"year": years, "month": months, "day": 1}), errors="coerce"
+    ).values
+
+
+def parse_period_codes(codes, kind):
+    """
+    Convert a column of UNCTADstat period codes to dates.
+
+    Each distinct code is parsed once and the results are broadcast back to the rows, so the cost depends on the number of distinct periods rather than the number of rows.
+
+    Parameters:
+        codes (pandas.Series): period codes
+        kind (str): 'semester' for codes like '2023S01' (first half -> 2023-06-01, second half -> 2023-12-01), 'quarter' for codes like '2023Q01' (-> 2023-03-01, the last month of the quarter), 'month' for codes like '2023M01' (-> 2023-01-01), 'span' for two-year codes like '20222023' (-> 2023-01-01, the end year)
+
+    Returns:
+        pandas.Series: datetime64 series with the same index as `codes`, NaT where a code is missing or malformed
+    """
+    codes = pd.Series(codes)
+    positions, uniques = pd.factorize(codes.astype(object), use_na_sentinel=True)
+
+    # a trailing NaT, picked up by the -1 positions of missing codes
+    parsed = np.append(
+        _parse_unique_codes(np.asarray(uniques, dtype=object), kind).astype(
+            "datetime64[ns]"
+        ),
+        np.datetime64("NaT", "ns"),
+    )
+
+    return pd.Series(parsed[positions], index=codes.index)
+
+
+def enumerate_period_codes(start_code, end_code, letter, periods_per_year):
+    "every period code from start_code to end_code inclusive, e.g. ('2023Q03', '2024Q02', 'Q', 4)"
+    return [
+        f"{year}{letter}{period:02}"
+        for year in range(int(start_code[:4]), int(end_code[:4]) + 1)
+        for period in range(1, periods_per_year + 1)
+        if f"{year}{letter}{period:02}" >= start_code
+        and f"{year}{letter}{period:02}" <= end_code
+    ]
@@ -0,0 +1,85 @@
+import numpy as np
+import os
+import pandas as pd
+import threading
+
+from helper.metadata import metadata_registry
+from helper.retrieval import tokenize
+
+
+# maximum number of product codes added to the prompt for a question
+MAX_PRODUCT_CODES = int(os.environ.get("STATSCHAT_MAX_PRODUCT_CODES", 40))
+
+
+class ProductIndex:
+    """
+    Inverted index from stemmed label tokens to the rows of a product code table.
+
+    Parameters:
+        table (pandas.DataFrame): product code table with a '*_Code' and a '*_Label' column, e.g. 'Product_Code' and 'Product_Label'
+    """
+
+    def __init__(self, table):
+        code_column = [_ for _ in table.columns if _.endswith("_Code")][0]
+        label_column = [_ for _ in table.columns if _.endswith("_Label")][0]
+        self.table = table.loc[:, [code_column, label_column]].drop_duplicates(
+            ignore_index=True
+        )
+
+        labels = self.table[label_column].fillna("").astype(str)
+        postings = {}
+        for i, label in enumerate(labels):
+            for token in set(tokenize(label)):
+                postings.setdefault(token, []).append(i)
+
+        self._postings = {token: np.array(rows) for token, rows in postings.items()}
+        self._idf = {
+            token: np.log(1 + len(self.table) / len(rows))
+            for token, rows in postings.items()
+        }
+        self._label_lengths = labels.str.len().values
+
+    def search(self, keywords, limit=MAX_PRODUCT_CODES):
+        """
+        Rank the products matching a list of keywords.
+
+        Parameters:
+            keywords (list[str]): keywords, multi-word ones are matched word by word
+            limit (int): maximum number of products returned
+
+        Returns:
+            pandas.DataFrame: the code and label of the matching products, those matching the most and rarest keywords first, then the shortest (most general) labels
+        """
+        scores = np.zeros(len(self.table))
+        tokens = set([token for keyword in keywords for token in tokenize(keyword)])
+        for token in tokens:
+            if token in self._postings:
+                scores[self._postings[token]] += self._idf[token]
+
+        matches = np.flatnonzero(scores > 0)
+        order = np.lexsort((self._label_lengths[matches], -scores[matches]))
+
+        return self.table.iloc[matches[order][:limit], :].reset_index(drop=True)
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_product_index(product_table):
+    "index of a product code table in metadata/, loaded once per process"
+    if product_table not in _indexes:
+        with _lock:
+            if product_table not in _indexes:
+                _indexes[product_table] = ProductIndex(
+                    pd.read_csv(f"metadata/{product_table}", dtype=str)
+                )
+
+    return _indexes[product_table]
+
+
+def load_product_indexes():
+    "index every product code table referenced by the UNCTADstat key"
+    product_tables = metadata_registry.unctadstat_key()["product_table"].dropna()
+    for product_table in product_tables.unique():
+        get_product_index(product_table)
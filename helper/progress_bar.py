@@ -1,69 +1,103 @@
-import time
+import pandas as pd
+import streamlit as st
 
 
-def parse_message(text):
-    "parse the progress text into progress bar value and text"
-    process_dict = {
-        "Determining which tools to use...": {
-            "overall_step": 1,
-            "proportion": 0.00,
-            "out_text": "(1/5) Determining which tools to use...",
-        },
-        "Transforming the data...": {
-            "overall_step": 2,
-            "proportion": 0.2,
-            "out_text": "(2/5) Transforming the data...",
-        },
-        "Explaining the transformations...": {
-            "overall_step": 3,
-            "proportion": 0.4,
-            "out_text": "(3/5) Explaining the transformations...",
-        },
-        "Generating commentary...": {
-            "overall_step": 4,
-            "proportion": 0.6,
-            "out_text": "(4/5) Generating commentary...",
-        },
-        "Generating a visualization...": {
-            "overall_step": 5,
-            "proportion": 0.8,
-            "out_text": "(5/5) Generating a visualization...",
-        },
-    }
-    which_key = [x for x in process_dict.keys() if x in text]
-    if len(which_key) > 0:
-        which_key = which_key[0]
-    else:
-        return 0, "?"
-    base_progress = process_dict[which_key]["proportion"]
+# pipeline stages in the order they run, with their progress bar text
+STAGES = {
+    "tool_call": {
+        "overall_step": 1,
+        "proportion": 0.00,
+        "out_text": "(1/5) Determining which tools to use...",
+    },
+    "pandas_df": {
+        "overall_step": 2,
+        "proportion": 0.2,
+        "out_text": "(2/5) Transforming the data...",
+    },
+    "explanation": {
+        "overall_step": 3,
+        "proportion": 0.4,
+        "out_text": "(3/5) Explaining the transformations...",
+    },
+    "commentary": {
+        "overall_step": 4,
+        "proportion": 0.6,
+        "out_text": "(4/5) Generating commentary...",
+    },
+    "plot": {
+        "overall_step": 5,
+        "proportion": 0.8,
+        "out_text": "(5/5) Generating a visualization...",
+    },
+}
 
-    final_progress = int(base_progress * 100)
 
-    # final text
-    final_text = process_dict[which_key]["out_text"] + text.split(which_key)[1]
+class StageProgress:
+    """
+    Progress bar and preview of the results of a running query, driven by the LLM's stage events.
 
-    return final_progress, final_text
+    Each artifact is shown as soon as its stage finishes: the fetched data after the tool call, the code and dataset after the data manipulation, the explanation and commentary (streamed while they are generated), then the plot.
 
+    Parameters:
+        llm (StatschatLLM): the LLM running the query
+    """
 
-class Logger(object):
-    def __init__(self, status_progress, status_text):
-        self.buffer = ""
-        self.status_progress = status_progress
-        self.status_text = status_text
-        self.last_update = 0
+    def __init__(self, llm):
+        self.llm = llm
+        self.query_id = None
+        self.status_progress = st.progress(0)
+        self.status_text = st.empty()
+        self.stream_box = st.empty()
+        self._artifacts_slot = st.empty()
+        self.artifacts = self._artifacts_slot.container()
 
-    def write(self, message):
-        # only write once per second
-        if time.time() - self.last_update >= 1:
-            progress_update, text_update = parse_message(message)
-            if text_update != "?":
-                self.status_progress = self.status_progress.progress(progress_update)
-                self.status_text = self.status_text.markdown(text_update)
-            self.last_update = time.time()
+    def __call__(self, event):
+        "handle a stage event"
+        stage = STAGES[event["stage"]]
+        if event["event"] == "started":
+            self.status_progress.progress(int(stage["proportion"] * 100))
+            self.status_text.markdown(stage["out_text"])
+        else:
+            self.status_text.markdown(
+                f'{stage["out_text"]} done in {round(event["seconds"], 1)} seconds'
+            )
+            try:
+                self.show(event["stage"], event["payload"])
+            except:
+                pass
 
-    def flush(self):
-        pass
+    def stream(self, stage, text):
+        "show the text generated so far by a streamed stage"
+        header = {
+            "explanation": "### Data manipulation explanation",
+            "commentary": "### Analysis and commentary",
+        }[stage]
+        self.stream_box.markdown(f"{header}\n\n{text}".replace("$", "\\$"))
+
+    def show(self, stage, payload):
+        "add the artifact of a finished stage to the preview"
+        with self.artifacts:
+            if stage == "tool_call":
+                self.query_id = payload["query_id"]
+                for invoked_result in payload["invoked_result"]:
+                    if isinstance(invoked_result, pd.DataFrame):
+                        st.markdown("Fetched data:")
+                        st.dataframe(invoked_result, hide_index=True)
+            elif stage == "pandas_df" and payload["pd_code"] != "error":
+                st.markdown(
+                    f'Python code run by the LLM:\n\n```py\n{payload["pd_code"]}\n```'
+                )
+                st.markdown("Final dataset:")
+                st.dataframe(self.llm._data[f"{self.query_id}_result"], hide_index=True)
+            elif stage in ["explanation", "commentary"]:
+                text = payload[stage]
+                if text != "error":
+                    self.stream(stage, text)
+            elif stage == "plot" and not isinstance(payload["invoked_result"][0], str):
+                st.pyplot(payload["invoked_result"][0])
 
     def clear(self):
-        self.status_progress = self.status_progress.empty()
-        self.status_text = self.status_text.empty()
+        self.status_progress.empty()
+        self.status_text.empty()
+        self.stream_box.empty()
+        self._artifacts_slot.empty()
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+import os
+import re
+import threading
+
+from helper.cache import DiskCache
+
+
+# number of complete answers kept in memory for reuse
+QUERY_MEMO_SIZE = int(os.environ.get("STATSCHAT_QUERY_MEMO_SIZE", 64))
+
+# memory the kept answers may take, counted against the global memory budget of the sessions
+QUERY_MEMO_MB = int(os.environ.get("STATSCHAT_QUERY_MEMO_MB", 256))
+
+
+def normalize_prompt(prompt):
+    "lowercase the prompt and collapse whitespace and trailing punctuation, so trivially different phrasings match"
+    return re.sub(r"\s+", " ", prompt).strip().rstrip("?.! ").lower()
+
+
+class QueryMemo:
+    """
+    Process-wide LRU memo of complete `llm.chat` results, keyed on everything that determines the answer.
+
+    The memo outlives the sessions that stored its answers, so it is bounded by the memory of the datasets and plots it holds as well as by its number of entries.
+
+    Parameters:
+        max_entries (int): number of results kept before the least recently used one is dropped
+        max_bytes (int): memory the kept results may take before the least recently used ones are dropped
+    """
+
+    def __init__(
+        self, max_entries=QUERY_MEMO_SIZE, max_bytes=QUERY_MEMO_MB * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(llm, prompt, prior_query_id, tools, viz_tools, addt_context, options):
+        """
+        Key of a question in the memo.
+
+        Parameters:
+            llm (StatschatLLM): the LLM answering, its model and endpoint are part of the key
+            prompt (str): the user's question
+            prior_query_id (str): query id of the previous question in the chat, None if this is the first one
+            tools (list): data tools available to the LLM
+            viz_tools (list): visualization tools available to the LLM
+            addt_context (list): indicator context passed to the tool call step and the inputs of the product pre-routing call, whose output is only computed on a miss
+            options (dict): the other arguments of `llm.chat`, e.g. the run_gen_* step flags
+
+        Returns:
+            str: the key
+        """
+        # the questions this one follows up on
+        prior_prompts = []
+        if prior_query_id is not None:
+            prior_prompts = [
+                normalize_prompt(llm._query_results[_]["initial_prompt"])
+                for _ in [prior_query_id]
+                + llm._query_results[prior_query_id]["context_query_ids"]
+            ]
+
+        return DiskCache.key(
+            normalize_prompt(prompt),
+            prior_prompts,
+            [_.name for _ in tools],
+            [_.name for _ in viz_tools],
+            addt_context,
+            options,
+            llm.model_name,
+            llm.base_url,
+            llm.system_prompts.to_dict(orient="list"),
+        )
+
+    def store(self, key, llm, query_id):
+        "remember the result of a query, unless its data call failed"
+        result = llm._query_results[query_id]
+        invoked_results = result["tool_result"]["invoked_result"]
+        if isinstance(invoked_results, list) and (
+            len(invoked_results) == 0
+            or (isinstance(invoked_results[0], str) and invoked_results[0] == "error")
+        ):
+            return
+
+        # imported here, helper.session_memory imports this module
+        from helper.session_memory import result_bytes
+
+        data = {k: v for k, v in llm._data.items() if k.startswith(query_id)}
+        n_bytes = result_bytes(result, data)
+        if n_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = {"result": result, "data": data, "bytes": n_bytes}
+            self._bytes += n_bytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        "drop an entry, the lock must be held"
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry["bytes"]
+
+    def total_bytes(self):
+        "approximate memory taken by the kept results"
+        return self._bytes
+
+    def restore(self, key, llm, prior_query_id):
+        "add a remembered result to the LLM's query results and return its query id, None if there is none"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+
+        # copies of the parts a data refresh replaces, so the remembered result is left untouched
+        result = dict(entry["result"])
+        result["tool_result"] = dict(result["tool_result"])
+        if result["plots"] is not None:
+            result["plots"] = dict(result["plots"])
+        if "rendered" in result:
+            result["rendered"] = dict(result["rendered"])
+        query_id = result["tool_result"]["query_id"]
+
+        # the result may come from another session, its follow-up chain is this session's one
+        if prior_query_id is None:
+            result["context_query_ids"] = []
+        else:
+            result["context_query_ids"] = [prior_query_id] + llm._query_results[
+                prior_query_id
+            ]["context_query_ids"]
+
+        llm._query_results[query_id] = result
+        llm._data.update(entry["data"])
+
+        return query_id
+
+    def discard(self, result):
+        "forget the entries holding this very result object, e.g. once the session that stored it spills its datasets to disk. Other sessions' copies of the answer are not affected"
+        with self._lock:
+            for key in [k for k, v in self._entries.items() if v["result"] is result]:
+                self._pop(key)
+
+
+query_memo = QueryMemo()
@@ -0,0 +1,134 @@
+import math
+import numpy as np
+import os
+import pandas as pd
+import re
+import threading
+
+
+# number of indicators of each source passed to the LLM per question, 0 to pass every selected one
+RETRIEVAL_K = int(os.environ.get("STATSCHAT_RETRIEVAL_K", 15))
+
+STOPWORDS = set(
+    "a an and are as at by for from how in is it me of on or show the to was what which with".split()
+)
+
+
+def stem(token):
+    "fold plural forms onto their singular, e.g. 'countries' -> 'country', 'fishes' -> 'fish'"
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("sses", "shes", "ches", "xes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    "lowercase, stemmed word tokens of a text, splitting codes like 'US.PopTotal' into their parts"
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    return [
+        stem(_) for _ in re.findall(r"[a-z0-9]+", text.lower()) if _ not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 ranking over a list of short documents, e.g. one per indicator.
+
+    Parameters:
+        documents (list[str]): the text of each document
+        k1 (float): term frequency saturation
+        b (float): document length normalization
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.n_documents = len(documents)
+        self.postings = {}
+
+        lengths = np.zeros(self.n_documents)
+        for i, document in enumerate(documents):
+            tokens = tokenize(document)
+            lengths[i] = len(tokens)
+            for token in set(tokens):
+                self.postings.setdefault(token, []).append((i, tokens.count(token)))
+
+        average_length = lengths.mean() if self.n_documents > 0 else 0
+        self._norm = k1 * (1 - b + b * lengths / max(average_length, 1))
+        self._k1 = k1
+        self._idf = {
+            token: math.log(
+                1 + (self.n_documents - len(docs) + 0.5) / (len(docs) + 0.5)
+            )
+            for token, docs in self.postings.items()
+        }
+
+    def scores(self, query):
+        "BM25 score of every document for a query"
+        scores = np.zeros(self.n_documents)
+        for token in set(tokenize(query)):
+            for i, tf in self.postings.get(token, []):
+                scores[i] += (
+                    self._idf[token] * tf * (self._k1 + 1) / (tf + self._norm[i])
+                )
+
+        return scores
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def table_version(df):
+    "fingerprint of a metadata table, computed once when a session loads it so that shortlisting doesn't rehash the table on every question"
+    return hash(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+
+def get_index(name, df, columns, version):
+    "BM25 index over the text columns of a frame, rebuilt only when the version of the table changes"
+    key = (version, len(df), tuple(columns))
+
+    entry = _indexes.get(name)
+    if entry is None or entry[0] != key:
+        with _lock:
+            texts = df[columns[0]].astype(str)
+            for column in columns[1:]:
+                texts = texts + " " + df[column].astype(str)
+            entry = (key, BM25Index(list(texts)))
+            _indexes[name] = entry
+
+    return entry[1]
+
+
+def shortlist(df, question, k, columns, name, version, selected=None):
+    """
+    Rank the rows of a metadata table by relevance to a question and keep the top k.
+
+    Parameters:
+        df (pandas.DataFrame): the full table, e.g. the UNCTADstat key or the WB indicator catalog
+        question (str): the user's question
+        k (int): number of rows to keep, 0 or less to keep all of them
+        columns (list[str]): the text columns to index, e.g. ['report_name', 'indicator_name']
+        name (str): name the index of this table is cached under
+        version: anything that changes when the table does, e.g. its `table_version`
+        selected (array-like of bool, optional): rows that may be returned, all of them if None
+
+    Returns:
+        pandas.DataFrame: the top k selected rows, most relevant first. Rows with no matching term follow in their original order
+    """
+    selected = (
+        np.ones(len(df), dtype=bool)
+        if selected is None
+        else np.asarray(selected, dtype=bool)
+    )
+    positions = np.flatnonzero(selected)
+    if k <= 0 or len(positions) <= k:
+        return df.iloc[positions, :]
+
+    scores = get_index(name, df, columns, version).scores(question)[positions]
+    order = np.argsort(-scores, kind="stable")[:k]
+
+    return df.iloc[positions[order], :]
@@ -0,0 +1,241 @@
+from collections import OrderedDict
+import io
+from matplotlib.figure import Figure
+import matplotlib.pyplot as plt
+import os
+import pandas as pd
+import shutil
+import threading
+import time
+import uuid
+import weakref
+
+from helper.query_memo import query_memo
+
+
+# memory the query results of one session, and of all sessions together, may take before older ones are spilled to disk
+SESSION_MEMORY_MB = int(os.environ.get("STATSCHAT_SESSION_MEMORY_MB", 256))
+GLOBAL_MEMORY_MB = int(os.environ.get("STATSCHAT_GLOBAL_MEMORY_MB", 2048))
+
+# where spilled results are written, and seconds before the folder of an inactive session is deleted
+SPILL_DIRECTORY = os.environ.get("STATSCHAT_SPILL_DIRECTORY", "cache/sessions")
+SPILL_TTL = int(os.environ.get("STATSCHAT_SPILL_TTL", 24 * 60 * 60))
+
+_sessions = weakref.WeakSet()
+_sessions_lock = threading.Lock()
+
+
+def plot_png(result):
+    "the plot of a result as PNG bytes, rasterized once per message, the figure is closed afterwards"
+    rendered = result.setdefault("rendered", {})
+    if "plot_png" in rendered:
+        return rendered["plot_png"]
+    if "plot_png_path" in rendered:
+        with open(rendered["plot_png_path"], "rb") as f:
+            return f.read()
+
+    figure = result["plots"]["invoked_result"][0]
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(figure)
+    rendered["plot_png"] = buffer.getvalue()
+
+    return rendered["plot_png"]
+
+
+def value_bytes(value):
+    "approximate memory taken by a stored value"
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, Figure):
+        # the RGBA buffer of its canvas, at least what a drawn figure holds on to
+        width, height = value.get_size_inches() * value.dpi
+        return int(width * height * 4)
+    return 0
+
+
+def result_bytes(result, data):
+    "approximate memory taken by the datasets and plot of a query result and by its `_data` frames"
+    values = [result.get("dataset"), result.get("rendered", {}).get("plot_png")]
+    if isinstance(result["tool_result"]["invoked_result"], list):
+        values += result["tool_result"]["invoked_result"]
+    if result.get("plots") is not None and isinstance(
+        result["plots"].get("invoked_result"), list
+    ):
+        values += result["plots"]["invoked_result"]
+    values += list(data.values())
+
+    # the same frame is often both in _data and the result
+    return sum([value_bytes(_) for _ in {id(_): _ for _ in values}.values()])
+
+
+def _dump(value, path):
+    "write a value as parquet if it is a frame parquet can hold, pickle otherwise"
+    if isinstance(value, pd.DataFrame):
+        try:
+            value.to_parquet(path + ".parquet")
+            return
+        except:
+            pass
+    pd.to_pickle(value, path + ".pkl")
+
+
+def _load(path):
+    if os.path.exists(path + ".parquet"):
+        return pd.read_parquet(path + ".parquet")
+    return pd.read_pickle(path + ".pkl")
+
+
+class SessionMemory:
+    """
+    Memory budget for the query results of one session.
+
+    Results are tracked from the least to the most recently used. When they take more than the session's share of the budget, the least recently used ones have their datasets written to parquet and their plot to PNG under `SPILL_DIRECTORY`, and are reloaded when that chat message's details are viewed again.
+
+    Parameters:
+        session_max_bytes (int): memory the results of this session may take
+        global_max_bytes (int): memory the results of all sessions may take together, split evenly between the active sessions
+    """
+
+    def __init__(
+        self,
+        session_max_bytes=SESSION_MEMORY_MB * 1024 * 1024,
+        global_max_bytes=GLOBAL_MEMORY_MB * 1024 * 1024,
+    ):
+        self.session_max_bytes = session_max_bytes
+        self.global_max_bytes = global_max_bytes
+        self.directory = os.path.join(SPILL_DIRECTORY, str(uuid.uuid4()))
+        # the folder goes with the session, pruning only catches those of a process that stopped
+        weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+        self._sizes = OrderedDict()  # in-memory query ids, least recently used first
+
+        with _sessions_lock:
+            _sessions.add(self)
+        prune_spill_directory()
+
+    def in_memory_bytes(self):
+        return sum(self._sizes.values())
+
+    def max_bytes(self):
+        "this session's budget, its own cap or its share of what the answer memo leaves of the global one, whichever is smaller"
+        with _sessions_lock:
+            n_sessions = max(len(_sessions), 1)
+        # frames both in a session and in the memo are counted twice, erring on the side of spilling
+        global_bytes = max(self.global_max_bytes - query_memo.total_bytes(), 0)
+        return min(self.session_max_bytes, global_bytes // n_sessions)
+
+    def touch(self, llm, query_id):
+        "mark a query as the most recently used and update its size"
+        self._sizes[query_id] = result_bytes(
+            llm._query_results[query_id],
+            {k: v for k, v in llm._data.items() if k.startswith(query_id)},
+        )
+        self._sizes.move_to_end(query_id)
+
+    def enforce(self, llm, keep=()):
+        "spill the least recently used results until under budget, never the `keep` queries or the earlier questions of their chats, which follow-up code may reference"
+        # queries of an LLM that has since been replaced
+        for query_id in [_ for _ in self._sizes.keys() if _ not in llm._query_results]:
+            del self._sizes[query_id]
+
+        protected = set()
+        for query_id in [_ for _ in keep if _ in llm._query_results]:
+            protected |= {query_id, *llm._query_results[query_id]["context_query_ids"]}
+        for query_id in protected:
+            if "spilled" in llm._query_results.get(query_id, {}):
+                self.reload(llm, query_id)
+                self.touch(llm, query_id)
+
+        max_bytes = self.max_bytes()
+        for query_id in list(self._sizes.keys()):
+            if self.in_memory_bytes() <= max_bytes:
+                break
+            if query_id not in protected:
+                self.spill(llm, query_id)
+
+    def spill(self, llm, query_id):
+        "write the datasets and plot of a query to disk and drop them from memory"
+        result = llm._query_results[query_id]
+        directory = os.path.join(self.directory, query_id)
+        os.makedirs(directory, exist_ok=True)
+
+        # if this session stored the result in the memo, the memo holds the same object, forget it before emptying it. Results restored from the memo are copies and leave the entry intact
+        query_memo.discard(result)
+
+        try:
+            png = plot_png(result)
+            path = os.path.join(directory, "plot.png")
+            with open(path, "wb") as f:
+                f.write(png)
+            result["rendered"].pop("plot_png", None)
+            result["rendered"]["plot_png_path"] = path
+            result["plots"]["invoked_result"] = [None]
+        except:
+            pass
+
+        dataset = result.get("dataset") is not None
+        if dataset:
+            _dump(result["dataset"], os.path.join(directory, "dataset"))
+            result["dataset"] = None
+
+        invoked_results = result["tool_result"]["invoked_result"]
+        n_invoked = len(invoked_results) if isinstance(invoked_results, list) else 0
+        for i in range(n_invoked):
+            _dump(invoked_results[i], os.path.join(directory, f"invoked_{i}"))
+        if n_invoked > 0:
+            result["tool_result"]["invoked_result"] = [None] * n_invoked
+
+        data_keys = [_ for _ in llm._data.keys() if _.startswith(query_id)]
+        for key in data_keys:
+            _dump(llm._data.pop(key), os.path.join(directory, f"data_{key}"))
+
+        result["spilled"] = {
+            "directory": directory,
+            "dataset": dataset,
+            "n_invoked": n_invoked,
+            "data_keys": data_keys,
+        }
+        self._sizes.pop(query_id, None)
+
+    def reload(self, llm, query_id):
+        "read a spilled query's datasets back into memory"
+        result = llm._query_results[query_id]
+        if "spilled" not in result:
+            return
+        directory = result["spilled"]["directory"]
+        for key in result["spilled"]["data_keys"]:
+            llm._data[key] = _load(os.path.join(directory, f"data_{key}"))
+        if result["spilled"]["n_invoked"] > 0:
+            result["tool_result"]["invoked_result"] = [
+                _load(os.path.join(directory, f"invoked_{i}"))
+                for i in range(result["spilled"]["n_invoked"])
+            ]
+        if f"{query_id}_result" in llm._data:
+            result["dataset"] = llm._data[f"{query_id}_result"]
+        elif result["spilled"]["dataset"]:
+            result["dataset"] = _load(os.path.join(directory, "dataset"))
+        del result["spilled"]
+
+    def load(self, llm, query_id, latest=None):
+        "reload a spilled query's datasets, then spill others if that goes over budget, keeping the chat of the `latest` query in memory"
+        self.reload(llm, query_id)
+        self.touch(llm, query_id)
+        self.enforce(llm, keep=[_ for _ in [query_id, latest] if _ is not None])
+
+
+def prune_spill_directory():
+    "delete the spill folders inactive for longer than SPILL_TTL, except those of sessions still alive"
+    with _sessions_lock:
+        live = {os.path.basename(_.directory) for _ in _sessions}
+    try:
+        for name in os.listdir(SPILL_DIRECTORY):
+            path = os.path.join(SPILL_DIRECTORY, name)
+            if name in live:
+                continue
+            if time.time() - os.path.getmtime(path) > SPILL_TTL:
+                shutil.rmtree(path, ignore_errors=True)
+    except:
+        pass
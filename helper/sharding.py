@@ -0,0 +1,102 @@
+import itertools
+import math
+import os
+
+from helper.odata import RANGE_FIELDS
+
+
+# maximum number of values listed in the $filter of a single request
+MAX_FILTER_VALUES = int(os.environ.get("STATSCHAT_SHARD_MAX_FILTER_VALUES", 400))
+
+# maximum number of dimension combinations (an upper bound on the rows) selected by a single request
+MAX_SHARD_ROWS = int(os.environ.get("STATSCHAT_SHARD_MAX_ROWS", 250000))
+
+# maximum number of requests a query is split into
+MAX_SHARDS = int(os.environ.get("STATSCHAT_MAX_SHARDS", 64))
+
+# maximum number of shards fetched at the same time
+SHARD_WORKERS = int(os.environ.get("STATSCHAT_SHARD_WORKERS", 4))
+
+
+def chunk_sizes(lengths, ranged, max_values, max_rows, max_shards):
+    "halve the largest chunk until the filter and row limits are met or the shard cap is reached"
+    sizes = list(lengths)
+
+    def filter_values(sizes):
+        # a ranged dimension is written as 'ge first and le last' whatever its length
+        return sum([min(size, 2) if r else size for size, r in zip(sizes, ranged)])
+
+    while filter_values(sizes) > max_values or math.prod(sizes) > max_rows:
+        candidates = range(len(sizes))
+        if math.prod(sizes) <= max_rows:  # only the filter is too long
+            candidates = [i for i in candidates if not ranged[i]]
+        if len(candidates) == 0:
+            break
+        i = max(candidates, key=lambda x: sizes[x])
+        if sizes[i] <= 1:
+            break
+        candidate = sizes.copy()
+        candidate[i] = math.ceil(sizes[i] / 2)
+        n_shards = math.prod(
+            [math.ceil(lengths[j] / candidate[j]) for j in range(len(lengths))]
+        )
+        if n_shards > max_shards:
+            break
+        sizes = candidate
+
+    return sizes
+
+
+def shard_dimensions(
+    dimensions,
+    max_values=MAX_FILTER_VALUES,
+    max_rows=MAX_SHARD_ROWS,
+    max_shards=MAX_SHARDS,
+):
+    """
+    Split filter dimensions into bounded chunks whose combinations cover the original query exactly once.
+
+    Parameters:
+        dimensions (list[dict]): filter dimensions, as passed to `helper.odata.plan_filter`
+        max_values (int): maximum number of values listed in a single shard's filter
+        max_rows (int): maximum number of dimension combinations selected by a single shard
+        max_shards (int): maximum number of shards
+
+    Returns:
+        list[list[dict]]: the dimensions of each shard
+    """
+    dimensions = [
+        (
+            {**_, "values": list(dict.fromkeys(_["values"]))}
+            if _["values"] is not None
+            else dict(_)
+        )
+        for _ in dimensions
+    ]
+    filtered = [
+        i for i in range(len(dimensions)) if dimensions[i]["values"] is not None
+    ]
+    lengths = [max(len(dimensions[i]["values"]), 1) for i in filtered]
+    ranged = [
+        dimensions[i].get("contiguous", False)
+        and dimensions[i]["field"] in RANGE_FIELDS
+        for i in filtered
+    ]
+    sizes = chunk_sizes(lengths, ranged, max_values, max_rows, max_shards)
+
+    chunks = [
+        [
+            dimensions[i]["values"][start : start + size]
+            for start in range(0, max(len(dimensions[i]["values"]), 1), size)
+        ]
+        for i, size in zip(filtered, sizes)
+    ]
+
+    shards = []
+    for combination in itertools.product(*chunks):
+        shard = [dict(_) for _ in dimensions]
+        for i, values in zip(filtered, combination):
+            shard[i]["values"] = values
+        shards.append(shard)
+
+    return shards
@@ -2,7 +2,10 @@ import pandas as pd
 import streamlit as st
 import time
 
-from helper.llm import create_llm
+from helper.llm import SAME_AS_MAIN_LLM, create_llm, create_routing_llm
+from helper.metadata import metadata_registry
+from helper.retrieval import RETRIEVAL_K, table_version
+from helper.warmup import WARMUP_POLL_SECONDS, warmup
 from helper.wb import get_wb_indicator_list
 
 
@@ -39,12 +42,24 @@ def sidebar_llm_dropdown():
         label_visibility="collapsed",
     )
 
+    st.selectbox(
+        "Pre-routing LLM",
+        options=[SAME_AS_MAIN_LLM] + list(st.session_state["llm_dropdown_options"]),
+        index=0,
+        help="Which LLM picks the product table and search keywords before the main call. A smaller, faster model is usually enough.",
+        key="selected_routing_llm",
+        on_change=create_routing_llm,
+    )
+
 
 def sidebar_unctad_selection():
     if "unctad_indicator_key" not in st.session_state:
-        st.session_state["unctad_indicator_key"] = pd.read_csv(
-            "metadata/unctadstat_key.csv"
-        ).drop(columns=["return_columns"])
+        st.session_state["unctad_indicator_key"] = (
+            metadata_registry.unctadstat_key().drop(columns=["return_columns"])
+        )
+        st.session_state["unctad_indicator_key_version"] = table_version(
+            st.session_state["unctad_indicator_key"]
+        )
 
     st.session_state["unctad_indicator_key"]["Make available to LLM"] = True
 
@@ -64,9 +79,30 @@ def sidebar_unctad_selection():
     )
 
 
+@st.fragment(run_every=WARMUP_POLL_SECONDS)
+def warmup_notice(name, message):
+    "show `message` while the warm-up step `name` runs, then rerun the app once so the section is drawn without waiting for the user to interact"
+    if warmup.is_ready(name):
+        st.rerun()
+    st.info(message)
+
+
 def sidebar_wb_selection():
     if "wb_indicator_key" not in st.session_state:
+        if not warmup.is_ready("wb_indicator_key"):
+            # don't block the page on the catalog download, nothing selected in the meantime
+            warmup_notice(
+                "wb_indicator_key",
+                "Warming up, the World Bank indicator list is still loading...",
+            )
+            st.session_state["selected_wb_series"] = pd.DataFrame(
+                columns=["indicator", "name", "Make available to LLM"]
+            )
+            return
         st.session_state["wb_indicator_key"] = get_wb_indicator_list()
+        st.session_state["wb_indicator_key_version"] = table_version(
+            st.session_state["wb_indicator_key"]
+        )
 
     st.session_state["wb_indicator_key"]["Make available to LLM"] = False
 
@@ -97,6 +133,26 @@ def sidebar_which_steps():
         "Generate commentary", value=True
     )
     st.session_state["run_gen_plot"] = st.checkbox("Generate a plot", value=True)
+    st.session_state["stream_output"] = st.checkbox(
+        "Show the explanation and commentary as they are generated", value=True
+    )
+    st.session_state["retrieval_k"] = st.number_input(
+        "Indicators passed to the LLM per source",
+        min_value=0,
+        value=RETRIEVAL_K,
+        step=1,
+        help="Only this many of the selected UNCTADstat and WB indicators, the ones most relevant to the question, are passed to the LLM. 0 passes all of them.",
+    )
+    st.session_state["reuse_answers"] = st.checkbox(
+        "Reuse answers to repeated questions",
+        value=True,
+        help="Answer a question asked before with the same selections instantly, from the stored result.",
+    )
+    st.session_state["refresh_reused_data"] = st.checkbox(
+        "Refresh the data of reused answers",
+        value=False,
+        help="Re-run the data calls of a reused answer, and its data manipulation and plot on the new data, without asking the LLM again.",
+    )
 
 
 def sidebar_tools_selection():
@@ -3,26 +3,27 @@ import io
 from langchain_core.tools import tool
 import os
 import pandas as pd
-import requests
 from typing import Union, List, Optional
 
-
-@tool
-def get_world_bank(
-    country_code: str, indicator: str, start_year: int, end_year: int
-) -> pd.DataFrame:
-    """
-    Fetch data from World Bank API
-
-    Parameters:
-        country_code (str): ISO 3-letter country code, or 'all' for all countries
-        indicator (str): String of the indicator requested.
-        start_year (int): start year of the data
-        end_year (int): end year of the data
-
-    Returns:
-        pandas.DataFrame: DataFrame containing the data
-    """
+from helper.cache import facts_cache
+from helper.country_registry import country_registry
+from helper.http_client import http_get, http_post
+from helper.metadata import metadata_registry
+from helper.ingest import (
+    concat_frames,
+    model_dtypes,
+    read_csv_stream,
+    unctadstat_dtypes,
+)
+from helper.odata import FLOW_DOMAIN, plan_filter
+from helper.parallel import parallel_map
+from helper.periods import enumerate_period_codes, parse_period_codes
+from helper.sharding import SHARD_WORKERS, shard_dimensions
+
+
+### World Bank helpers
+def fetch_world_bank_records(country_code, indicator, start_year, end_year):
+    "fetch every record of a World Bank indicator query, requesting the remaining pages in parallel"
     # Build the API URL
     base_url = (
         f"http://api.worldbank.org/v2/country/{country_code}/indicator/{indicator}"
@@ -34,7 +35,7 @@ def get_world_bank(
     }
 
     # Make the API request
-    response = requests.get(base_url, params=params)
+    response = http_get(base_url, params=params)
 
     # Check if request was successful
     if response.status_code != 200:
@@ -45,186 +46,190 @@ def get_world_bank(
     data = response.json()
 
     # The actual data is in the second element of the returned list
-    if len(data) < 2:
+    if len(data) < 2 or data[1] is None:
         print("Error: No data returned from API")
         return None
 
     records = data[1]
 
+    # the first element is the header, with the number of pages
+    n_pages = int(data[0].get("pages", 1))
+    if n_pages > 1:
+
+        # a failed page fails the whole indicator rather than silently dropping its records
+        def fetch_page(page):
+            response = http_get(base_url, params={**params, "page": page})
+            response.raise_for_status()
+            data = response.json()
+            if not isinstance(data, list) or len(data) < 2:
+                raise ValueError(
+                    f"World Bank API returned no records for indicator {indicator}, page {page} of {n_pages}: {data}"
+                )
+            return data[1] or []
+
+        for page_records in parallel_map(fetch_page, range(2, n_pages + 1)):
+            records += page_records
+
+    return records
+
+
+@tool
+def get_world_bank(
+    country_code: Union[str, List[str]],
+    indicator: Union[str, List[str]],
+    start_year: int,
+    end_year: int,
+) -> pd.DataFrame:
+    """
+    Fetch data from World Bank API
+
+    Parameters:
+        country_code (str or list[str]): ISO 3-letter country code, a list of ISO 3-letter country codes, or 'all' for all countries
+        indicator (str or list[str]): String of the indicator requested, or a list of strings of indicators to fetch several indicators in one call.
+        start_year (int): start year of the data
+        end_year (int): end year of the data
+
+    Returns:
+        pandas.DataFrame: DataFrame containing the data. If a single indicator is requested, its values are in a column named after the indicator. If a list of indicators is requested, the data is in long format, with the indicator name in the 'Indicator' column, its code in the 'Indicator_Code' column, and the values in the 'Value' column.
+    """
+    if not (isinstance(country_code, str)):
+        country_code = ";".join(country_code)
+
+    # fetching several indicators concurrently
+    if isinstance(indicator, str):
+        indicators = [indicator]
+    else:
+        indicators = list(dict.fromkeys(indicator))
+
+    indicator_records = parallel_map(
+        lambda x: fetch_world_bank_records(country_code, x, start_year, end_year),
+        indicators,
+    )
+
+    if all(_ is None for _ in indicator_records):
+        return None
+
     # Create a list to store the data
     return_data = []
 
-    for record in records:
-        if record["value"] is not None:  # Some years might not have data
-            return_data.append(
-                {
-                    "Year": record["date"],
-                    record["indicator"]["value"]: record["value"],
-                    "Country": record["country"]["value"],
-                    "ISO3": record["countryiso3code"],
-                }
-            )
+    for records in indicator_records:
+        for record in records or []:
+            if record["value"] is not None:  # Some years might not have data
+                if isinstance(indicator, str):
+                    return_data.append(
+                        {
+                            "Year": record["date"],
+                            record["indicator"]["value"]: record["value"],
+                            "Country": record["country"]["value"],
+                            "ISO3": record["countryiso3code"],
+                        }
+                    )
+                else:
+                    return_data.append(
+                        {
+                            "Year": record["date"],
+                            "Indicator": record["indicator"]["value"],
+                            "Indicator_Code": record["indicator"]["id"],
+                            "Value": record["value"],
+                            "Country": record["country"]["value"],
+                            "ISO3": record["countryiso3code"],
+                        }
+                    )
 
     # Convert to DataFrame
     df = pd.DataFrame(return_data)
 
     # Convert Year to integer and sort by year
     df["Year"] = df["Year"].astype(int)
-    df = df.sort_values("Year")
+    df = df.sort_values("Year", kind="stable")
 
     # Reset index
     df = df.reset_index(drop=True)
 
     # add a column that says whether it's a country or not
-    country_iso3s = [
-        country["cca3"]
-        for country in requests.get(
-            "https://restcountries.com/v3.1/all?fields=cca3"
-        ).json()
-    ]
-    df["country_or_group"] = [
-        "country" if _ in country_iso3s else "group" for _ in df["ISO3"]
-    ]
+    df["country_or_group"] = country_registry.classify(df["ISO3"])
 
     return df
 
 
 ### UNCTADstat helpers
 def get_country_key():
-    if not (os.path.exists("metadata/country_key.csv")):
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(
-            "https://unctadstat.unctad.org/EN/Classifications/DimCountries_Transcode_Iso3166-1_UnctadStat.xls",
-            headers=headers,
-        )
-        excel_file = io.BytesIO(response.content)
-        country_key = pd.read_excel(excel_file)
-
-        # file cleanup
-        country_key = country_key.iloc[3:, [1, 4, 5]]
-        country_key.columns = ["ISO3", "UNCTAD_code", "UNCTAD_name"]
-        country_key = country_key.loc[
-            lambda x: pd.Series([len(str(_)) == 3 for _ in x["ISO3"]])
-            & (~pd.isna(x["ISO3"])),
-            :,
-        ].reset_index(
-            drop=True
-        )  # drop non ISO3 countries
-
-        try:
-            country_key.to_csv("metadata/country_key.csv", index=False)
-        except:
-            pass
-    else:
-        country_key = pd.read_csv("metadata/country_key.csv")
-
-    return country_key
+    return metadata_registry.country_key()
 
 
 def get_country_group_key():
-    if not (os.path.exists("metadata/country_group_key.csv")):
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(
-            "https://unctadstat.unctad.org/EN/Classifications/Dim_Countries_Hierarchy_UnctadStat_All_Flat.csv",
-            headers=headers,
-        )
-        csv_file = io.BytesIO(response.content)
-        country_group_key = pd.read_csv(csv_file)
-        country_group_key.columns = [
-            "parent_code",
-            "parent_label",
-            "child_code",
-            "child_label",
-        ]
+    return metadata_registry.country_group_key()
 
-        try:
-            country_group_key.to_csv("metadata/country_group_key.csv", index=False)
-        except:
-            pass
-    else:
-        country_group_key = pd.read_csv("metadata/country_group_key.csv")
 
-    return country_group_key
+def fetch_unctadstat_facts(report_code, combined_filter, return_columns):
+    "query the Facts endpoint of a report, served from the on-disk cache when the same query was made before"
+    cache_key = facts_cache.key(report_code, combined_filter, return_columns)
+    df = facts_cache.get(cache_key)
+    if df is not None:
+        return df
+
+    # url construction
+    base_url = "https://unctadstat-user-api.unctad.org"
+    version = "cur"
+
+    call_url = f"{base_url}/{report_code}/{version}/Facts"
+
+    headers = {
+        "clientid": os.environ.get("UNCTADSTAT_CLIENTID"),
+        "clientsecret": os.environ.get("UNCTADSTAT_CLIENTSECRET"),
+    }
+
+    params = {
+        "$filter": combined_filter,
+        "$select": return_columns,
+        "$format": "csv",
+    }
+
+    # parse straight from the response stream with an explicit schema
+    with http_post(call_url, headers=headers, data=params, stream=True) as response:
+        if response.status_code != 200:
+            return pd.read_csv(io.StringIO(response.text))
 
+        response.raw.decode_content = True
+        df = read_csv_stream(response.raw, unctadstat_dtypes(return_columns))
 
-def filter_unctadstat_key(unctadstat_key, report_code, indicator_code):
-    tmp = unctadstat_key.loc[
-        lambda x: (x["report_code"] == report_code)
-        & ((x["indicator_code"] == indicator_code)),
-        :,
-    ].reset_index(drop=True)
-    if len(tmp) == 0:
-        tmp = unctadstat_key.loc[
-            lambda x: (x["report_code"] == report_code)
-            & ((x["indicator_name"] == indicator_code)),
-            :,
-        ].reset_index(drop=True)
+    # only cache successful responses
+    facts_cache.set(cache_key, df)
 
-    return tmp
+    return df
 
 
-def gen_country_filter(country_key, country_group_key, geography, group_or_countries):
+def gen_country_filter(geography, group_or_countries):
     if geography == "all":
-        country_codes = list(country_key.loc[:, "UNCTAD_code"].values)
+        country_codes = metadata_registry.unctadstat_codes()
     else:
         if isinstance(geography, str):
             if len(geography) == 3:  # iso3
-                country_codes = [
-                    country_key.loc[
-                        lambda x: x["ISO3"] == geography, "UNCTAD_code"
-                    ].values[0]
-                ]
+                country_codes = [metadata_registry.iso3_to_code(geography)]
             else:  # non-iso3, country group
                 if group_or_countries == "group":
-                    country_codes = [
-                        str(
-                            country_group_key.loc[
-                                lambda x: x["parent_label"] == geography,
-                                "parent_code",
-                            ].values[0]
-                        )
-                    ]
+                    country_codes = [metadata_registry.group_parent_code(geography)]
                 else:
-                    country_codes = list(
-                        country_group_key.loc[
-                            lambda x: x["parent_label"] == geography,
-                            "child_code",
-                        ].values
-                    )
+                    country_codes = metadata_registry.group_child_codes(geography)
         else:
             if len(geography[0]) == 3:  # iso3
                 country_codes = [
-                    str(_)
-                    for _ in list(
-                        country_key.loc[
-                            lambda x: x["ISO3"].isin(geography), "UNCTAD_code"
-                        ].values
-                    )
+                    metadata_registry.iso3_to_code(_)
+                    for _ in geography
+                    if metadata_registry.has_iso3(_)
                 ]
             else:  # non-iso3, country group
                 if group_or_countries == "group":
                     country_codes = [
-                        str(_)
-                        for _ in list(
-                            country_group_key.loc[
-                                lambda x: x["parent_label"].isin(geography),
-                                "parent_code",
-                            ].values
-                        )
+                        metadata_registry.group_parent_code(_)
+                        for _ in geography
+                        if metadata_registry.has_group(_)
                     ]
                 else:
                     country_codes = [
-                        str(_)
-                        for _ in list(
-                            country_group_key.loc[
-                                lambda x: x["parent_label"].isin(geography),
-                                "child_code",
-                            ].values
-                        )
+                        code
+                        for _ in geography
+                        for code in metadata_registry.group_child_codes(_)
                     ]
 
     # world should be '0000' not '0'
@@ -333,22 +338,8 @@ def get_unctadstat(
         pandas.DataFrame: DataFrame containing the data
     """
 
-    # country key
-    country_key = get_country_key()
-
-    # country group key
-    country_group_key = get_country_group_key()
-
-    # unctadstat key
-    try:
-        unctadstat_key = pd.read_csv("metadata/unctadstat_key.csv")
-    except:
-        unctadstat_key = pd.read_csv(
-            "https://raw.githubusercontent.com/dhopp1/statschat/refs/heads/main/metadata/unctadstat_key.csv"
-        )
-
-    # make robust to the LLM calling the indicator_name instead
-    unctadstat_key = filter_unctadstat_key(unctadstat_key, report_code, indicator_code)
+    # unctadstat key, robust to the LLM calling the indicator_name instead
+    unctadstat_key = metadata_registry.unctadstat_key_rows(report_code, indicator_code)
     column_name = unctadstat_key["indicator_code"].values[0]
     return_columns = unctadstat_key["return_columns"].values[0]
 
@@ -370,17 +361,6 @@ def get_unctadstat(
     if monthly_liner:
         report_code += "_M"
 
-    # url construction
-    base_url = "https://unctadstat-user-api.unctad.org"
-    version = "cur"
-
-    call_url = f"{base_url}/{report_code}/{version}/Facts"
-
-    headers = {
-        "clientid": os.environ.get("UNCTADSTAT_CLIENTID"),
-        "clientsecret": os.environ.get("UNCTADSTAT_CLIENTSECRET"),
-    }
-
     # date filter
     if start_date is None:
         if semi_annual_port:
@@ -438,9 +418,17 @@ def get_unctadstat(
 
     # different date filter for population growth report
     if report_code in ["US.PopGR"]:
-        date_filter = f"""Period/Label in ({",".join(["'" + str(_) + "'" for _ in range(start_date, end_date + 1)])})"""
+        date_dimension = {
+            "field": "Period/Label",
+            "values": [str(_) for _ in range(start_date, end_date + 1)],
+            "quote": True,
+        }
     elif semi_annual_port:
-        date_filter = f"""Period/Code in ({",".join([f"'{year}S{season:02}'" for year in list(range(int(start_date[:4]), int(end_date[:4])+1)) for season in range(1, 3) if f"{year}S{season:02}" >= start_date and f"{year}S{season:02}" <= end_date])})"""
+        date_dimension = {
+            "field": "Period/Code",
+            "values": enumerate_period_codes(start_date, end_date, "S", 2),
+            "quote": True,
+        }
     elif report_code in [
         "US.LSCI",
         "US.LSCI_M",
@@ -451,28 +439,51 @@ def get_unctadstat(
         "US.TotAndComServicesQuarterly",
     ]:
         if monthly_liner:
-            date_filter = f"""Month/Code in ({",".join([f"'{year}M{month:02}'" for year in list(range(int(start_date[:4]), int(end_date[:4])+1)) for month in range(1, 13) if f"{year}M{month:02}" >= start_date and f"{year}M{month:02}" <= end_date])})"""
+            date_dimension = {
+                "field": "Month/Code",
+                "values": enumerate_period_codes(start_date, end_date, "M", 12),
+                "quote": True,
+            }
         elif report_code in ["US.CommodityPriceIndices_M", "US.CommodityPrice_M"]:
-            date_filter = f"""Period/Code in ({",".join([f"'{year}M{month:02}'" for year in list(range(int(start_date[:4]), int(end_date[:4])+1)) for month in range(1, 13) if f"{year}M{month:02}" >= start_date and f"{year}M{month:02}" <= end_date])})"""
+            date_dimension = {
+                "field": "Period/Code",
+                "values": enumerate_period_codes(start_date, end_date, "M", 12),
+                "quote": True,
+            }
         else:
             period_label = (
                 "Quarter"
                 if report_code not in ["US.TotAndComServicesQuarterly"]
                 else "Period"
             )
-            date_filter = f"""{period_label}/Code in ({",".join([f"'{year}Q{quarter:02}'" for year in list(range(int(start_date[:4]), int(end_date[:4])+1)) for quarter in range(1, 5) if f"{year}Q{quarter:02}" >= start_date and f"{year}Q{quarter:02}" <= end_date])})"""
+            date_dimension = {
+                "field": f"{period_label}/Code",
+                "values": enumerate_period_codes(start_date, end_date, "Q", 4),
+                "quote": True,
+            }
     elif report_code in ["US.TradeMerchGR"]:
-        date_filter = f"""Year/Code in ({",".join([f"'{year}{year+1}'" for year in range(start_date - 1, end_date)])})"""
+        date_dimension = {
+            "field": "Year/Code",
+            "values": [f"{year}{year+1}" for year in range(start_date - 1, end_date)],
+            "quote": True,
+        }
     elif report_code in ["US.GDPGR"]:
-        date_filter = f"""Period/Code in ({",".join([f"'{year}{year+1}'" for year in range(start_date - 1, end_date)])})"""
+        date_dimension = {
+            "field": "Period/Code",
+            "values": [f"{year}{year+1}" for year in range(start_date - 1, end_date)],
+            "quote": True,
+        }
     else:
-        date_filter = (
-            f"""Year in ({",".join([str(_) for _ in range(start_date, end_date+1)])})"""
-        )
+        date_dimension = {
+            "field": "Year",
+            "values": list(range(start_date, end_date + 1)),
+            "quote": False,
+        }
+    date_dimension["contiguous"] = True
 
     # country filter
     if geography == "all":
-        country_codes = list(country_key.loc[:, "UNCTAD_code"].values)
+        country_codes = metadata_registry.unctadstat_codes()
     else:
         if report_code in ["US.PLSCI"]:
             if isinstance(geography, str):
@@ -481,31 +492,31 @@ def get_unctadstat(
                 country_codes = geography
         else:
             try:
-                country_codes = gen_country_filter(
-                    country_key, country_group_key, geography, group_or_countries
-                )
+                country_codes = gen_country_filter(geography, group_or_countries)
             except:
-                country_codes = ""
+                # planned as 'in ()', the filter the baseline's "" produced
+                country_codes = []
 
     # different country filter for vessel value report
     if report_code in ["US.VesselValueByOwnership"]:
-        country_filter = f"""BeneficialOwnership/Code in ({','.join(["'" + _ + "'" for _ in country_codes])})"""
+        country_field = "BeneficialOwnership/Code"
     elif report_code in ["US.VesselValueByRegistration"]:
-        country_filter = f"""FlagOfRegistration/Code in ({','.join(["'" + _ + "'" for _ in country_codes])})"""
+        country_field = "FlagOfRegistration/Code"
     elif report_code in ["US.PLSCI"]:
-        country_filter = (
-            f"""Port/Label in ({','.join(["'" + _ + "'" for _ in country_codes])})"""
-        )
+        country_field = "Port/Label"
+    elif report_code in ["US.Tariff"]:
+        country_field = "Market/Code"
     else:
-        country_filter = (
-            f"""Economy/Code in ({','.join(["'" + _ + "'" for _ in country_codes])})"""
-        )
+        country_field = "Economy/Code"
 
-    if report_code in ["US.Tariff"]:
-        country_filter = country_filter.replace("Economy", "Market")
+    country_dimension = {
+        "field": country_field,
+        "values": list(country_codes),
+        "quote": True,
+    }
 
     if report_code in ["US.PLSCI"] and (geography == "all" or geography == "World"):
-        country_filter = ""
+        country_dimension["values"] = None
     if report_code in [
         "US.CommodityPriceIndices_A",
         "US.CommodityPriceIndices_M",
@@ -513,14 +524,10 @@ def get_unctadstat(
         "US.CommodityPrice_M",
         "US.CreativeGoodsIndex",
     ]:  # no country/economy dimension
-        country_filter = ""
+        country_dimension["values"] = None
 
     # combined filter
-    combined_filter = (
-        f"{date_filter} and {country_filter}"
-        if date_filter and country_filter
-        else date_filter or country_filter or ""
-    )
+    combined_filter = plan_filter([date_dimension, country_dimension])
 
     if semi_annual_port:
         return_columns = return_columns.replace("Year", "Period/Code")
@@ -529,15 +536,7 @@ def get_unctadstat(
             "M6047/Value", "M6048/Value"
         )
 
-    params = {
-        "$filter": combined_filter,
-        "$select": return_columns,
-        "$format": "csv",
-    }
-
-    response = requests.post(call_url, headers=headers, data=params)
-
-    df = pd.read_csv(io.StringIO(response.text))
+    df = fetch_unctadstat_facts(report_code, combined_filter, return_columns)
     df = df.rename(
         columns={
             column_name.replace("/", "_"): unctadstat_key["indicator_name"].values[0]
@@ -546,20 +545,7 @@ def get_unctadstat(
 
     # converting semester, quarterly, and monthly to date format
     if semi_annual_port:
-        df["Period_Code"] = [
-            (
-                lambda d: (
-                    datetime.date(int(d[:4]), 6 if d[4:] == "S01" else 12, 1)
-                    if isinstance(d, str)
-                    and len(d) == 7
-                    and d[4] == "S"
-                    and d[5:7].isdigit()
-                    and (d[5:7] == "01" or d[5:7] == "02")
-                    else None
-                )
-            )(d)
-            for d in df["Period_Code"]
-        ]
+        df["Period_Code"] = parse_period_codes(df["Period_Code"], "semester")
 
     if report_code in [
         "US.LSCI",
@@ -571,28 +557,13 @@ def get_unctadstat(
         "US.TotAndComServicesQuarterly",
     ]:
         if monthly_liner:
-            df["Month_Code"] = [
-                datetime.datetime.strptime(d, "%YM%m").date() for d in df["Month_Code"]
-            ]
+            df["Month_Code"] = parse_period_codes(df["Month_Code"], "month")
         elif report_code in ["US.CommodityPriceIndices_M", "US.CommodityPrice_M"]:
-            df["Period_Code"] = [
-                datetime.datetime.strptime(d, "%YM%m").date() for d in df["Period_Code"]
-            ]
+            df["Period_Code"] = parse_period_codes(df["Period_Code"], "month")
         else:
-            df[f"{period_label}_Code"] = [
-                (
-                    lambda d: (
-                        datetime.date(int(d[:4]), (int(d[5:]) - 1) * 3 + 3, 1)
-                        if isinstance(d, str)
-                        and len(d) == 7
-                        and d[4] == "Q"
-                        and d[5:].isdigit()
-                        and 1 <= int(d[5:]) <= 4
-                        else None
-                    )
-                )(d)
-                for d in df[f"{period_label}_Code"]
-            ]
+            df[f"{period_label}_Code"] = parse_period_codes(
+                df[f"{period_label}_Code"], "quarter"
+            )
 
     # naming date column
     df = df.rename(
@@ -609,6 +580,9 @@ def get_unctadstat(
         }
     )
 
+    # categoricals and int16 years only save memory while parsing and caching, the model's pandas code gets plain columns
+    df = model_dtypes(df)
+
     return df
 
 
@@ -719,31 +693,11 @@ def get_unctadstat_tradelike(
         pandas.DataFrame: DataFrame containing the data
     """
 
-    # country key
-    country_key = get_country_key()
-
-    # country group key
-    country_group_key = get_country_group_key()
-
-    # unctadstat key
-    unctadstat_key = pd.read_csv("metadata/unctadstat_key.csv")
-
-    # make robust to the LLM calling the indicator_name instead
-    unctadstat_key = filter_unctadstat_key(unctadstat_key, report_code, indicator_code)
+    # unctadstat key, robust to the LLM calling the indicator_name instead
+    unctadstat_key = metadata_registry.unctadstat_key_rows(report_code, indicator_code)
     column_name = unctadstat_key["indicator_code"].values[0]
     return_columns = unctadstat_key["return_columns"].values[0]
 
-    # url construction
-    base_url = "https://unctadstat-user-api.unctad.org"
-    version = "cur"
-
-    call_url = f"{base_url}/{report_code}/{version}/Facts"
-
-    headers = {
-        "clientid": os.environ.get("UNCTADSTAT_CLIENTID"),
-        "clientsecret": os.environ.get("UNCTADSTAT_CLIENTSECRET"),
-    }
-
     # date filter
     quarterly = False
     if report_code in ["US.LSBCI"]:
@@ -765,21 +719,28 @@ def get_unctadstat_tradelike(
             end_date = datetime.datetime.now().year
 
     if quarterly:
-        date_filter = f"""Quarter/Code in ({",".join([f"'{year}Q{quarter:02}'" for year in list(range(int(start_date[:4]), int(end_date[:4])+1)) for quarter in range(1, 5) if f"{year}Q{quarter:02}" >= start_date and f"{year}Q{quarter:02}" <= end_date])})"""
+        date_dimension = {
+            "field": "Quarter/Code",
+            "values": enumerate_period_codes(start_date, end_date, "Q", 4),
+            "quote": True,
+        }
     elif report_code in ["US.CreativeGoodsGR"]:
-        date_filter = f"""Period/Code in ({",".join([f"'{year}{year+1}'" for year in range(start_date - 1, end_date)])})"""
+        date_dimension = {
+            "field": "Period/Code",
+            "values": [f"{year}{year+1}" for year in range(start_date - 1, end_date)],
+            "quote": True,
+        }
     else:
-        date_filter = (
-            f"""Year in ({",".join([str(_) for _ in range(start_date, end_date+1)])})"""
-        )
+        date_dimension = {
+            "field": "Year",
+            "values": list(range(start_date, end_date + 1)),
+            "quote": False,
+        }
+    date_dimension["contiguous"] = True
 
     # geography filters
-    geography_a_country_codes = gen_country_filter(
-        country_key, country_group_key, geography_a, group_or_countries_a
-    )
-    geography_b_country_codes = gen_country_filter(
-        country_key, country_group_key, geography_b, group_or_countries_b
-    )
+    geography_a_country_codes = gen_country_filter(geography_a, group_or_countries_a)
+    geography_b_country_codes = gen_country_filter(geography_b, group_or_countries_b)
 
     # final country filter
     economy_label = "Economy"
@@ -805,9 +766,15 @@ def get_unctadstat_tradelike(
         "US.BioTradeMerchStructChange",
         "US.ConcentStructIndices",
     ]:  # no geography element
-        country_filter = ""
+        country_dimensions = []
     else:
-        country_filter = f"""{economy_label}/Code in ({','.join(["'" + _ + "'" for _ in geography_a_country_codes])})"""
+        country_dimensions = [
+            {
+                "field": f"{economy_label}/Code",
+                "values": geography_a_country_codes,
+                "quote": True,
+            }
+        ]
 
         if report_code not in [
             "US.BiotradeMerchRCA",
@@ -819,7 +786,13 @@ def get_unctadstat_tradelike(
             "US.TradeFoodProcCat_Cat_RCA",
             "US.TradeFoodProcCat_Proc_RCA",
         ]:  # no partner for these tables
-            country_filter += f""" and {partner_label}/Code in ({','.join(["'" + _ + "'" for _ in geography_b_country_codes])})"""
+            country_dimensions.append(
+                {
+                    "field": f"{partner_label}/Code",
+                    "values": geography_b_country_codes,
+                    "quote": True,
+                }
+            )
 
     # product filter
     product_colname = "Product"
@@ -876,47 +849,43 @@ def get_unctadstat_tradelike(
         products = "all"
 
     if isinstance(products, str):
-        if products == "all":
-            product_filter = ""
-        elif products == "total":
+        if products == "total":
             products = [total_product]
-        else:
+        elif products != "all":
             products = [products]
 
-    if not (isinstance(products, str)):
-        product_filter = f""" and {product_colname}/Code in ({','.join("'" + _ + "'" for _ in products)})"""
+    product_dimension = {
+        "field": f"{product_colname}/Code",
+        "values": None if isinstance(products, str) else products,
+        "quote": True,
+    }
 
     # add flow filter
     if isinstance(flow, str):
         if flow != "all":
             flow = [flow]
 
-    if flow != "all":
-        flow_filter = (
-            f""" and Flow/Label in ({','.join("'" + _ + "'" for _ in flow)})"""
-        )
-    else:
-        flow_filter = ""
-
-    # combined filter
-    combined_filter = (
-        f"{date_filter} and {country_filter}"
-        if date_filter and country_filter
-        else date_filter or country_filter or ""
-    )
-
-    combined_filter += product_filter
-    combined_filter += flow_filter
-
-    params = {
-        "$filter": combined_filter,
-        "$select": return_columns,
-        "$format": "csv",
+    flow_dimension = {
+        "field": "Flow/Label",
+        "values": None if flow == "all" else flow,
+        "quote": True,
+        "domain": FLOW_DOMAIN,
     }
 
-    response = requests.post(call_url, headers=headers, data=params)
+    # combined filter, split into bounded shards for large requests
+    shards = shard_dimensions(
+        [date_dimension] + country_dimensions + [product_dimension, flow_dimension]
+    )
 
-    df = pd.read_csv(io.StringIO(response.text))
+    df = parallel_map(
+        lambda shard: fetch_unctadstat_facts(
+            report_code, plan_filter(shard), return_columns
+        ),
+        shards,
+        max_workers=SHARD_WORKERS,
+    )
+    # the shards partition the query, so their rows are simply stacked. Rows equal on the selected columns are distinct facts, e.g. two flows when Flow isn't selected
+    df = concat_frames(df)
     df = df.rename(
         columns={
             column_name.replace("/", "_"): unctadstat_key["indicator_name"].values[0]
@@ -925,20 +894,7 @@ def get_unctadstat_tradelike(
 
     # converting to date
     if quarterly:
-        df["Quarter_Code"] = [
-            (
-                lambda d: (
-                    datetime.date(int(d[:4]), (int(d[5:]) - 1) * 3 + 3, 1)
-                    if isinstance(d, str)
-                    and len(d) == 7
-                    and d[4] == "Q"
-                    and d[5:].isdigit()
-                    and 1 <= int(d[5:]) <= 4
-                    else None
-                )
-            )(d)
-            for d in df["Quarter_Code"]
-        ]
+        df["Quarter_Code"] = parse_period_codes(df["Quarter_Code"], "quarter")
 
     # naming date column
     df = df.rename(
@@ -955,4 +911,7 @@ def get_unctadstat_tradelike(
         }
     )
 
+    # categoricals and int16 years only save memory while parsing and caching, the model's pandas code gets plain columns
+    df = model_dtypes(df)
+
     return df
@@ -0,0 +1,196 @@
+import contextvars
+import os
+import pandas as pd
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+
+# SQLite file the spans are appended to, set STATSCHAT_TRACING=0 to turn tracing off
+TRACE_DB_PATH = os.environ.get("STATSCHAT_TRACE_DB", "traces/statschat.sqlite")
+TRACING_ENABLED = os.environ.get("STATSCHAT_TRACING", "1") != "0"
+
+# days spans, and the questions they record, are kept before being deleted
+TRACE_RETENTION_DAYS = float(os.environ.get("STATSCHAT_TRACE_RETENTION_DAYS", 30))
+
+# seconds between deletions of expired spans by the writer thread
+TRACE_PRUNE_INTERVAL = 60 * 60
+
+SPAN_COLUMNS = [
+    "trace_id",  # one per user question
+    "query_id",  # llads query id, on query spans
+    "kind",  # 'query', 'stage', 'routing' or 'http'
+    "name",  # e.g. the stage name or the requested host and path
+    "model",
+    "source",  # data source host for http spans
+    "started_at",
+    "seconds",
+    "n_tokens_input",
+    "n_tokens_output",
+    "status",  # 'ok', 'error' or the HTTP status code
+    "detail",  # e.g. the prompt of a query span
+]
+
+# trace of the question being answered, copied into worker threads by parallel_map
+current_trace_id = contextvars.ContextVar("current_trace_id", default=None)
+
+
+class SpanStore:
+    """
+    Append-only SQLite store of timing spans.
+
+    Spans are queued and written in batches by a background thread, so recording one does not wait on the disk. The same thread deletes the spans older than the retention period when it starts, then at most hourly as it writes.
+
+    Parameters:
+        path (str): path of the SQLite file
+        retention_days (float): days a span is kept
+    """
+
+    def __init__(self, path=TRACE_DB_PATH, retention_days=TRACE_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS spans (id INTEGER PRIMARY KEY, {", ".join(SPAN_COLUMNS)})"""
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS spans_trace_id ON spans (trace_id)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS spans_started_at ON spans (started_at)"
+        )
+        return connection
+
+    def prune(self, connection):
+        "delete the spans started before the retention period"
+        connection.execute(
+            "DELETE FROM spans WHERE started_at < ?",
+            [time.time() - self.retention_days * 24 * 60 * 60],
+        )
+        connection.commit()
+
+    def _write(self):
+        connection = self._connect()
+        last_pruned = 0
+        while True:
+            if time.time() - last_pruned > TRACE_PRUNE_INTERVAL:
+                try:
+                    self.prune(connection)
+                except:
+                    pass
+                last_pruned = time.time()
+            spans = [self._queue.get()]
+            while not self._queue.empty() and len(spans) < 500:
+                spans.append(self._queue.get())
+            try:
+                connection.executemany(
+                    f"""INSERT INTO spans ({", ".join(SPAN_COLUMNS)}) VALUES ({", ".join(["?"] * len(SPAN_COLUMNS))})""",
+                    [[_.get(column) for column in SPAN_COLUMNS] for _ in spans],
+                )
+                connection.commit()
+            except:
+                pass
+
+    def append(self, span):
+        "queue a span dict for writing, starting the writer thread on first use"
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write, daemon=True)
+                self._thread.start()
+        self._queue.put(span)
+
+    def read(self, since=0):
+        "spans started after the epoch time `since`, as a DataFrame"
+        try:
+            connection = self._connect()
+            spans = pd.read_sql_query(
+                "SELECT * FROM spans WHERE started_at >= ?", connection, params=[since]
+            )
+            connection.close()
+        except:
+            spans = pd.DataFrame(columns=["id"] + SPAN_COLUMNS)
+
+        return spans
+
+
+span_store = SpanStore()
+
+
+def record_span(kind, name, started_at, seconds, **fields):
+    "append a span to the store under the current trace"
+    if not TRACING_ENABLED:
+        return
+    span_store.append(
+        {
+            "trace_id": current_trace_id.get(),
+            "kind": kind,
+            "name": name,
+            "started_at": started_at,
+            "seconds": seconds,
+            **fields,
+        }
+    )
+
+
+def start_trace():
+    "start a new trace for a user question, returning its id"
+    trace_id = str(uuid.uuid4())
+    current_trace_id.set(trace_id)
+    return trace_id
+
+
+def stage_tracer(llm):
+    "stage listener recording a span per finished pipeline stage of an LLM"
+
+    def listener(event):
+        if event["event"] != "finished":
+            return
+        payload = event["payload"] if isinstance(event["payload"], dict) else {}
+        error = any(
+            [
+                isinstance(payload.get(_), str) and payload.get(_) == "error"
+                for _ in ["tool_call", "pd_code", "explanation", "commentary"]
+            ]
+        ) or "error" in [
+            _ for _ in payload.get("invoked_result", []) if isinstance(_, str)
+        ]
+        record_span(
+            "stage",
+            event["stage"],
+            event["time"] - event["seconds"],
+            event["seconds"],
+            model=llm.model_name,
+            n_tokens_input=payload.get("n_tokens_input"),
+            n_tokens_output=payload.get("n_tokens_output"),
+            status="error" if error else "ok",
+        )
+
+    return listener
+
+
+def percentiles(spans, by):
+    "p50/p95/max latency and call count of spans grouped by the `by` columns"
+    if len(spans) == 0:
+        return pd.DataFrame(columns=by + ["calls", "p50", "p95", "max"])
+
+    return (
+        spans.groupby(by)["seconds"]
+        .agg(
+            calls="count",
+            p50=lambda x: x.quantile(0.5),
+            p95=lambda x: x.quantile(0.95),
+            max="max",
+        )
+        .round(3)
+        .reset_index()
+        .sort_values("p95", ascending=False)
+    )
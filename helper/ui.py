@@ -52,3 +52,40 @@ def check_password():
         st.error("Password incorrect")
 
     return False
+
+
+def check_admin_password():
+    """Check if a user entered the admin password, a separate secret from the chat's shared password. Not remembered in a cookie"""
+    try:
+        configured = "admin_password" in st.secrets
+    except:
+        configured = False
+    if not configured:
+        st.info("Set `admin_password` in the app's secrets to open this page.")
+        return False
+
+    def admin_password_entered():
+        try:
+            condition = hmac.compare_digest(
+                st.session_state["admin_password"],
+                st.secrets["admin_password"],
+            )
+        except:
+            condition = False
+
+        st.session_state["admin_password_correct"] = condition
+        del st.session_state["admin_password"]
+
+    if st.session_state.get("admin_password_correct", False):
+        return True
+
+    st.text_input(
+        "Admin password",
+        type="password",
+        on_change=admin_password_entered,
+        key="admin_password",
+    )
+    if "admin_password_correct" in st.session_state:
+        st.error("Password incorrect")
+
+    return False
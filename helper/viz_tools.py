@@ -1,7 +1,21 @@
 from langchain_core.tools import tool
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
+from helper.downsample import fit_to_axes
+
+
+def bar_matrix(df, x_col, y_col, group_col, groups, x_vals):
+    "groups x x-values matrix of the first value of each pair, 0 where a group has none"
+    return (
+        df.drop_duplicates([group_col, x_col])
+        .set_index([group_col, x_col])[y_col]
+        .reindex(pd.MultiIndex.from_product([groups, x_vals]), fill_value=0)
+        .to_numpy()
+        .reshape(len(groups), len(x_vals))
+    )
+
 
 @tool
 def gen_plot(
@@ -35,38 +49,40 @@ def gen_plot(
 
     fig, ax = plt.subplots(figsize=(8, 6))
 
+    # long series are reduced to what the axes can show
+    marker = "o"
+    if plot_type == "line":
+        df, marker = fit_to_axes(ax, df, x_col, y_col, group_col)
+
     # If grouped
     if group_col:
         groups = df[group_col].unique()
-        for group in groups:
-            subset = df[df[group_col] == group]
-            if plot_type == "line":
-                ax.plot(subset[x_col], subset[y_col], marker="o", label=str(group))
-            elif plot_type == "bar":
-                # Offset bar positions for grouped bar plot
-                x_vals = list(sorted(df[x_col].unique()))
-                width = 0.8 / len(groups)
-                idx = list(groups).index(group)
-                offset = [-0.4 + width / 2 + i * width for i in range(len(groups))]
-                bar_positions = [x + offset[idx] for x in range(len(x_vals))]
-                y_vals = [
-                    (
-                        subset[subset[x_col] == x][y_col].values[0]
-                        if not subset[subset[x_col] == x].empty
-                        else 0
-                    )
-                    for x in x_vals
-                ]
+        if plot_type == "line":
+            # one pass over the rows instead of a mask per group
+            for group, subset in df.groupby(group_col, sort=False):
+                ax.plot(subset[x_col], subset[y_col], marker=marker, label=str(group))
+        elif plot_type == "bar":
+            x_vals = list(sorted(df[x_col].unique()))
+            y_matrix = bar_matrix(df, x_col, y_col, group_col, groups, x_vals)
+
+            # Offset bar positions for grouped bar plot
+            width = 0.8 / len(groups)
+            positions = np.arange(len(x_vals))
+            for idx, group in enumerate(groups):
                 ax.bar(
-                    bar_positions, y_vals, width=width, label=str(group), align="center"
+                    positions - 0.4 + width / 2 + idx * width,
+                    y_matrix[idx],
+                    width=width,
+                    label=str(group),
+                    align="center",
                 )
-                ax.set_xticks(range(len(x_vals)))
-                ax.set_xticklabels(x_vals)
-            else:
-                raise ValueError("plot_type must be 'line' or 'bar'")
+            ax.set_xticks(range(len(x_vals)))
+            ax.set_xticklabels(x_vals)
+        else:
+            raise ValueError("plot_type must be 'line' or 'bar'")
     else:
         if plot_type == "line":
-            ax.plot(df[x_col], df[y_col], marker="o")
+            ax.plot(df[x_col], df[y_col], marker=marker)
         elif plot_type == "bar":
             ax.bar(df[x_col], df[y_col])
         else:
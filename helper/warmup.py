@@ -0,0 +1,103 @@
+import importlib
+import os
+import threading
+import time
+
+
+# set to 0 to skip the warm-up and load the metadata lazily on first use instead
+WARMUP_ENABLED = os.environ.get("STATSCHAT_WARMUP", "1") != "0"
+
+# seconds between checks of whether a step the page is waiting on has finished
+WARMUP_POLL_SECONDS = float(os.environ.get("STATSCHAT_WARMUP_POLL_SECONDS", 2))
+
+
+class Warmup:
+    """
+    Imports the app's modules and loads the metadata the tools and sidebar need once per server process, on a background thread.
+
+    Steps run in order and record their state ('pending', 'running', 'ready' or 'failed') and duration, so the UI can show that the app is warming up instead of blocking on a download. A failed step is left to be loaded lazily by its caller, as before.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self._state = {
+            name: {"status": "pending", "seconds": None} for name, _ in steps
+        }
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _run(self):
+        for name, func in self.steps:
+            self._state[name]["status"] = "running"
+            start = time.perf_counter()
+            try:
+                func()
+                self._state[name]["status"] = "ready"
+            except Exception as e:
+                self._state[name]["status"] = "failed"
+                self._state[name]["error"] = str(e)
+            self._state[name]["seconds"] = round(time.perf_counter() - start, 2)
+
+    def start(self):
+        "start the warm-up thread, only the first call in a process has an effect"
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def status(self):
+        "state of each step"
+        return {name: dict(state) for name, state in self._state.items()}
+
+    def is_ready(self, name):
+        "whether a step finished, successfully or not, so that reading its result will not block on the warm-up"
+        return (not WARMUP_ENABLED) or self._state[name]["status"] in [
+            "ready",
+            "failed",
+        ]
+
+    def done(self):
+        return all([self.is_ready(name) for name, _ in self.steps])
+
+
+def lazy_step(module, attribute=None):
+    "warm-up step importing `module` and calling its `attribute` on the warm-up thread, so importing this file stays cheap"
+
+    def step():
+        target = importlib.import_module(module)
+        if attribute is not None:
+            for name in attribute.split("."):
+                target = getattr(target, name)
+            target()
+
+    return step
+
+
+warmup = Warmup(
+    [
+        # the modules app.py imports once the user has logged in
+        ("chat_module", lazy_step("helper.chat")),
+        ("sidebar_module", lazy_step("helper.sidebar")),
+        (
+            "unctadstat_key",
+            lazy_step("helper.metadata", "metadata_registry.unctadstat_key"),
+        ),
+        ("country_key", lazy_step("helper.metadata", "metadata_registry.country_key")),
+        (
+            "country_group_key",
+            lazy_step("helper.metadata", "metadata_registry.country_group_key"),
+        ),
+        (
+            "country_registry",
+            lazy_step("helper.country_registry", "country_registry.iso3s"),
+        ),
+        ("product_index", lazy_step("helper.product_index", "load_product_indexes")),
+        ("wb_indicator_key", lazy_step("helper.wb", "get_wb_indicator_list")),
+    ]
+)
+
+
+def start_warmup():
+    "start the background warm-up if enabled"
+    if WARMUP_ENABLED:
+        warmup.start()
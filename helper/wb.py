@@ -1,26 +1,198 @@
+import json
 import os
 import pandas as pd
-import requests
+import pyarrow as pa
+import pyarrow.parquet as pq
+import threading
+import time
 
+from helper.http_client import http_get
+from helper.parallel import parallel_map
 
-def get_wb_indicator_list():
-    "get metadata information of wb_indicators"
 
-    if os.path.exists("metadata/wb_key.csv"):
-        wb_info = pd.read_csv("metadata/wb_key.csv")
-    else:
-        base_url = "https://api.worldbank.org/v2/indicator"
-        params = {
-            "format": "json",
-            "per_page": 30000,
+WB_KEY_PATH = "metadata/wb_key.parquet"
+LEGACY_WB_KEY_PATH = "metadata/wb_key.csv"
+WB_INDICATOR_URL = "https://api.worldbank.org/v2/indicator"
+
+# bump when the columns of the catalog file change, older files are then rebuilt
+SCHEMA_VERSION = 1
+
+# indicators per page of the catalog download, pages are fetched concurrently
+PER_PAGE = int(os.environ.get("STATSCHAT_WB_CATALOG_PER_PAGE", 1000))
+
+# seconds after which the catalog is checked in the background, downloading it again only if the listing changed
+REFRESH_INTERVAL = int(os.environ.get("STATSCHAT_WB_CATALOG_REFRESH", 7 * 24 * 60 * 60))
+
+_refresh_lock = threading.Lock()
+
+
+def fetch_indicator_page(page, per_page=PER_PAGE):
+    "one page of the WB indicator list, as (header, records)"
+    response = http_get(
+        WB_INDICATOR_URL,
+        params={"format": "json", "per_page": per_page, "page": page},
+    )
+    header, records = response.json()
+
+    return header, records or []
+
+
+def fetch_indicator_catalog(per_page=PER_PAGE, first_page=None):
+    "download the full WB indicator list, fetching the pages after the first concurrently, `first_page` is the (header, records) of page 1 if already fetched"
+    header, records = first_page or fetch_indicator_page(1, per_page)
+    pages = parallel_map(
+        lambda page: fetch_indicator_page(page, per_page)[1],
+        range(2, int(header["pages"]) + 1),
+    )
+    records = records + [_ for page in pages for _ in page]
+
+    # the API reports its total, counting indicators listed under more than one source each time, so fewer records means pages went missing
+    if len(records) < int(header["total"]):
+        raise ValueError(
+            f"WB indicator catalog incomplete: {len(records)} of {header['total']} records"
+        )
+
+    catalog = pd.DataFrame(
+        {
+            "indicator": [_["id"] for _ in records],
+            "name": [_["name"] for _ in records],
+        }
+    ).drop_duplicates(subset="indicator", ignore_index=True)
+
+    return catalog
+
+
+def listing(header, records):
+    "what the first page of the indicator list says about the full list, its total and first indicator ids"
+    return {"total": int(header["total"]), "first_ids": [_["id"] for _ in records]}
+
+
+def write_catalog(catalog, fetched_at, first_page_listing=None):
+    "save the catalog as parquet, with its schema version, download time and the listing of the first page it came from in the file metadata"
+    table = pa.Table.from_pandas(catalog, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            b"statschat_schema_version": str(SCHEMA_VERSION).encode(),
+            b"statschat_fetched_at": str(fetched_at).encode(),
+            b"statschat_listing": json.dumps(first_page_listing).encode(),
         }
+    )
+    tmp_path = WB_KEY_PATH + ".tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, WB_KEY_PATH)
+
+
+def read_catalog():
+    "the saved catalog, its download time and first page listing, None if there is no file of the current schema version"
+    try:
+        table = pq.read_table(WB_KEY_PATH)
+    except:
+        return None
+
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"statschat_schema_version") != str(SCHEMA_VERSION).encode():
+        return None
+
+    return (
+        table.to_pandas(),
+        float(metadata.get(b"statschat_fetched_at", b"0")),
+        json.loads(metadata.get(b"statschat_listing", b"null")),
+    )
+
+
+def diff_catalog(old, new):
+    "indicator ids added, removed and renamed between two catalogs"
+    old_names = dict(zip(old["indicator"], old["name"]))
+    new_names = dict(zip(new["indicator"], new["name"]))
+
+    return {
+        "added": [_ for _ in new_names if _ not in old_names],
+        "removed": [_ for _ in old_names if _ not in new_names],
+        "renamed": [
+            _ for _ in new_names if _ in old_names and old_names[_] != new_names[_]
+        ],
+    }
+
+
+def refresh_catalog():
+    """
+    Check the WB indicator list against the saved catalog and save the current one.
+
+    Only the first page is downloaded when it and the total number of indicators are the same as at the last full download, the saved catalog is then kept as is. Most additions and removals change the total, those that cancel out on a later page, and renamed indicators, are picked up at the next full download.
+
+    Returns:
+        dict: indicator ids added, removed and renamed, None if there was no saved catalog or a refresh is already running
+    """
+    if not _refresh_lock.acquire(blocking=False):
+        return None  # a refresh is already running
+    try:
+        first_page = fetch_indicator_page(1)
+        first_page_listing = listing(*first_page)
+        saved = read_catalog()
+        if saved is not None and saved[2] == first_page_listing:
+            write_catalog(saved[0], time.time(), first_page_listing)
+            return {"added": [], "removed": [], "renamed": []}
+
+        new = fetch_indicator_catalog(first_page=first_page)
+        if saved is None:
+            write_catalog(new, time.time(), first_page_listing)
+            return None
+
+        old = saved[0]
+        changes = diff_catalog(old, new)
+        if any([len(_) > 0 for _ in changes.values()]):
+            # keep the existing order, appending new indicators at the end
+            merged = old.loc[
+                lambda x: x["indicator"].isin(new["indicator"]), ["indicator"]
+            ].merge(new, on="indicator", how="left")
+            merged = pd.concat(
+                [merged, new.loc[lambda x: x["indicator"].isin(changes["added"]), :]],
+                ignore_index=True,
+            )
+        else:
+            merged = old
+        write_catalog(merged, time.time(), first_page_listing)
+
+        return changes
+    finally:
+        _refresh_lock.release()
+
+
+def refresh_catalog_in_background():
+    def refresh():
+        try:
+            refresh_catalog()
+        except:
+            pass
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def get_wb_indicator_list():
+    "get metadata information of wb_indicators"
+    saved = read_catalog()
 
-        response = requests.get(base_url, params=params)
+    if saved is None and os.path.exists(LEGACY_WB_KEY_PATH):
+        # migrate the old CSV, marked as never fetched so it is refreshed right away
+        wb_info = pd.read_csv(LEGACY_WB_KEY_PATH)
+        try:
+            write_catalog(wb_info, 0)
+        except:
+            pass
+        saved = (wb_info, 0, None)
 
-        ids = [_["id"] for _ in response.json()[1]]
-        names = [_["name"] for _ in response.json()[1]]
-        wb_info = pd.DataFrame({"indicator": ids, "name": names})
+    if saved is None:
+        first_page = fetch_indicator_page(1)
+        wb_info = fetch_indicator_catalog(first_page=first_page)
+        try:
+            write_catalog(wb_info, time.time(), listing(*first_page))
+        except:
+            pass
+        return wb_info
 
-        wb_info.to_csv("metadata/wb_key.csv", index=False)
+    wb_info, fetched_at, _ = saved
+    if time.time() - fetched_at > REFRESH_INTERVAL:
+        refresh_catalog_in_background()
 
     return wb_info
@@ -0,0 +1,105 @@
+import streamlit as st
+import time
+
+from helper.ui import check_admin_password
+
+
+st.set_page_config(
+    page_title="Statschat admin",
+    page_icon="https://www.svgrepo.com/show/273699/stats-chart.svg",
+    layout="wide",
+)
+
+st.title("Statschat latency and tokens")
+
+# the questions of every user are shown below, so the page has its own password rather than the chat's shared one
+if not check_admin_password():
+    st.stop()
+
+# imported only once logged in, so the login screen shows without waiting on them
+import pandas as pd
+
+from helper.tracing import percentiles, span_store
+
+days = st.number_input("Days to show", min_value=1, value=7, step=1)
+spans = span_store.read(since=time.time() - days * 24 * 60 * 60)
+
+if len(spans) == 0:
+    st.info("No traces recorded in this period yet.")
+    st.stop()
+
+queries = spans.loc[lambda x: x["kind"] == "query", :]
+
+st.markdown("### Questions")
+st.dataframe(
+    percentiles(queries.assign(kind="question"), ["kind", "model", "status"]),
+    hide_index=True,
+)
+
+st.markdown("### Pipeline stages")
+st.dataframe(
+    percentiles(
+        spans.loc[lambda x: x["kind"].isin(["stage", "routing"]), :],
+        ["name", "model"],
+    ),
+    hide_index=True,
+)
+
+st.markdown("### Data source requests")
+st.dataframe(
+    percentiles(spans.loc[lambda x: x["kind"] == "http", :], ["source", "status"]),
+    hide_index=True,
+)
+
+st.markdown("### Tokens per model")
+st.dataframe(
+    queries.groupby("model")[["n_tokens_input", "n_tokens_output"]].sum().reset_index(),
+    hide_index=True,
+)
+
+st.markdown("### Slowest questions")
+slowest = (
+    queries.sort_values("seconds", ascending=False)
+    .head(50)
+    .assign(
+        started_at=lambda x: pd.to_datetime(x["started_at"], unit="s").dt.round("s")
+    )
+    .loc[
+        :,
+        [
+            "trace_id",
+            "started_at",
+            "seconds",
+            "model",
+            "status",
+            "n_tokens_input",
+            "n_tokens_output",
+            "detail",
+        ],
+    ]
+    .rename(columns={"detail": "question"})
+)
+st.dataframe(slowest, hide_index=True)
+
+trace_id = st.selectbox("Spans of question", options=slowest["trace_id"])
+st.dataframe(
+    spans.loc[lambda x: x["trace_id"] == trace_id, :]
+    .sort_values("started_at")
+    .assign(
+        offset=lambda x: (x["started_at"] - x["started_at"].min()).round(3),
+        seconds=lambda x: x["seconds"].round(3),
+    )
+    .loc[
+        :,
+        [
+            "kind",
+            "name",
+            "offset",
+            "seconds",
+            "status",
+            "n_tokens_input",
+            "n_tokens_output",
+        ],
+    ],
+    hide_index=True,
+)
@@ -0,0 +1,55 @@
+import os
+import pandas as pd
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.periods import parse_period_codes
+
+import legacy_periods
+
+
+# rows of the benchmarked column, about the size of a sharded monthly commodity price query
+N_ROWS = int(os.environ.get("STATSCHAT_BENCH_ROWS", 1_000_000))
+
+
+def sample_codes(kind, n_rows):
+    "a column of n_rows codes cycling through the periods of 1950-2024, as UNCTADstat returns them"
+    periods = {"semester": ("S", 2), "quarter": ("Q", 4), "month": ("M", 12)}
+    if kind == "span":
+        codes = [f"{year}{year + 1}" for year in range(1950, 2025)]
+    else:
+        letter, n = periods[kind]
+        codes = [
+            f"{year}{letter}{period:02}"
+            for year in range(1950, 2025)
+            for period in range(1, n + 1)
+        ]
+    return pd.Series((codes * (n_rows // len(codes) + 1))[:n_rows])
+
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def report(n_rows=N_ROWS):
+    "time the per-row and vectorized parsers on each kind of period and check that they agree"
+    for kind, parser in legacy_periods.PARSERS.items():
+        codes = sample_codes(kind, n_rows)
+        old, old_seconds = timed(
+            lambda: pd.to_datetime(pd.Series([parser(_) for _ in codes])).astype(
+                "datetime64[ns]"
+            )
+        )
+        new, new_seconds = timed(lambda: parse_period_codes(codes, kind))
+        same = old.equals(new)
+        print(
+            f"{kind:>8}: {n_rows:,} rows, per-row {old_seconds:.2f} s, vectorized {new_seconds:.3f} s ({old_seconds / new_seconds:.0f}x), {'same' if same else 'DIFFERENT'} dates"
+        )
+
+
+if __name__ == "__main__":
+    report()
@@ -0,0 +1,100 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import os
+import pandas as pd
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.viz_tools import bar_matrix, gen_plot
+
+import legacy_viz_tools
+
+
+# size of the benchmarked panel, countries x years, and the share of (country, year) pairs left out
+N_COUNTRIES = int(os.environ.get("STATSCHAT_BENCH_COUNTRIES", 200))
+N_YEARS = int(os.environ.get("STATSCHAT_BENCH_YEARS", 70))
+GAP_SHARE = 0.035
+
+# 200 legend entries don't fit the figure, which is the same for both versions
+warnings.filterwarnings("ignore", "Tight layout not applied")
+
+
+def sample_panel(n_countries, n_years, gap_share=GAP_SHARE, seed=0):
+    "a long panel of one value per country and year, with some pairs missing"
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "country": np.repeat(
+                [f"Country {i:03}" for i in range(n_countries)], n_years
+            ),
+            "year": np.tile(np.arange(1955, 1955 + n_years), n_countries),
+            "value": rng.normal(size=n_countries * n_years),
+        }
+    )
+    return df.loc[rng.random(len(df)) >= gap_share, :].reset_index(drop=True)
+
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def plot_seconds(f, **kwargs):
+    "seconds to build and draw a figure"
+
+    def draw():
+        figure = f(**kwargs)
+        figure.canvas.draw()
+        plt.close(figure)
+
+    return timed(draw)[1]
+
+
+def report(n_countries=N_COUNTRIES, n_years=N_YEARS):
+    "time the masked and pivoted grouped bar data, and both whole gen_plot versions, on a panel"
+    df = sample_panel(n_countries, n_years)
+    print(f"{n_countries} countries x {n_years} years, {len(df):,} rows")
+
+    old, old_seconds = timed(
+        lambda: legacy_viz_tools.masked_bar_heights(df, "year", "value", "country")
+    )
+    new, new_seconds = timed(
+        lambda: bar_matrix(
+            df,
+            "year",
+            "value",
+            "country",
+            df["country"].unique(),
+            list(sorted(df["year"].unique())),
+        )
+    )
+    same = np.array_equal(np.array(old), new)
+    print(
+        f"bar data: masked {old_seconds:.2f} s, pivoted {new_seconds * 1000:.0f} ms, {'same' if same else 'DIFFERENT'} heights"
+    )
+
+    for plot_type in ["bar", "line"]:
+        kwargs = {
+            "df": df,
+            "x_col": "year",
+            "y_col": "value",
+            "group_col": "country",
+            "plot_type": plot_type,
+        }
+        old_seconds = plot_seconds(legacy_viz_tools.gen_plot, **kwargs)
+        new_seconds = plot_seconds(lambda **x: gen_plot.invoke(x), **kwargs)
+        print(
+            f"whole {plot_type} gen_plot: masked {old_seconds:.2f} s, pivoted {new_seconds:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    report()
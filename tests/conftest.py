@@ -0,0 +1,47 @@
+import os
+import pandas as pd
+import pytest
+import sys
+from types import SimpleNamespace
+
+# the app's modules are imported as `helper.*`, from the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from helper.cache import DiskCache, _dump_text, _load_text
+import helper.llm
+from helper.llm import StatschatLLM
+
+from fakes import FakeCompletions
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    "StatschatLLM answered by a fake client, with its own response cache, run from a temporary folder"
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(helper.llm, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(
+        helper.llm,
+        "llm_cache",
+        DiskCache(
+            directory=str(tmp_path / "llm_responses"),
+            ttl=60,
+            max_bytes=1024 * 1024,
+            suffix=".txt",
+            dump=_dump_text,
+            load=_load_text,
+        ),
+    )
+
+    llm = StatschatLLM(
+        api_key="test",
+        base_url="http://localhost",
+        model_name="test-model",
+        temperature=0.0,
+        system_prompts=pd.read_csv(
+            os.path.join(REPO_ROOT, "metadata/system_prompts.csv")
+        ),
+    )
+    llm._client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+    return llm
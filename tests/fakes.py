@@ -0,0 +1,72 @@
+import json
+from langchain_core.tools import tool
+import pandas as pd
+import re
+from types import SimpleNamespace
+
+
+QUERY_ID = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+
+# what the test data tool returns, tests change it to simulate new data
+TEST_DATA = {"year": [2020, 2021, 2022], "value": [1.0, 2.0, 3.0]}
+
+
+@tool
+def get_test_data():
+    """
+    Returns yearly test values.
+    """
+    return pd.DataFrame(TEST_DATA)
+
+
+class FakeCompletions:
+    "answers each pipeline step the way a model would, counting the requests"
+
+    def __init__(self, n_broken_pandas_calls=0, tool_calls=None, routing=None):
+        self.n_calls = 0
+        self.n_broken_pandas_calls = n_broken_pandas_calls
+        # the data calls picked for a question, by default one get_test_data call
+        self.tool_calls = tool_calls or {"name": "get_test_data", "arguments": {}}
+        # raw answer to the product table pre-routing prompt, if None it is answered like a commentary
+        self.routing = routing
+
+    def create(self, messages, **kwargs):
+        self.n_calls += 1
+        prompt = messages[-1]["content"]
+        query_id = (re.findall(QUERY_ID, prompt) or [""])[0]
+
+        if "visualization tools" in prompt:
+            content = json.dumps(
+                {
+                    "name": "gen_plot",
+                    "arguments": {
+                        "df": f"{query_id}_result.csv",
+                        "x_col": "year",
+                        "y_col": "value",
+                    },
+                }
+            )
+        elif "reports/tables" in prompt and self.routing is not None:
+            content = self.routing
+        elif "following set of tools" in prompt:
+            content = json.dumps(self.tool_calls)
+        elif "Using Pandas" in prompt and self.n_broken_pandas_calls > 0:
+            self.n_broken_pandas_calls -= 1
+            content = "```python\nraise ValueError()\n```"
+        elif "Using Pandas" in prompt:
+            content = f"""```python\nself._data["{query_id}_result"] = self._data["{query_id}_0"].copy()\n```"""
+        else:
+            content = "Values rose every year."
+
+        if kwargs.get("stream"):
+            return self.chunks(content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
+
+    def chunks(self, content):
+        "a streamed answer, word by word"
+        for word in re.findall(r"\S+\s*", content):
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=word))]
+            )
@@ -0,0 +1,73 @@
+import datetime
+
+
+# the per-row period parsing of the UNCTADstat tools before helper/periods.py, kept as the reference the vectorized version is checked and timed against
+
+
+def parse_semester(d):
+    return (
+        datetime.date(int(d[:4]), 6 if d[4:] == "S01" else 12, 1)
+        if isinstance(d, str)
+        and len(d) == 7
+        and d[4] == "S"
+        and d[5:7].isdigit()
+        and (d[5:7] == "01" or d[5:7] == "02")
+        else None
+    )
+
+
+def parse_quarter(d):
+    return (
+        datetime.date(int(d[:4]), (int(d[5:]) - 1) * 3 + 3, 1)
+        if isinstance(d, str)
+        and len(d) == 7
+        and d[4] == "Q"
+        and d[5:].isdigit()
+        and 1 <= int(d[5:]) <= 4
+        else None
+    )
+
+
+def parse_month(d):
+    "'2023M1' was accepted by strptime but never comes from UNCTADstat, only the 7-character form is compared"
+    if not isinstance(d, str) or len(d) != 7:
+        return None
+    return datetime.datetime.strptime(d, "%YM%m").date()
+
+
+def parse_span(d):
+    "two-year codes like '20222023', dated to the end year"
+    return (
+        datetime.date(int(d[4:]), 1, 1)
+        if isinstance(d, str)
+        and len(d) == 8
+        and d.isdigit()
+        and int(d[4:]) == int(d[:4]) + 1
+        else None
+    )
+
+
+PARSERS = {
+    "semester": parse_semester,
+    "quarter": parse_quarter,
+    "month": parse_month,
+    "span": parse_span,
+}
+
+
+def parse(kind, d):
+    "a code parsed the old way, None where the old parser returned None or raised and failed the whole tool call"
+    try:
+        return PARSERS[kind](d)
+    except ValueError:
+        return None
+
+
+def enumerate_codes(start_date, end_date, letter, periods_per_year):
+    return [
+        f"{year}{letter}{period:02}"
+        for year in list(range(int(start_date[:4]), int(end_date[:4]) + 1))
+        for period in range(1, periods_per_year + 1)
+        if f"{year}{letter}{period:02}" >= start_date
+        and f"{year}{letter}{period:02}" <= end_date
+    ]
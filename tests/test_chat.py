@@ -0,0 +1,121 @@
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import helper.chat
+from helper.query_memo import QueryMemo
+from helper.viz_tools import gen_plot
+
+from fakes import get_test_data
+
+
+def chat_app():
+    from helper.chat import populate_chat, user_question
+
+    populate_chat()
+    user_question()
+
+
+@pytest.fixture
+def app(llm, monkeypatch):
+    "the chat page of a logged-in session, answered by the fake client, with its own answer memo"
+    monkeypatch.setattr(helper.chat, "query_memo", QueryMemo())
+    monkeypatch.setattr(helper.chat, "get_test_data", get_test_data, raising=False)
+
+    app = AppTest.from_function(chat_app, default_timeout=60)
+    app.session_state["llm"] = llm
+    app.session_state["routing_llm"] = llm
+    app.session_state["prior_query_id"] = None
+    app.session_state["tools"] = [get_test_data]
+    app.session_state["viz_tools"] = [gen_plot]
+    app.session_state["use_free_plot"] = False
+    for step in [
+        "run_gen_pandas_df",
+        "run_explain_pandas_df",
+        "run_gen_final_commentary",
+        "run_gen_plot",
+    ]:
+        app.session_state[step] = True
+    app.session_state["selected_wb_series"] = pd.DataFrame(
+        {"indicator": [], "name": [], "Make available to LLM": []}
+    )
+    # a product table, so each new question makes a pre-routing call
+    app.session_state["selected_unctad_series"] = pd.DataFrame(
+        {
+            "report_code": ["US.TradeMatrix"],
+            "report_name": ["Merchandise trade matrix"],
+            "indicator_code": ["M0100"],
+            "indicator_name": ["US dollars at current prices"],
+            "product_table": ["product_key"],
+            "Make available to LLM": [True],
+        }
+    )
+
+    return app
+
+
+def test_repeated_question_skips_the_pre_routing_call(app, llm, monkeypatch):
+    # counted here, the response cache would answer a repeated routing call without reaching the client
+    routing_calls = []
+    gen_product_routing = helper.chat.gen_product_routing
+    monkeypatch.setattr(
+        helper.chat,
+        "gen_product_routing",
+        lambda *args: routing_calls.append(args) or gen_product_routing(*args),
+    )
+    completions = llm._client.chat.completions
+
+    app.run()
+    app.chat_input[0].set_value("How did the values change?").run()
+    first_query_id = app.session_state["prior_query_id"]
+    n_calls = completions.n_calls
+
+    # a new chat with the same question
+    app.session_state["prior_query_id"] = None
+    app.chat_input[0].set_value("How did the values change?").run()
+
+    assert not app.exception
+    assert len(routing_calls) == 1
+    assert completions.n_calls == n_calls
+    reused = llm._query_results[app.session_state["prior_query_id"]]
+    assert "reused" in reused
+    assert reused["routing"] == llm._query_results[first_query_id]["routing"]
+
+
+def test_failed_query_detaches_the_stage_progress(app, llm, monkeypatch):
+    def chat(*args, **kwargs):
+        llm._emit({"stage": "tool_call", "event": "started", "time": 0})
+        raise ValueError("API down")
+
+    monkeypatch.setattr(type(llm), "chat", lambda self, *args, **kwargs: chat())
+    n_listeners = len(llm._stage_listeners)
+
+    app.run()
+    app.chat_input[0].set_value("How did the values change?").run()
+
+    assert "API down" in app.exception[0].message
+    assert len(llm._stage_listeners) == n_listeners
+    assert llm._stream_sink is None
+
+
+def test_past_messages_show_their_details_when_asked(app):
+    app.run()
+    app.chat_input[0].set_value("How did the values change?").run()
+    # the answer is shown with its details as it comes in
+    assert "Initial data call" in [_.label for _ in app.expander]
+
+    # then as a past message on the next rerun, folded
+    app.run()
+    assert [_.label for _ in app.toggle] == ["Show details"]
+    assert len(app.expander) == 0
+    assert len(app.markdown) > 0
+
+    app.toggle[0].set_value(True).run()
+    assert [_.label for _ in app.expander][:2] == [
+        "Initial data call",
+        "Python data manipulation",
+    ]
+    assert len(app.expander) == 7
+
+    app.toggle[0].set_value(False).run()
+    assert len(app.expander) == 0
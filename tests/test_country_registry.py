@@ -0,0 +1,29 @@
+from helper.country_registry import CountryRegistry
+from helper.metadata import metadata_registry
+
+from conftest import REPO_ROOT
+
+
+def test_countries_come_from_the_metadata_registry(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    iso3_codes = {"XKX": "0412", "EUU": "0918"}
+    group_parent_codes = {"European Union (2020 …)": "0918"}
+    monkeypatch.setattr(metadata_registry, "iso3_codes", lambda download: iso3_codes)
+    monkeypatch.setattr(
+        metadata_registry, "group_parent_codes", lambda download: group_parent_codes
+    )
+    registry = CountryRegistry()
+
+    # ISO3 codes from the country key are countries unless UNCTAD uses their code for a group
+    assert registry.classify(["FRA", "XKX", "EUU", "WLD"]).tolist() == [
+        "country",
+        "country",
+        "group",
+        "group",
+    ]
+
+    # rebuilt only once the registry reloads a key
+    iso3s = registry.iso3s()
+    assert registry.iso3s() is iso3s
+    iso3_codes = {"XKX": "0412", "EUU": "0918", "XXK": "0413"}
+    assert registry.is_country("XXK")
@@ -0,0 +1,72 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper.downsample import fit_to_axes, minmax_indices
+
+
+@pytest.fixture
+def ax():
+    figure, ax = plt.subplots(figsize=(2, 1), dpi=100)
+    yield ax
+    plt.close(figure)
+
+
+def long_panel(n=5000, seed=0):
+    "two interleaved daily series, the second with a run of missing values"
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "date": np.repeat(pd.date_range("2000-01-01", periods=n), 2),
+            "group": np.tile(["a", "b"], n),
+            "value": rng.normal(size=2 * n).cumsum(),
+        }
+    )
+    df.loc[(df["group"] == "b") & df.index.isin(range(4000, 5000)), "value"] = np.nan
+    return df
+
+
+def test_each_series_keeps_its_extremes_gaps_and_order(ax):
+    df = long_panel()
+
+    fitted, marker = fit_to_axes(ax, df, "date", "value", "group")
+
+    assert len(fitted) < len(df) / 10
+    assert marker is None
+    assert fitted.index.is_monotonic_increasing
+    for group in ["a", "b"]:
+        kept = fitted.loc[lambda x: x["group"] == group, :]
+        series = df.loc[lambda x: x["group"] == group, :]
+        assert kept["value"].min() == series["value"].min()
+        assert kept["value"].max() == series["value"].max()
+        assert kept.index[[0, -1]].tolist() == series.index[[0, -1]].tolist()
+    # the line is still broken where the values are missing
+    gap = fitted.loc[lambda x: (x["group"] == "b") & x.index.isin(range(4000, 5000))]
+    assert len(gap) > 0 and gap["value"].isna().all()
+
+
+def test_short_series_are_left_whole_with_markers(ax):
+    df = long_panel(n=20)
+
+    fitted, marker = fit_to_axes(ax, df, "date", "value", "group")
+
+    assert fitted.equals(df)
+    assert marker == "o"
+
+
+def test_minmax_keeps_bucket_extremes():
+    y = np.array([3.0, 1.0, 2.0, 9.0, np.nan, np.nan, 5.0, 4.0, 0.0, 6.0])
+
+    kept = minmax_indices(y, 2)
+
+    assert kept.tolist() == [0, 1, 3, 8, 9]
+    # a bucket with only missing values keeps one of them
+    assert (
+        np.isnan(y[minmax_indices(np.array([1.0, 2.0, np.nan, np.nan]), 1)]).sum() == 0
+    )
+    assert minmax_indices(np.array([np.nan] * 6 + [1.0] * 6), 2).tolist()[0] == 0
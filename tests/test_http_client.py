@@ -0,0 +1,33 @@
+import pytest
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, ReadTimeoutError
+
+import helper.http_client
+from helper.http_client import get_session
+
+
+@pytest.fixture
+def retry(monkeypatch):
+    "the retry policy of a new shared session"
+    monkeypatch.setattr(helper.http_client, "_session", None)
+    return get_session().get_adapter("https://unctadstat-api.unctad.org").max_retries
+
+
+def test_posts_are_retried_only_before_they_are_handled(retry):
+    for status in [429, 503]:
+        assert retry.is_retry("POST", status)
+    for status in [500, 502, 504]:
+        assert not retry.is_retry("POST", status)
+        assert retry.is_retry("GET", status)
+
+    # a connection that was never made is retried, a read that timed out may have run the query
+    assert retry.increment("POST", "/", error=ConnectTimeoutError()).total == 2
+    with pytest.raises(ReadTimeoutError):
+        retry.increment("POST", "/", error=ReadTimeoutError(None, "/", "timed out"))
+    assert retry.increment("GET", "/", error=ReadTimeoutError(None, "/", "")).total == 2
+
+
+def test_retries_are_bounded(retry):
+    for _ in range(3):
+        retry = retry.increment("POST", "/", error=ConnectTimeoutError())
+    with pytest.raises(MaxRetryError):
+        retry.increment("POST", "/", error=ConnectTimeoutError())
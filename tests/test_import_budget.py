@@ -0,0 +1,20 @@
+import os
+import pytest
+import subprocess
+import sys
+
+from conftest import REPO_ROOT
+
+
+@pytest.mark.parametrize("budget_ms, returncode", [("100000", 0), ("0", 1)])
+def test_exit_code_reports_the_budget(budget_ms, returncode):
+    process = subprocess.run(
+        [sys.executable, "-m", "helper.import_budget"],
+        capture_output=True,
+        text=True,
+        cwd=REPO_ROOT,
+        env={**os.environ, "STATSCHAT_IMPORT_BUDGET_MS": budget_ms},
+    )
+
+    assert process.returncode == returncode, process.stderr
+    assert "Login screen imports" in process.stdout
@@ -0,0 +1,30 @@
+import io
+import pandas as pd
+
+from helper.ingest import model_dtypes, read_csv_stream, unctadstat_dtypes
+
+CSV = b"""Economy_Label,Flow_Label,Year,M3700_Value
+France,Exports,2022,1.5
+Chile,Imports,2023,2.5
+France,Imports,2023,
+"""
+
+
+def test_stream_is_parsed_compactly_and_widened_for_the_model():
+    return_columns = "Economy/Label,Flow/Label,Year,M3700/Value"
+
+    df = read_csv_stream(
+        io.BytesIO(CSV), unctadstat_dtypes(return_columns), chunksize=2
+    )
+
+    assert isinstance(df["Economy_Label"].dtype, pd.CategoricalDtype)
+    assert df["Economy_Label"].cat.categories.tolist() == ["Chile", "France"]
+    assert df["Year"].dtype == "int16"
+
+    df = model_dtypes(df)
+
+    assert df["Economy_Label"].dtype == object
+    assert df["Flow_Label"].tolist() == ["Exports", "Imports", "Imports"]
+    assert df["Year"].dtype == "int64"
+    assert (df["Year"] * 100 + 12).tolist() == [202212, 202312, 202312]
+    assert df["M3700_Value"].isna().tolist() == [False, False, True]
@@ -0,0 +1,102 @@
+import pytest
+
+from fakes import get_test_data
+
+from helper.llm import gen_product_routing
+from helper.viz_tools import gen_plot
+
+PRODUCT_TABLES = "report_code: US.TradeMatrix, product_table: product_key"
+
+
+@pytest.mark.parametrize(
+    "response, report_code, keywords",
+    [
+        (
+            '```json\n{"report_code": " US.TradeMatrix ", "keywords": ["Fish", "Frozen Fish"]}\n```',
+            "US.TradeMatrix",
+            ["fish", "frozen fish"],
+        ),
+        ('{"report_code": "no", "keywords": []}', None, []),
+        # no keywords key
+        ('{"report_code": "US.TradeMatrix"}', "US.TradeMatrix", []),
+        # not JSON at all
+        ("The trade matrix is needed.", None, []),
+    ],
+)
+def test_routing_is_parsed_or_falls_back(llm, response, report_code, keywords):
+    llm._client.chat.completions.routing = response
+
+    routing = gen_product_routing(llm, "Fish exports of Norway?", PRODUCT_TABLES)
+
+    assert routing["report_code"] == report_code
+    assert routing["keywords"] == keywords
+    assert routing["n_tokens_input"] > 0
+
+
+def test_explanation_and_commentary_are_streamed_to_the_sink(llm):
+    streamed = []
+    llm.set_stream_sink(lambda stage, text: streamed.append((stage, text)))
+
+    result = llm.chat(
+        "How did the values change?", tools=[get_test_data], plot_tools=[], quiet=True
+    )
+
+    # the text so far after each chunk, llads' validation call then answers the same prompt from the cache
+    commentary = [text for stage, text in streamed if stage == "commentary"]
+    assert commentary == [
+        "Values ",
+        "Values rose ",
+        "Values rose every ",
+        "Values rose every year.",
+        "Values rose every year.",
+    ]
+    assert commentary[-1] == result["commentary"]["commentary"]
+    assert [stage for stage, _ in streamed[:4]] == ["explanation"] * 4
+
+    # an answer from the response cache reaches the sink whole
+    streamed.clear()
+    llm.chat(
+        "How did the values change?", tools=[get_test_data], plot_tools=[], quiet=True
+    )
+    assert streamed == [
+        ("explanation", "Values rose every year."),
+        ("commentary", "Values rose every year."),
+        ("commentary", "Values rose every year."),
+    ]
+
+
+def test_stage_listeners_see_each_stage_start_and_finish_in_order(llm):
+    events = []
+    llm.add_stage_listener(lambda event: events.append(event))
+
+    # a broken listener doesn't stop the query or the other listeners
+    def broken(event):
+        raise ValueError()
+
+    llm.add_stage_listener(broken)
+
+    llm.chat(
+        "How did the values change?",
+        tools=[get_test_data],
+        plot_tools=[gen_plot],
+        quiet=True,
+    )
+
+    stages = ["tool_call", "pandas_df", "explanation", "commentary", "plot"]
+    assert [(_["stage"], _["event"]) for _ in events] == [
+        (stage, event) for stage in stages for event in ["started", "finished"]
+    ]
+    assert all(
+        finished["time"] >= started["time"]
+        for started, finished in zip(events[::2], events[1::2])
+    )
+    # the tool call's payload carries the query id the later stages refer to
+    assert events[1]["payload"]["query_id"] in llm._query_results
+
+    llm.remove_stage_listener(broken)
+    events.clear()
+    llm.remove_stage_listener(llm._stage_listeners[-1])
+    llm.chat(
+        "How did the values change?", tools=[get_test_data], plot_tools=[], quiet=True
+    )
+    assert events == []
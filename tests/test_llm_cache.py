@@ -0,0 +1,55 @@
+import pandas as pd
+
+from helper.llm import mask_query_ids, unmask_query_ids
+from helper.viz_tools import gen_plot
+
+from fakes import get_test_data
+
+
+def test_mask_query_ids_round_trip():
+    query_id = "0b4e2c1a-1111-4222-8333-444455556666"
+    text = f'self._data["{query_id}_result"] and _{query_id.replace("-", "_")}_plot'
+
+    masked, query_ids = mask_query_ids(text)
+
+    assert query_id not in masked
+    assert query_ids == [query_id]
+    other_id = "aaaaaaaa-bbbb-4ccc-8ddd-eeeeeeeeeeee"
+    assert unmask_query_ids(masked, [other_id]) == text.replace(
+        query_id, other_id
+    ).replace(query_id.replace("-", "_"), other_id.replace("-", "_"))
+
+
+def test_repeated_question_makes_no_client_calls(llm):
+    completions = llm._client.chat.completions
+    options = {"tools": [get_test_data], "plot_tools": [gen_plot], "quiet": True}
+
+    first = llm.chat("How did the values change?", **options)
+    n_first_calls = completions.n_calls
+    second = llm.chat("How did the values change?", **options)
+    first_query_id = first["tool_result"]["query_id"]
+    second_query_id = second["tool_result"]["query_id"]
+
+    assert n_first_calls > 0
+    assert completions.n_calls == n_first_calls
+    assert second_query_id != first_query_id
+
+    # the cached code and plot call were run against the second query's own data
+    assert second_query_id in second["pd_code"]["pd_code"]
+    assert first_query_id not in second["pd_code"]["pd_code"]
+    pd.testing.assert_frame_equal(second["dataset"], first["dataset"])
+    assert not isinstance(second["plots"]["invoked_result"][0], str)
+
+
+def test_failed_attempt_is_retried_against_the_api(llm):
+    llm._client.chat.completions.n_broken_pandas_calls = 1
+    options = {"tools": [get_test_data], "plot_tools": [gen_plot], "quiet": True}
+
+    result = llm.chat("How did the values change?", **options)
+
+    # the broken code was cached, the retry of the same request still reached the model and got working code
+    assert result["pd_code"]["pd_code"] != "error"
+    assert "raise" not in result["pd_code"]["pd_code"]
+    pd.testing.assert_frame_equal(
+        result["dataset"], get_test_data.invoke({}), check_like=True
+    )
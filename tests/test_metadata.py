@@ -0,0 +1,43 @@
+import pandas as pd
+
+from helper.metadata import index_country_key, index_country_group_key
+from helper.odata import plan_filter
+
+
+def test_duplicate_iso3_resolves_to_its_first_row():
+    country_key = pd.DataFrame(
+        {
+            "ISO3": ["FRA", "CHL", "FRA"],
+            "UNCTAD_code": ["0251", "0152", "0250"],
+            "UNCTAD_name": ["France", "Chile", "France incl. Monaco"],
+        }
+    )
+
+    index = index_country_key(country_key)
+
+    assert index["iso3_to_code"] == {"FRA": "0251", "CHL": "0152"}
+    assert index["codes"] == ["0251", "0152", "0250"]
+
+
+def test_group_labels_resolve_to_their_parent_and_members():
+    index = index_country_group_key(
+        pd.DataFrame(
+            {
+                "parent_code": ["0918", "0918", "1400"],
+                "parent_label": ["European Union", "European Union", "Africa"],
+                "child_code": ["0251", "0276", "0012"],
+                "child_label": ["France", "Germany", "Algeria"],
+            }
+        )
+    )
+
+    assert index["parent_code"] == {"European Union": "0918", "Africa": "1400"}
+    assert index["child_codes"]["European Union"] == ["0251", "0276"]
+
+
+def test_unknown_geography_is_planned_as_an_empty_list():
+    # get_unctadstat's country codes when gen_country_filter fails
+    assert (
+        plan_filter([{"field": "Economy/Code", "values": [], "quote": True}])
+        == "Economy/Code in ()"
+    )
@@ -0,0 +1,66 @@
+import pytest
+
+from helper.odata import FLOW_DOMAIN, plan_clause, plan_filter
+
+
+def dimension(field, values, quote=True, **kwargs):
+    return {"field": field, "values": values, "quote": quote, **kwargs}
+
+
+@pytest.mark.parametrize(
+    "dim, clause",
+    [
+        # a single value
+        (dimension("Economy/Code", ["0000"]), "Economy/Code eq '0000'"),
+        (dimension("Year", [2023], quote=False), "Year eq 2023"),
+        # a contiguous run of periods
+        (
+            dimension("Year", [2020, 2021, 2022], quote=False, contiguous=True),
+            "Year ge 2020 and Year le 2022",
+        ),
+        (
+            dimension(
+                "Quarter/Code", ["2023Q03", "2023Q04", "2024Q01"], contiguous=True
+            ),
+            "Quarter/Code ge '2023Q03' and Quarter/Code le '2024Q01'",
+        ),
+        # listed when not contiguous, or when the field can't be compared
+        (dimension("Year", [2020, 2022], quote=False), "Year in (2020,2022)"),
+        (
+            dimension("Economy/Code", ["0004", "0008"], contiguous=True),
+            "Economy/Code in ('0004','0008')",
+        ),
+        # duplicates dropped, order kept
+        (
+            dimension("Economy/Code", ["0008", "0004", "0008"]),
+            "Economy/Code in ('0008','0004')",
+        ),
+        (dimension("Economy/Code", ["0008", "0008"]), "Economy/Code eq '0008'"),
+        # every value of the domain or no filter at all
+        (
+            dimension("Flow/Label", list(reversed(FLOW_DOMAIN)), domain=FLOW_DOMAIN),
+            None,
+        ),
+        (dimension("Economy/Code", None), None),
+        # nothing selected
+        (dimension("Year", [], quote=False, contiguous=True), "Year in ()"),
+        (dimension("Economy/Code", []), "Economy/Code in ()"),
+    ],
+)
+def test_plan_clause(dim, clause):
+    assert plan_clause(dim) == clause
+
+
+def test_plan_filter_joins_the_clauses_that_filter():
+    assert (
+        plan_filter(
+            [
+                dimension("Year", [2021, 2022], quote=False, contiguous=True),
+                dimension("Economy/Code", ["0004", "0008"]),
+                dimension("Flow/Label", ["Exports"], domain=FLOW_DOMAIN),
+                dimension("Flow/Label", FLOW_DOMAIN, domain=FLOW_DOMAIN),
+                dimension("Product/Code", None),
+            ]
+        )
+        == "Year ge 2021 and Year le 2022 and Economy/Code in ('0004','0008') and Flow/Label eq 'Exports'"
+    )
@@ -0,0 +1,77 @@
+from langchain_core.tools import tool
+import threading
+import time
+
+from helper.llm import gen_tool_call
+from helper.parallel import parallel_map
+
+
+class Active:
+    "counts the calls running at once"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.n = 0
+        self.max = 0
+
+    def run(self, seconds):
+        with self.lock:
+            self.n += 1
+            self.max = max(self.max, self.n)
+        time.sleep(seconds)
+        with self.lock:
+            self.n -= 1
+
+
+def test_nested_fan_outs_share_the_worker_budget(monkeypatch):
+    monkeypatch.setattr("helper.parallel.WORKER_BUDGET", 8)
+    active = Active()
+
+    # tool calls, then indicators, then pages, as in a multi-indicator World Bank question
+    results = parallel_map(
+        lambda call: parallel_map(
+            lambda indicator: parallel_map(
+                lambda page: active.run(0.02) or (call, indicator, page), range(8)
+            ),
+            range(8),
+        ),
+        range(4),
+        max_workers=4,
+    )
+
+    assert active.max <= 8
+    assert results[3][7][7] == (3, 7, 7)
+
+
+@tool
+def get_value(seconds: float) -> float:
+    """
+    Returns the number of seconds it waited.
+    """
+    time.sleep(seconds)
+    if seconds < 0:
+        raise ValueError("negative wait")
+    return seconds
+
+
+def test_tool_calls_keep_their_order(llm):
+    # the first call finishes last
+    llm._client.chat.completions.tool_calls = [
+        {"name": "get_value", "arguments": {"seconds": _}} for _ in [0.2, 0.1, 0.0]
+    ]
+
+    output = gen_tool_call(llm, [get_value], "How long?")
+
+    assert output["invoked_result"] == [0.2, 0.1, 0.0]
+    assert len(output["call_seconds"]) == 3
+
+
+def test_one_failed_tool_call_fails_the_step(llm):
+    llm._client.chat.completions.tool_calls = [
+        {"name": "get_value", "arguments": {"seconds": _}} for _ in [0.1, -1, 0.0]
+    ]
+
+    output = gen_tool_call(llm, [get_value], "How long?")
+
+    assert output["invoked_result"] == ["error"]
+    assert output["tool_call"][1]["arguments"]["seconds"] == -1
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from helper.periods import enumerate_period_codes, parse_period_codes
+
+import legacy_periods
+
+
+MALFORMED = [None, "", "2023", "2023X01", "abcdQ01", "2023Q1", "2023Q011", 2023]
+
+CODES = {
+    "semester": ["2023S01", "2023S02", "1950S01", "2023S00", "2023S03", "2023SAB"],
+    "quarter": ["2023Q01", "2023Q04", "1999Q02", "2023Q00", "2023Q05", "2023Q-1"],
+    "month": ["2023M01", "2023M12", "1980M06", "2023M00", "2023M13", "2023M1a"],
+    "span": ["20222023", "19791980", "20232022", "20222024", "2022202a", "2022"],
+}
+
+
+@pytest.mark.parametrize("kind", list(CODES.keys()))
+def test_parse_period_codes_matches_per_row_parser(kind):
+    codes = pd.Series(
+        (CODES[kind] + MALFORMED) * 3,
+        index=range(100, 100 + 3 * len(CODES[kind] + MALFORMED)),
+    )
+
+    parsed = parse_period_codes(codes, kind)
+
+    expected = pd.to_datetime(
+        pd.Series([legacy_periods.parse(kind, _) for _ in codes], index=codes.index)
+    ).astype("datetime64[ns]")
+    pd.testing.assert_series_equal(parsed, expected)
+
+
+def test_parse_period_codes_on_a_categorical_column():
+    codes = pd.Series(["2023Q01", "2023Q02", None, "2023Q01"], dtype="category")
+
+    parsed = parse_period_codes(codes, "quarter")
+
+    assert parsed.tolist()[:2] == [
+        pd.Timestamp("2023-03-01"),
+        pd.Timestamp("2023-06-01"),
+    ]
+    assert pd.isna(parsed[2])
+    assert parsed[3] == parsed[0]
+
+
+@pytest.mark.parametrize(
+    "start_code, end_code, letter, periods_per_year",
+    [
+        ("2023S02", "2025S01", "S", 2),
+        ("2023Q03", "2024Q02", "Q", 4),
+        ("1950Q01", "2024Q04", "Q", 4),
+        ("2023M11", "2024M02", "M", 12),
+        ("2023M05", "2023M05", "M", 12),
+        ("2024M05", "2023M05", "M", 12),
+    ],
+)
+def test_enumerate_period_codes_matches_per_row_enumeration(
+    start_code, end_code, letter, periods_per_year
+):
+    assert enumerate_period_codes(
+        start_code, end_code, letter, periods_per_year
+    ) == legacy_periods.enumerate_codes(start_code, end_code, letter, periods_per_year)
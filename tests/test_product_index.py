@@ -0,0 +1,35 @@
+import pandas as pd
+
+from helper.product_index import ProductIndex
+
+PRODUCTS = pd.DataFrame(
+    {
+        "Product_Code": ["0711", "0712", "0713", "0714", "0715", "0711"],
+        "Product_Label": [
+            "Fish, fresh or chilled",
+            "Fish fillets and other fish meat, frozen",
+            "Crustaceans, frozen",
+            "Frozen fish",
+            "Coffee",
+            "Fish, fresh or chilled",
+        ],
+    }
+)
+
+
+def test_more_and_rarer_keywords_rank_first_then_shorter_labels():
+    index = ProductIndex(PRODUCTS)
+
+    result = index.search(["frozen fishes"])
+
+    # both words, shortest label first, then one of them, duplicate rows only once
+    assert list(result["Product_Code"]) == ["0714", "0712", "0713", "0711"]
+    assert list(result.columns) == ["Product_Code", "Product_Label"]
+    assert index.search(["crustaceans"])["Product_Code"].tolist() == ["0713"]
+
+
+def test_results_are_capped():
+    index = ProductIndex(PRODUCTS)
+
+    assert len(index.search(["fish", "frozen"], limit=2)) == 2
+    assert len(index.search(["tea"])) == 0
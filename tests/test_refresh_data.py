@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+import pytest
+
+import fakes
+from fakes import get_test_data
+from helper.session_memory import plot_png
+from helper.viz_tools import gen_plot
+
+
+@pytest.fixture
+def answered(llm):
+    "the LLM with one answered question, its plot already rasterized"
+    result = llm.chat(
+        "How did the values change?",
+        tools=[get_test_data],
+        plot_tools=[gen_plot],
+        quiet=True,
+    )
+    plot_png(result)
+    return llm, result["tool_result"]["query_id"]
+
+
+def test_refresh_uses_new_data_and_drops_the_old_plot(answered, monkeypatch):
+    llm, query_id = answered
+    monkeypatch.setattr(fakes, "TEST_DATA", {"year": [2023], "value": [9.0]})
+
+    llm.refresh_data(query_id, [get_test_data], [gen_plot], use_free_plot=False)
+
+    result = llm._query_results[query_id]
+    assert result["dataset"]["value"].tolist() == [9.0]
+    assert llm._data[f"{query_id}_0"]["value"].tolist() == [9.0]
+    assert "rendered" not in result
+    assert list(result["plots"]["invoked_result"][0].axes[0].lines[0].get_ydata()) == [
+        9.0
+    ]
+    # the plot tool read a private copy of the dataset, not a file in the working folder
+    assert not os.path.exists(f"{query_id}_result.csv")
+
+
+def test_failed_refresh_leaves_the_query_untouched(answered, monkeypatch):
+    llm, query_id = answered
+    result = llm._query_results[query_id]
+    before = {
+        "dataset": result["dataset"],
+        "invoked_result": result["tool_result"]["invoked_result"],
+        "plot": result["plots"]["invoked_result"],
+        "rendered": result["rendered"],
+        "data": dict(llm._data),
+    }
+    monkeypatch.setattr(fakes, "TEST_DATA", {"year": [2023], "value": [9.0]})
+
+    # the plot step fails after the data calls and pandas code succeeded
+    with pytest.raises(KeyError):
+        llm.refresh_data(query_id, [get_test_data], [], use_free_plot=False)
+
+    assert result["dataset"] is before["dataset"]
+    assert result["tool_result"]["invoked_result"] is before["invoked_result"]
+    assert result["plots"]["invoked_result"] is before["plot"]
+    assert result["rendered"] is before["rendered"]
+    assert llm._data == before["data"]
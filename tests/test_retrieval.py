@@ -0,0 +1,85 @@
+import pandas as pd
+
+import helper.retrieval
+from helper.retrieval import BM25Index, get_index, shortlist, table_version
+
+TABLE = pd.DataFrame(
+    {
+        "indicator": ["SP.POP.TOTL", "NY.GDP.MKTP.CD", "EN.ATM.CO2E.KT"],
+        "name": ["Population, total", "GDP (current US$)", "CO2 emissions (kt)"],
+    }
+)
+
+
+def test_index_is_built_once_per_table_version(monkeypatch):
+    built = []
+
+    class CountingIndex(BM25Index):
+        def __init__(self, documents):
+            built.append(documents)
+            super().__init__(documents)
+
+    monkeypatch.setattr(helper.retrieval, "_indexes", {})
+    monkeypatch.setattr(helper.retrieval, "BM25Index", CountingIndex)
+    columns = ["indicator", "name"]
+    version = table_version(TABLE)
+
+    # the frame passed on each question is a new object with the same rows
+    for _ in range(3):
+        index = get_index("wb", TABLE.copy(), columns, version)
+    assert len(built) == 1
+    assert index.scores("population").argmax() == 0
+
+    changed = TABLE.assign(name=["Population", "GDP", "Methane emissions"])
+    assert table_version(changed) != version
+    index = get_index("wb", changed, columns, table_version(changed))
+    assert len(built) == 2
+    assert index.scores("methane").argmax() == 2
+
+
+def test_shortlist_ranks_the_selected_rows(monkeypatch):
+    monkeypatch.setattr(helper.retrieval, "_indexes", {})
+    table = pd.concat(
+        [
+            TABLE,
+            pd.DataFrame(
+                {
+                    "indicator": ["SP.POP.GROW", "NY.GDP.PCAP.CD"],
+                    "name": ["Population growth (annual %)", "GDP per capita"],
+                }
+            ),
+        ],
+        ignore_index=True,
+    )
+    columns = ["indicator", "name"]
+
+    result = shortlist(
+        table, "population of countries", 2, columns, "wb", table_version(table)
+    )
+    assert set(result["indicator"]) == {"SP.POP.TOTL", "SP.POP.GROW"}
+
+    # only selected rows are returned, unmatched ones follow in their original order
+    selected = [False, True, True, True, True]
+    result = shortlist(
+        table, "GDP", 3, columns, "wb", table_version(table), selected=selected
+    )
+    assert list(result["indicator"]) == [
+        "NY.GDP.MKTP.CD",
+        "NY.GDP.PCAP.CD",
+        "EN.ATM.CO2E.KT",
+    ]
+
+
+def test_shortlist_passes_everything_through_without_a_cap(monkeypatch):
+    built = []
+    monkeypatch.setattr(helper.retrieval, "_indexes", {})
+    monkeypatch.setattr(helper.retrieval, "get_index", lambda *args: built.append(args))
+
+    for k, selected in [(0, None), (-1, None), (2, [True, False, True])]:
+        result = shortlist(TABLE, "methane", k, ["name"], "wb", None, selected=selected)
+        assert list(result.index) == [
+            i for i in range(3) if selected is None or selected[i]
+        ]
+
+    # no ranking, so no index
+    assert built == []
@@ -0,0 +1,149 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import gc
+import matplotlib.pyplot as plt
+import os
+import pandas as pd
+from types import SimpleNamespace
+
+import helper.session_memory
+from helper.query_memo import QueryMemo
+from helper.session_memory import SessionMemory, value_bytes
+
+QUERY_ID = "0b4e2c1a-1111-4222-8333-444455556666"
+
+
+def session_llm():
+    return SimpleNamespace(_query_results={}, _data={})
+
+
+def answered_llm():
+    "an LLM whose session has answered one question"
+    llm = session_llm()
+    frame = pd.DataFrame({"value": range(1000)})
+    llm._data[f"{QUERY_ID}_result"] = frame
+    llm._query_results[QUERY_ID] = {
+        "initial_prompt": "How did the values change?",
+        "context_query_ids": [],
+        "tool_result": {"query_id": QUERY_ID, "invoked_result": [frame]},
+        "dataset": frame,
+        "plots": None,
+    }
+    return llm
+
+
+def test_spill_only_discards_the_memo_entries_of_its_own_session(tmp_path, monkeypatch):
+    memo = QueryMemo()
+    monkeypatch.setattr(helper.session_memory, "query_memo", memo)
+    monkeypatch.setattr(helper.session_memory, "SPILL_DIRECTORY", str(tmp_path))
+
+    owner = answered_llm()
+    memo.store("key", owner, QUERY_ID)
+    reader = session_llm()
+    assert memo.restore("key", reader, None) == QUERY_ID
+
+    # the session that restored the answer spills its copy, the memo keeps it for everyone else
+    SessionMemory().spill(reader, QUERY_ID)
+    assert reader._query_results[QUERY_ID]["dataset"] is None
+    other = session_llm()
+    assert memo.restore("key", other, None) == QUERY_ID
+    assert len(other._query_results[QUERY_ID]["dataset"]) == 1000
+
+    # the session that stored it spills the object the memo holds, so the entry goes
+    SessionMemory().spill(owner, QUERY_ID)
+    assert memo.restore("key", session_llm(), None) is None
+    assert len(other._query_results[QUERY_ID]["dataset"]) == 1000
+
+
+def test_memo_is_bounded_by_bytes_and_counted_in_the_global_budget(monkeypatch):
+    frame_bytes = value_bytes(answered_llm()._data[f"{QUERY_ID}_result"])
+    memo = QueryMemo(max_entries=64, max_bytes=int(2.5 * frame_bytes))
+    monkeypatch.setattr(helper.session_memory, "query_memo", memo)
+
+    for i in range(4):
+        memo.store(f"key_{i}", answered_llm(), QUERY_ID)
+
+    # entries of sessions that are long gone are dropped once over the byte cap, least recently used first
+    assert memo.total_bytes() == 2 * frame_bytes
+    assert memo.restore("key_1", session_llm(), None) is None
+    assert memo.restore("key_3", session_llm(), None) == QUERY_ID
+
+    session = SessionMemory(
+        session_max_bytes=100 * frame_bytes, global_max_bytes=10 * frame_bytes
+    )
+    assert session.max_bytes() <= 8 * frame_bytes
+
+
+def test_live_figures_are_counted():
+    figure, _ = plt.subplots(figsize=(8, 6), dpi=100)
+
+    assert value_bytes(figure) == 800 * 600 * 4
+    plt.close(figure)
+
+
+def chat_llm(n_questions):
+    "an LLM whose session has asked a chain of follow-up questions, each with its own result frame"
+    llm = session_llm()
+    query_ids = [f"{QUERY_ID[:-1]}{i}" for i in range(n_questions)]
+    for i, query_id in enumerate(query_ids):
+        frame = pd.DataFrame({"value": range(1000)})
+        llm._data[f"{query_id}_result"] = frame
+        llm._query_results[query_id] = {
+            "initial_prompt": f"Question {i}",
+            "context_query_ids": query_ids[:i][::-1],
+            "tool_result": {"query_id": query_id, "invoked_result": [frame]},
+            "dataset": frame,
+            "plots": None,
+        }
+    return llm, query_ids
+
+
+def test_earlier_questions_of_the_latest_chat_are_never_spilled(tmp_path, monkeypatch):
+    monkeypatch.setattr(helper.session_memory, "query_memo", QueryMemo())
+    monkeypatch.setattr(helper.session_memory, "SPILL_DIRECTORY", str(tmp_path))
+    llm, query_ids = chat_llm(3)
+    session = SessionMemory(session_max_bytes=0)
+
+    for query_id in query_ids:
+        session.touch(llm, query_id)
+        session.enforce(llm, keep=[query_id])
+
+    # follow-up code may reference the frames of any earlier question
+    assert all(f"{_}_result" in llm._data for _ in query_ids)
+
+    # viewing an older message of a new chat can spill a chat no longer continued
+    llm._query_results["other"] = {
+        "initial_prompt": "Another question",
+        "context_query_ids": [],
+        "tool_result": {"query_id": "other", "invoked_result": None},
+        "dataset": None,
+        "plots": None,
+    }
+    session.touch(llm, "other")
+    session.load(llm, query_ids[0], latest="other")
+    assert f"{query_ids[0]}_result" in llm._data
+    assert f"{query_ids[1]}_result" not in llm._data
+
+    # and going back to it reloads the whole chain
+    session.enforce(llm, keep=[query_ids[2]])
+    assert all(f"{_}_result" in llm._data for _ in query_ids)
+    assert len(llm._query_results[query_ids[1]]["dataset"]) == 1000
+
+
+def test_pruning_keeps_the_folders_of_live_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(helper.session_memory, "SPILL_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(helper.session_memory, "SPILL_TTL", -1)
+    session = SessionMemory()
+    os.makedirs(session.directory)
+    os.makedirs(tmp_path / "ended")
+
+    helper.session_memory.prune_spill_directory()
+
+    assert os.listdir(tmp_path) == [os.path.basename(session.directory)]
+
+    # and a session's folder goes with it
+    del session
+    gc.collect()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,66 @@
+import itertools
+import math
+
+from helper.odata import plan_filter
+from helper.sharding import chunk_sizes, shard_dimensions
+
+
+def dimension(field, values, quote=True, **kwargs):
+    return {"field": field, "values": values, "quote": quote, **kwargs}
+
+
+def covered(shards, filtered):
+    "the combinations of the filtered dimensions selected by the shards"
+    return [
+        combination
+        for shard in shards
+        for combination in itertools.product(*[shard[i]["values"] for i in filtered])
+    ]
+
+
+def test_chunks_meet_the_filter_and_row_limits():
+    # listed dimensions count every value, a ranged one at most two
+    sizes = chunk_sizes(
+        [100, 300], [False, True], max_values=60, max_rows=3000, max_shards=64
+    )
+    assert sizes[0] + min(sizes[1], 2) <= 60
+    assert math.prod(sizes) <= 3000
+
+    # a filter that is only too long is not split on its ranged dimension
+    assert chunk_sizes([50, 300], [False, True], 30, 10**6, 64)[1] == 300
+
+
+def test_chunks_stop_at_the_shard_cap():
+    sizes = chunk_sizes([1000, 1000], [False, False], 10, 10**9, max_shards=8)
+
+    n_shards = math.prod([math.ceil(1000 / _) for _ in sizes])
+    assert n_shards <= 8
+    assert sum(sizes) > 10
+
+
+def test_shards_partition_the_query():
+    dimensions = [
+        dimension("Year", list(range(1990, 2024)), quote=False, contiguous=True),
+        dimension("Economy/Code", [f"{i:04}" for i in range(0, 900, 4)]),
+        dimension("Flow/Code", None),
+    ]
+
+    shards = shard_dimensions(dimensions, max_values=50, max_rows=2000)
+
+    assert len(shards) > 1
+    combinations = covered(shards, [0, 1])
+    assert len(combinations) == len(set(combinations)) == 34 * 225
+    for shard in shards:
+        assert shard[2]["values"] is None
+        assert len(shard[1]["values"]) + 2 <= 50
+        assert len(shard[0]["values"]) * len(shard[1]["values"]) <= 2000
+        # each chunk of years is still a single range
+        assert "Year ge" in plan_filter(shard)
+
+
+def test_small_query_is_one_shard():
+    dimensions = [dimension("Economy/Code", ["0004", "0008", "0004"])]
+
+    assert shard_dimensions(dimensions) == [
+        [dimension("Economy/Code", ["0004", "0008"])]
+    ]
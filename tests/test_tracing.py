@@ -0,0 +1,50 @@
+import os
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from helper.tracing import SpanStore
+
+from conftest import REPO_ROOT
+
+
+def test_spans_past_retention_are_deleted(tmp_path):
+    store = SpanStore(path=str(tmp_path / "spans.sqlite"), retention_days=1)
+    connection = store._connect()
+    connection.executemany(
+        "INSERT INTO spans (trace_id, kind, started_at, detail) VALUES (?, ?, ?, ?)",
+        [
+            ["old", "query", time.time() - 2 * 24 * 60 * 60, "an old question"],
+            ["new", "query", time.time() - 60, "a new question"],
+        ],
+    )
+    connection.commit()
+
+    store.prune(connection)
+
+    assert store.read()["trace_id"].tolist() == ["new"]
+
+
+def test_admin_page_needs_the_admin_password(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = AppTest.from_file(
+        os.path.join(REPO_ROOT, "pages/admin.py"), default_timeout=30
+    )
+    app.secrets["password"] = "chat"
+    app.session_state["password_correct"] = True
+
+    # logged in to the chat, but the page has no password of its own
+    app.run()
+    assert len(app.dataframe) == 0
+    assert "admin_password" in app.info[0].value
+
+    app.secrets["admin_password"] = "admin"
+    app.run()
+    assert len(app.dataframe) == 0
+    app.text_input(key="admin_password").input("chat").run()
+    assert len(app.dataframe) == 0
+    assert len(app.error) == 1
+
+    app.text_input(key="admin_password").input("admin").run()
+    assert len(app.error) == 0
+    assert "No traces recorded" in app.info[0].value
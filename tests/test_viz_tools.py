@@ -0,0 +1,49 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from helper.viz_tools import gen_plot
+
+from legacy_viz_tools import masked_bar_heights
+
+
+def test_grouped_bars_match_per_group_masking():
+    df = pd.DataFrame(
+        {
+            "economy": ["France", "Chile", "France", "Chile", "Kenya", "France"],
+            "year": [2021, 2021, 2022, 2023, 2023, 2021],
+            "value": [1.5, 2.0, 3.0, 4.0, 5.0, 9.0],
+        }
+    )
+
+    fig = gen_plot.invoke(
+        {
+            "df": df,
+            "x_col": "year",
+            "y_col": "value",
+            "group_col": "economy",
+            "plot_type": "bar",
+        }
+    )
+    ax = fig.axes[0]
+
+    # the duplicate (France, 2021) keeps its first value, pairs a group does not have are 0
+    expected = masked_bar_heights(df, "year", "value", "economy")
+    assert expected[0] == [1.5, 3.0, 0]
+    heights = [[bar.get_height() for bar in _] for _ in ax.containers]
+    np.testing.assert_array_equal(heights, expected)
+    assert [_.get_label() for _ in ax.containers] == ["France", "Chile", "Kenya"]
+    assert [_.get_text() for _ in ax.get_xticklabels()] == ["2021", "2022", "2023"]
+
+    # three bars side by side around each x position
+    x = [[bar.get_x() + bar.get_width() / 2 for bar in _] for _ in ax.containers]
+    np.testing.assert_allclose(
+        x,
+        [[i - 0.4 + 0.8 / 3 * (g + 0.5) for i in range(3)] for g in range(3)],
+        atol=1e-9,
+    )
+    plt.close(fig)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import helper.warmup
+from helper.warmup import Warmup, lazy_step
+
+
+def wait_for(condition, timeout=5):
+    "whether the condition held within the timeout"
+    start = time.time()
+    while time.time() - start < timeout:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_steps_go_from_pending_to_ready_or_failed(monkeypatch):
+    monkeypatch.setattr(helper.warmup, "WARMUP_ENABLED", True)
+    release = threading.Event()
+
+    def fail():
+        raise ValueError("download failed")
+
+    warmup = Warmup([("slow", release.wait), ("broken", fail)])
+    assert warmup.status()["slow"]["status"] == "pending"
+    assert not warmup.done()
+
+    warmup.start()
+    warmup.start()  # a second page load doesn't start another thread
+    assert wait_for(lambda: warmup.status()["slow"]["status"] == "running")
+    assert warmup.status()["broken"]["status"] == "pending"
+    assert not warmup.is_ready("slow")
+
+    release.set()
+    assert wait_for(warmup.done)
+    status = warmup.status()
+    assert status["slow"]["status"] == "ready"
+    assert status["slow"]["seconds"] is not None
+    # a failed step counts as ready, its caller loads it lazily
+    assert status["broken"] == {
+        "status": "failed",
+        "seconds": status["broken"]["seconds"],
+        "error": "download failed",
+    }
+    assert warmup.is_ready("broken")
+
+
+def test_disabled_warm_up_is_always_ready(monkeypatch):
+    monkeypatch.setattr(helper.warmup, "WARMUP_ENABLED", False)
+
+    warmup = Warmup([("never_started", lambda: None)])
+
+    assert warmup.is_ready("never_started")
+    assert warmup.status()["never_started"]["status"] == "pending"
+
+
+def test_lazy_step_calls_a_nested_attribute(monkeypatch):
+    calls = []
+    target = type("Target", (), {"load": lambda: calls.append(1)})
+    monkeypatch.setattr(helper.warmup, "_test_target", target, raising=False)
+
+    lazy_step("helper.warmup", "_test_target.load")()
+
+    assert calls == [1]
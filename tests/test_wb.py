@@ -0,0 +1,62 @@
+import pytest
+
+import helper.wb
+from helper.wb import fetch_indicator_catalog, read_catalog, refresh_catalog
+
+
+def indicator(i):
+    return {"id": f"IND.{i}", "name": f"Indicator {i}"}
+
+
+def fake_api(records, per_page=2, total=None):
+    "a WB indicator list serving records in pages, reporting `total` if given, and the pages it was asked for"
+    requested = []
+    n_pages = (len(records) + per_page - 1) // per_page
+    header = {"pages": n_pages, "total": len(records) if total is None else total}
+
+    def fetch_indicator_page(page, per_page_=None):
+        requested.append(page)
+        return header, records[(page - 1) * per_page : page * per_page]
+
+    return fetch_indicator_page, requested
+
+
+def test_duplicate_ids_are_not_a_short_catalog(monkeypatch):
+    # the same indicator listed under two sources is counted twice in the total
+    records = [indicator(1), indicator(2), indicator(2), indicator(3)]
+    monkeypatch.setattr(helper.wb, "fetch_indicator_page", fake_api(records)[0])
+
+    catalog = fetch_indicator_catalog()
+
+    assert list(catalog["indicator"]) == ["IND.1", "IND.2", "IND.3"]
+
+
+def test_missing_pages_are_a_short_catalog(monkeypatch):
+    records = [indicator(i) for i in range(4)]
+    monkeypatch.setattr(
+        helper.wb, "fetch_indicator_page", fake_api(records, total=6)[0]
+    )
+
+    with pytest.raises(ValueError):
+        fetch_indicator_catalog()
+
+
+def test_refresh_stops_at_an_unchanged_first_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(helper.wb, "WB_KEY_PATH", str(tmp_path / "wb_key.parquet"))
+    records = [indicator(i) for i in range(6)]
+    fetch_indicator_page, requested = fake_api(records)
+    monkeypatch.setattr(helper.wb, "fetch_indicator_page", fetch_indicator_page)
+
+    assert refresh_catalog() is None
+    assert requested == [1, 2, 3]
+
+    requested.clear()
+    assert refresh_catalog() == {"added": [], "removed": [], "renamed": []}
+    assert requested == [1]
+
+    # an added indicator changes the total, so the whole list is downloaded again
+    fetch_indicator_page, requested = fake_api(records + [indicator(6)])
+    monkeypatch.setattr(helper.wb, "fetch_indicator_page", fetch_indicator_page)
+    assert refresh_catalog()["added"] == ["IND.6"]
+    assert requested == [1, 2, 3, 4]
+    assert len(read_catalog()[0]) == 7
@@ -0,0 +1,76 @@
+import pytest
+import requests
+
+import helper.tools
+from helper.tools import fetch_world_bank_records
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+
+def record(year):
+    return {"date": str(year), "value": 1.0}
+
+
+def fake_http_get(pages):
+    "answer page requests from a {page: FakeResponse} dict"
+
+    def http_get(url, params):
+        return pages[params.get("page", 1)]
+
+    return http_get
+
+
+def test_pages_are_joined(monkeypatch):
+    monkeypatch.setattr(
+        helper.tools,
+        "http_get",
+        fake_http_get(
+            {
+                1: FakeResponse(200, [{"pages": 3}, [record(2000)]]),
+                2: FakeResponse(200, [{"pages": 3}, [record(2001)]]),
+                3: FakeResponse(200, [{"pages": 3}, None]),
+            }
+        ),
+    )
+
+    records = fetch_world_bank_records("FRA", "NY.GDP.MKTP.CD", 2000, 2001)
+
+    assert records == [record(2000), record(2001)]
+
+
+@pytest.mark.parametrize(
+    "failed_page, error",
+    [
+        (FakeResponse(502, None), requests.HTTPError),
+        (
+            FakeResponse(200, [{"message": [{"key": "Invalid value"}]}]),
+            ValueError,
+        ),
+    ],
+)
+def test_failed_page_fails_the_indicator(monkeypatch, failed_page, error):
+    monkeypatch.setattr(
+        helper.tools,
+        "http_get",
+        fake_http_get(
+            {
+                1: FakeResponse(200, [{"pages": 3}, [record(2000)]]),
+                2: failed_page,
+                3: FakeResponse(200, [{"pages": 3}, [record(2002)]]),
+            }
+        ),
+    )
+
+    with pytest.raises(error):
+        fetch_world_bank_records("FRA", "NY.GDP.MKTP.CD", 2000, 2002)